@@ -1,8 +1,15 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
 # --- DTC / OBD reference admin ---
 
-from .models import DTCImportBatch, DTCReference, OBDLiveDataPIDReference, VehicleBrand
+from .models import (
+    DTCImportBatch,
+    DTCReference,
+    LaunchParseCache,
+    OBDLiveDataPIDReference,
+    VehicleBrand,
+)
 
 
 @admin.register(VehicleBrand)
@@ -17,14 +24,62 @@ class DTCImportBatchAdmin(admin.ModelAdmin):
         "id",
         "source_name",
         "file_name",
+        "status",
         "rows_total",
         "rows_created",
         "rows_updated",
+        "rows_unchanged",
         "rows_skipped",
+        "rows_bad",
+        "import_seconds",
+        "import_rows_per_second",
         "created_at",
+        "published_at",
     )
+    list_filter = ("status", "use_staging")
     search_fields = ("source_name", "file_name", "source_url", "notes")
-    readonly_fields = ("created_at",)
+    readonly_fields = ("created_at", "published_at", "last_row_offset", "metrics_table")
+    exclude = ("metrics",)
+
+    @admin.display(description="Время, с")
+    def import_seconds(self, obj):
+        return (obj.metrics or {}).get("import", {}).get("total_seconds")
+
+    @admin.display(description="Строк/с")
+    def import_rows_per_second(self, obj):
+        return (obj.metrics or {}).get("import", {}).get("rows_per_second")
+
+    @admin.display(description="Метрики по фазам")
+    def metrics_table(self, obj):
+        rows = []
+
+        for command, metrics in (obj.metrics or {}).items():
+            rows.append((
+                command,
+                "",
+                metrics.get("total_seconds"),
+                metrics.get("queries"),
+                metrics.get("rows"),
+                metrics.get("rows_per_second"),
+            ))
+            rows.extend(
+                ("", name, phase["seconds"], phase["queries"], phase["rows"], phase["rows_per_second"])
+                for name, phase in metrics.get("phases", {}).items()
+            )
+            rows.append(("", "peak RSS, KB", metrics.get("peak_rss_kb"), "", "", ""))
+
+        if not rows:
+            return "-"
+
+        return format_html(
+            "<table><tr><th>Команда</th><th>Фаза</th><th>Секунды</th><th>Запросы</th>"
+            "<th>Строки</th><th>Строк/с</th></tr>{}</table>",
+            format_html_join(
+                "",
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>",
+                ((value if value is not None else "-" for value in row) for row in rows),
+            ),
+        )
 
 
 @admin.register(DTCReference)
@@ -60,3 +115,11 @@ class OBDLiveDataPIDReferenceAdmin(admin.ModelAdmin):
     list_display = ("pid", "name_ru", "name_en", "unit", "is_active")
     list_filter = ("is_active",)
     search_fields = ("pid", "name_ru", "name_en", "description_ru", "description_en", "diagnostic_value")
+
+
+@admin.register(LaunchParseCache)
+class LaunchParseCacheAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "parser_version", "file_size", "hits", "last_used_at", "created_at")
+    list_filter = ("parser_version",)
+    search_fields = ("sha256",)
+    readonly_fields = ("created_at",)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DiagnosticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'diagnostics'
+
+    def ready(self):
+        from diagnostics.dtc_index import connect_signals
+
+        connect_signals()
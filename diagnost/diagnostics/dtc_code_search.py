@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from collections.abc import Iterator
+from typing import NamedTuple
+
+from diagnostics.dtc_index import dtc_index
+from diagnostics.models import DTC_SYSTEM_PREFIXES, DTCReference, normalize_dtc_code
+
+
+DEFAULT_SEARCH_LIMIT = 50
+
+# Коды в справочнике — буквы, цифры и редкие разделители производителей.
+CODE_CHARS_RE = re.compile(r"^[A-Z0-9._/]+$")
+RANGE_RE = re.compile(r"^([A-Z0-9._/]+)-([A-Z0-9._/]+)$")
+
+
+class CodeQuery(NamedTuple):
+    """
+    kind: "prefix" (P03), "wildcard" (P0?7?, P03*) или "range" (P0300-P0312).
+    prefixes — литеральные начала кодов, с которых начинается просмотр
+    отсортированного индекса; для range — [low], high — верхняя граница.
+    any_first — шаблон начинается с "?": префиксы — все первые символы кодов индекса.
+    """
+
+    kind: str
+    prefixes: tuple[str, ...]
+    pattern: re.Pattern | None = None
+    high: str = ""
+    any_first: bool = False
+
+
+def parse_code_query(query: str) -> CodeQuery | None:
+    query = normalize_dtc_code(query).replace(" ", "")
+
+    if not query:
+        return None
+
+    match = RANGE_RE.match(query)
+    if match:
+        low, high = sorted(match.groups())
+        return CodeQuery("range", (low,), high=high)
+
+    if "?" in query or "*" in query:
+        body = query.replace("?", "").replace("*", "")
+        if body and not CODE_CHARS_RE.match(body):
+            return None
+
+        pattern = re.compile("".join(
+            "." if char == "?" else ".*" if char == "*" else re.escape(char)
+            for char in query
+        ) + "$")
+        literal = re.split(r"[?*]", query, maxsplit=1)[0]
+
+        if literal:
+            return CodeQuery("wildcard", (literal,), pattern=pattern)
+        if query[0] == "?":
+            # Любой первый символ: узкие диапазоны по каждому из них вместо полного
+            # просмотра. Не только P/C/B/U — OEM-коды Launch начинаются и с цифр, и с S.
+            return CodeQuery("wildcard", (), pattern=pattern, any_first=True)
+
+        return CodeQuery("wildcard", ("",), pattern=pattern)
+
+    if not CODE_CHARS_RE.match(query):
+        return None
+
+    if query[0].isdigit():
+        # Сам запрос — OEM-коды вида 930AB2 и 2A82; "0171" раньше находился
+        # через icontains, поэтому ещё и после любой буквы системы.
+        return CodeQuery("prefix", (query, *(prefix + query for prefix in DTC_SYSTEM_PREFIXES)))
+
+    return CodeQuery("prefix", (query,))
+
+
+def _scan(keys: list[tuple[str, str, int]], start: str) -> Iterator[tuple[str, str, int]]:
+    for position in range(bisect_left(keys, (start,)), len(keys)):
+        yield keys[position]
+
+
+def first_characters(keys: list[tuple[str, str, int]]) -> list[str]:
+    """Различные первые символы кодов: по одному bisect на символ."""
+    chars = []
+    position = bisect_left(keys, ("",))
+
+    while position < len(keys):
+        code = keys[position][0]
+
+        if not code:
+            position += 1
+            continue
+
+        chars.append(code[0])
+        position = bisect_left(keys, (chr(ord(code[0]) + 1),), position)
+
+    return chars
+
+
+def iter_matching_keys(parsed: CodeQuery, keys: list[tuple[str, str, int]]) -> Iterator[tuple[str, str, int]]:
+    """
+    Ключи (code, manufacturer, id) в порядке сортировки, начиная с bisect
+    по префиксу. Шаблон, начинающийся с "*", просматривает весь индекс.
+    """
+    if parsed.kind == "range":
+        for key in _scan(keys, parsed.prefixes[0]):
+            # Верхняя граница включительно вместе с её продолжениями (P0312-xx).
+            if key[0] > parsed.high and not key[0].startswith(parsed.high):
+                return
+            yield key
+        return
+
+    prefixes = first_characters(keys) if parsed.any_first else parsed.prefixes
+
+    for prefix in sorted(prefixes):
+        for key in _scan(keys, prefix):
+            if not key[0].startswith(prefix):
+                break
+            if parsed.pattern is None or parsed.pattern.match(key[0]):
+                yield key
+
+
+def search_codes(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[DTCReference]:
+    """
+    Поиск активных кодов по префиксу, шаблону или диапазону через
+    отсортированные ключи индекса справочника: bisect до первого
+    подходящего ключа и просмотр до limit совпадений. Полные записи
+    читаются одним запросом по id найденных ключей.
+    """
+    parsed = parse_code_query(query)
+
+    if parsed is None:
+        return []
+
+    ids = []
+    for _code, _manufacturer, pk in iter_matching_keys(parsed, dtc_index.active_keys()):
+        ids.append(pk)
+        if len(ids) >= limit:
+            break
+
+    refs = {ref.id: ref for ref in DTCReference.objects.filter(id__in=ids)}
+    return [refs[pk] for pk in ids if pk in refs]
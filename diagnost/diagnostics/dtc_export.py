@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import csv
+import json
+import zlib
+from collections.abc import Iterable, Iterator
+
+from django.db.models import QuerySet
+
+from diagnostics.models import DTCReference
+
+
+# Колонки совпадают с тем, что читает import_dtc_csv: выгрузку можно загрузить обратно.
+DTC_EXPORT_COLUMNS = (
+    "code",
+    "manufacturer",
+    "title_ru",
+    "title_en",
+    "description_ru",
+    "description_en",
+    "symptoms",
+    "possible_causes",
+    "diagnostic_notes",
+    "recommended_checks",
+    "severity",
+    "source_name",
+    "source_url",
+    "is_active",
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Размер блока, которым выгрузка пишется в файл или ответ.
+EXPORT_BLOCK_BYTES = 64 * 1024
+
+
+def export_queryset(
+    system: str = "",
+    manufacturer: str | None = None,
+    active_only: bool = False,
+) -> QuerySet:
+    """manufacturer="" — только generic-коды, None — все."""
+    queryset = DTCReference.objects.all()
+
+    if system:
+        queryset = queryset.filter(system=system.upper())
+    if manufacturer is not None:
+        queryset = queryset.filter(manufacturer__iexact=manufacturer.strip())
+    if active_only:
+        queryset = queryset.filter(is_active=True)
+
+    return queryset
+
+
+def iter_export_rows(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Строки чанками по id. Ключевая пагинация вместо одного курсора:
+    MySQL-клиент буферизует весь результат запроса даже при .iterator().
+    """
+    last_id = 0
+
+    while True:
+        rows = list(
+            queryset
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", *DTC_EXPORT_COLUMNS)[:chunk_size]
+        )
+
+        if not rows:
+            return
+
+        last_id = rows[-1][0]
+
+        for row in rows:
+            yield row[1:]
+
+
+class _LineBuffer:
+    """Файлоподобный объект для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_lines(
+    queryset: QuerySet,
+    fmt: str = "csv",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[str]:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    rows = iter_export_rows(queryset, chunk_size)
+
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(dict(zip(DTC_EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+        return
+
+    writer = csv.writer(_LineBuffer(), lineterminator="\n")
+    yield writer.writerow(DTC_EXPORT_COLUMNS)
+
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_blocks(lines: Iterable[str], size: int = EXPORT_BLOCK_BYTES) -> Iterator[bytes]:
+    """Склейка строк в блоки ~size байт: меньше мелких записей в сокет или файл."""
+    block = []
+    block_size = 0
+
+    for line in lines:
+        data = line.encode("utf-8")
+        block.append(data)
+        block_size += len(data)
+
+        if block_size >= size:
+            yield b"".join(block)
+            block = []
+            block_size = 0
+
+    if block:
+        yield b"".join(block)
+
+
+def iter_gzip(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """gzip-поток из блоков без накопления всего результата в памяти."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def iter_export_bytes(
+    queryset: QuerySet,
+    fmt: str = "csv",
+    compress: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    blocks = iter_blocks(iter_export_lines(queryset, fmt, chunk_size))
+    return iter_gzip(blocks) if compress else blocks
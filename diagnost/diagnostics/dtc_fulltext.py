@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from diagnostics.dtc_index import dtc_index
+from diagnostics.models import DTCReference
+
+
+# Поле -> вес в BM25: совпадение в заголовке важнее совпадения в причинах.
+SEARCH_FIELDS = {
+    "title_ru": 3.0,
+    "title_en": 3.0,
+    "symptoms": 2.0,
+    "description_ru": 1.0,
+    "description_en": 1.0,
+    "possible_causes": 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+DEFAULT_SEARCH_LIMIT = 20
+SYNC_CHUNK_SIZE = 2000
+
+WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+CYRILLIC_RE = re.compile(r"[а-яё]")
+
+STOP_WORDS = frozenset(
+    "и в во не на с со по при или а но к у о об от до из за для что как это ли же "
+    "the a an of and or in on at to for with is are by not be".split()
+)
+
+# Окончания для упрощённого стеммера: сначала длинные.
+RU_ENDINGS = tuple(sorted((
+    "иями ями ами иях ях ах ией ием ов ев ей ой ий ый ая яя ое ее ие ые ого его ому ему "
+    "ыми ими ую юю ом ем ам им ым ых их ью ия ья ье ии ает яет ует ит ет ат ят ют ут ать "
+    "ять ить еть ться тся ется ится ы и а я о е у ю й ь"
+).split(), key=len, reverse=True))
+RU_MIN_STEM = 3
+
+EN_MIN_STEM = 3
+
+
+def stem_ru(word: str) -> str:
+    for ending in RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= RU_MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def stem_en(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > EN_MIN_STEM + 1:
+        word = word[:-1]
+
+    for suffix in ("ing", "ed", "ly"):
+        if word.endswith(suffix) and not word.endswith("eed") and len(word) - len(suffix) >= EN_MIN_STEM:
+            word = word[: -len(suffix)]
+            if len(word) > EN_MIN_STEM and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+
+    if word.endswith("e") and len(word) > EN_MIN_STEM:
+        word = word[:-1]
+
+    return word
+
+
+def builtin_stem(word: str) -> str:
+    return stem_ru(word) if CYRILLIC_RE.search(word) else stem_en(word)
+
+
+def snowball_stem():
+    import snowballstemmer
+
+    russian = snowballstemmer.stemmer("russian")
+    english = snowballstemmer.stemmer("english")
+
+    def stem(word: str) -> str:
+        return (russian if CYRILLIC_RE.search(word) else english).stemWord(word)
+
+    return stem
+
+
+def resolve_stemmer():
+    """
+    DTC_FULLTEXT_STEMMER = "builtin" (по умолчанию) — встроенный
+    упрощённый стеммер; "snowball" — snowballstemmer, он должен быть
+    установлен. Выбор задаётся явно, а не наличием пакета на хосте:
+    иначе поиск по-разному ранжирует результаты на разных серверах.
+    """
+    name = getattr(settings, "DTC_FULLTEXT_STEMMER", "builtin")
+
+    if name == "snowball":
+        return snowball_stem()
+    if name != "builtin":
+        raise ValueError(f"Unknown DTC_FULLTEXT_STEMMER: {name}")
+
+    return builtin_stem
+
+
+def tokenize(text: str, stem=builtin_stem) -> list[str]:
+    return [
+        stem(word)
+        for word in WORD_RE.findall((text or "").lower().replace("ё", "е"))
+        if word not in STOP_WORDS
+    ]
+
+
+class DTCFullTextIndex:
+    """
+    Инвертированный индекс по текстовым полям активных DTCReference в
+    памяти процесса: термин -> {id: взвешенная частота}.
+
+    Индекс следует за DTCReferenceIndex: при смене версии справочника
+    (save(), импорт, публикация пакета) переиндексируются только записи,
+    у которых изменился fingerprint, и удаляются исчезнувшие — без
+    полной перестройки.
+    """
+
+    def __init__(self, stem=None):
+        self._lock = threading.Lock()
+        self._stem = stem
+        self._postings: dict[str, dict[int, float]] = {}
+        self._doc_terms: dict[int, Counter] = {}
+        self._doc_lengths: dict[int, float] = {}
+        self._fingerprints: dict[int, str] = {}
+        self._total_length = 0.0
+        self._generation: str | None = None
+
+    @property
+    def stem(self):
+        if self._stem is None:
+            self._stem = resolve_stemmer()
+        return self._stem
+
+    def document_terms(self, row: dict) -> Counter:
+        terms = Counter()
+        for field, weight in SEARCH_FIELDS.items():
+            for term in tokenize(row.get(field) or "", self.stem):
+                terms[term] += weight
+        return terms
+
+    def _remove(self, pk: int) -> None:
+        for term in self._doc_terms.pop(pk, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(pk, None)
+                if not postings:
+                    del self._postings[term]
+
+        self._total_length -= self._doc_lengths.pop(pk, 0.0)
+        self._fingerprints.pop(pk, None)
+
+    def _add(self, pk: int, fingerprint: str, terms: Counter) -> None:
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[pk] = weight
+
+        length = sum(terms.values())
+        self._doc_terms[pk] = terms
+        self._doc_lengths[pk] = length
+        self._fingerprints[pk] = fingerprint
+        self._total_length += length
+
+    def sync(self) -> None:
+        generation, entries = dtc_index.snapshot()
+
+        if generation == self._generation:
+            return
+
+        with self._lock:
+            if generation == self._generation:
+                return
+
+            active = {entry.id: entry.fingerprint for entry in entries.values() if entry.is_active}
+
+            for pk in [pk for pk in self._fingerprints if pk not in active]:
+                self._remove(pk)
+
+            changed = [pk for pk, fingerprint in active.items() if self._fingerprints.get(pk) != fingerprint]
+
+            for start in range(0, len(changed), SYNC_CHUNK_SIZE):
+                for row in DTCReference.objects.filter(id__in=changed[start:start + SYNC_CHUNK_SIZE]).values(
+                    "id", "fingerprint", *SEARCH_FIELDS
+                ):
+                    self._remove(row["id"])
+                    self._add(row["id"], row["fingerprint"], self.document_terms(row))
+
+            self._generation = generation
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[tuple[int, float]]:
+        """(id, score) по убыванию BM25."""
+        self.sync()
+
+        terms = set(tokenize(query, self.stem))
+
+        if not terms:
+            return []
+
+        # sync() из другого потока меняет словари на месте: подсчёт под той же блокировкой.
+        with self._lock:
+            total = len(self._doc_lengths)
+
+            if not total:
+                return []
+
+            average_length = self._total_length / total or 1.0
+            scores: Counter = Counter()
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+
+                for pk, frequency in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[pk] / average_length)
+                    scores[pk] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        return scores.most_common(limit)
+
+
+dtc_fulltext = DTCFullTextIndex()
+
+
+def search_references(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[tuple[DTCReference, float]]:
+    ranked = dtc_fulltext.search(query, limit)
+    refs = DTCReference.objects.in_bulk([pk for pk, _score in ranked])
+    return [(refs[pk], score) for pk, score in ranked if pk in refs]
@@ -0,0 +1,739 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from diagnostics.dtc_index import bump_dtc_generation
+from diagnostics.import_metrics import ImportMetrics, optional_phase
+from diagnostics.models import (
+    DTC_FINGERPRINT_FIELDS,
+    DiagnosticCode,
+    DTCImportBatch,
+    DTCReference,
+    DTCStagedReference,
+    VehicleBrand,
+    dtc_reference_fingerprint,
+)
+
+
+ALLOWED_SEVERITY = {"info", "low", "medium", "high", "critical"}
+
+# Значения колонки is_active, которые выключают код; пустая колонка — активен.
+INACTIVE_VALUES = {"0", "false", "no", "n", "нет"}
+
+# Строк в одной транзакции и строк в одном INSERT/UPDATE.
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_BATCH_SIZE = 1000
+
+REFERENCE_UPDATE_FIELDS = [
+    "system",
+    "scope",
+    "brand",
+    "title_ru",
+    "title_en",
+    "description_ru",
+    "description_en",
+    "symptoms",
+    "possible_causes",
+    "diagnostic_notes",
+    "recommended_checks",
+    "severity",
+    "source_name",
+    "source_url",
+    "is_active",
+    "import_batch",
+    "fingerprint",
+    "updated_at",
+]
+
+
+def normalize_code(value):
+    return (value or "").strip().upper()
+
+
+def reference_key(code: str, manufacturer: str) -> tuple[str, str]:
+    """
+    Ключ (code, manufacturer) без учёта регистра марки: уникальный индекс
+    в MySQL сравнивает строки в регистронезависимой collation, и "Bmw"
+    для него та же запись, что "BMW".
+    """
+    return code, manufacturer.casefold()
+
+
+def code_system(code):
+    code = normalize_code(code)
+    return code[0] if code and code[0] in ["P", "C", "B", "U"] else ""
+
+
+def normalize_severity(value):
+    value = (value or "").strip().lower()
+
+    if value in ALLOWED_SEVERITY:
+        return value
+
+    return DTCReference.Severity.MEDIUM
+
+
+def parse_is_active(value) -> bool:
+    if isinstance(value, bool):
+        return value
+
+    return str(value if value is not None else "").strip().lower() not in INACTIVE_VALUES
+
+
+def brand_slug(name: str) -> str:
+    return slugify(name) or name.lower().replace(" ", "-")
+
+
+def reference_fields_from_row(
+    row: dict[str, Any],
+    source_name: str = "",
+    source_url: str = "",
+) -> dict[str, Any] | None:
+    """Поля DTCReference из строки CSV. None — строку нужно пропустить."""
+    code = normalize_code(row.get("code"))
+    system = code_system(code)
+
+    if not code or not system:
+        return None
+
+    manufacturer = (row.get("manufacturer") or "").strip()
+
+    return {
+        "code": code,
+        "system": system,
+        "scope": DTCReference.Scope.MANUFACTURER if manufacturer else DTCReference.Scope.GENERIC,
+        "manufacturer": manufacturer,
+        "title_ru": (row.get("title_ru") or "").strip()[:500],
+        "title_en": (row.get("title_en") or "").strip()[:500],
+        "description_ru": (row.get("description_ru") or "").strip(),
+        "description_en": (row.get("description_en") or "").strip(),
+        "symptoms": (row.get("symptoms") or "").strip(),
+        "possible_causes": (row.get("possible_causes") or "").strip(),
+        "diagnostic_notes": (row.get("diagnostic_notes") or "").strip(),
+        "recommended_checks": (row.get("recommended_checks") or "").strip(),
+        "severity": normalize_severity(row.get("severity")),
+        "source_name": (row.get("source_name") or "").strip() or source_name,
+        "source_url": (row.get("source_url") or "").strip() or source_url,
+        "is_active": parse_is_active(row.get("is_active")),
+    }
+
+
+class DTCUpsertEngine:
+    """
+    Пакетный upsert справочника DTC вместо update_or_create на каждую строку.
+
+    Ключи (code, manufacturer) существующих записей и марки загружаются
+    в память один раз. Строки копятся до chunk_size, затем в одной
+    транзакции делятся на вставки и обновления и пишутся через
+    bulk_create / bulk_update порциями по batch_size. Если ключ встречается
+    в файле несколько раз, побеждает последняя строка, а счётчики считаются
+    так же, как при последовательных update_or_create.
+
+    Строка, чей fingerprint совпадает с записью в БД, не пишется вовсе
+    (счётчик unchanged): повторный импорт того же файла — только чтение.
+
+    Метка версии справочника (индексы в памяти процессов) меняется один
+    раз на импорт — в finish() или announce_changes(), а не на каждый чанк.
+    """
+
+    def __init__(
+        self,
+        batch: DTCImportBatch | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        metrics: ImportMetrics | None = None,
+    ):
+        self.batch = batch
+        self.chunk_size = max(1, chunk_size)
+        self.batch_size = max(1, batch_size)
+        self.metrics = metrics
+
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+
+        self._pending: list[DTCReference] = []
+        self._written = False
+        # reference_key() -> (id, fingerprint, manufacturer в написании из БД)
+        self._existing: dict[tuple[str, str], tuple[int, str, str]] | None = None
+        self._brands: dict[str, VehicleBrand] = {}
+
+    def load(self) -> None:
+        with optional_phase(self.metrics, "load_keys"):
+            self._existing = {
+                reference_key(code, manufacturer): (pk, fingerprint, manufacturer)
+                for code, manufacturer, pk, fingerprint in (
+                    DTCReference.objects
+                    .values_list("code", "manufacturer", "id", "fingerprint")
+                    .iterator(chunk_size=10000)
+                )
+            }
+            self._brands = {brand.name: brand for brand in VehicleBrand.objects.all()}
+
+    def add_row(self, row: dict[str, Any], source_name: str = "", source_url: str = "") -> None:
+        fields = reference_fields_from_row(row, source_name, source_url)
+
+        if fields is None:
+            self.skipped += 1
+            return
+
+        self.add(fields)
+
+    def add(self, fields: dict[str, Any]) -> None:
+        ref = DTCReference(import_batch=self.batch, **fields)
+        ref.normalize_fields()
+        self._pending.append(ref)
+
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        if self._existing is None:
+            self.load()
+
+        refs, self._pending = self._pending, []
+        self._adopt_existing_spelling(refs)
+
+        with transaction.atomic():
+            with optional_phase(self.metrics, "brands", rows=len(refs)):
+                self._attach_brands(refs)
+
+            with optional_phase(self.metrics, "write", rows=len(refs)):
+                self._write(refs)
+
+    def _write(self, refs: list[DTCReference]) -> None:
+        latest: dict[tuple[str, str], DTCReference] = {}
+
+        for ref in refs:
+            key = reference_key(ref.code, ref.manufacturer)
+
+            if key in latest:
+                current = latest[key].fingerprint
+            elif key in self._existing:
+                current = self._existing[key][1]
+            else:
+                current = None
+
+            if current is None:
+                self.created += 1
+            elif current == ref.fingerprint:
+                self.unchanged += 1
+            else:
+                self.updated += 1
+
+            latest[key] = ref
+
+        to_create = []
+        to_update = []
+        now = timezone.now()
+
+        for key, ref in latest.items():
+            existing = self._existing.get(key)
+
+            if existing is None:
+                to_create.append(ref)
+            elif existing[1] != ref.fingerprint:
+                # bulk_update не трогает auto_now, поэтому updated_at ставится явно.
+                ref.pk = existing[0]
+                ref.updated_at = now
+                to_update.append(ref)
+
+        if to_update:
+            DTCReference.objects.bulk_update(to_update, REFERENCE_UPDATE_FIELDS, batch_size=self.batch_size)
+
+            for ref in to_update:
+                self._existing[reference_key(ref.code, ref.manufacturer)] = (ref.pk, ref.fingerprint, ref.manufacturer)
+
+        if to_create:
+            DTCReference.objects.bulk_create(to_create, batch_size=self.batch_size)
+            self._remember_created(to_create)
+
+        if to_create or to_update:
+            self._written = True
+
+    def announce_changes(self) -> None:
+        """bulk_create / bulk_update не шлют сигналы: новая метка версии, если что-то записано."""
+        if self._written:
+            bump_dtc_generation()
+            self._written = False
+
+    def finish(self) -> dict[str, int]:
+        self.flush()
+        self.announce_changes()
+
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+        }
+
+    def _adopt_existing_spelling(self, refs: list[DTCReference]) -> None:
+        """Марка существующей записи в другом регистре ("Bmw" при "BMW" в БД) пишется как в БД."""
+        for ref in refs:
+            existing = self._existing.get(reference_key(ref.code, ref.manufacturer))
+
+            if existing is not None and existing[2] != ref.manufacturer:
+                ref.manufacturer = existing[2]
+                ref.normalize_fields()
+
+    def _attach_brands(self, refs: list[DTCReference]) -> None:
+        names = {ref.manufacturer for ref in refs if ref.manufacturer} - self._brands.keys()
+
+        if names:
+            VehicleBrand.objects.bulk_create(
+                [VehicleBrand(name=name, slug=brand_slug(name)) for name in sorted(names)],
+                ignore_conflicts=True,
+            )
+
+            for brand in VehicleBrand.objects.filter(name__in=names):
+                self._brands[brand.name] = brand
+
+            # Вставка пропущена из-за совпадения slug с другой маркой:
+            # тот же путь, что и раньше через get_or_create.
+            for name in names - self._brands.keys():
+                self._brands[name], _ = VehicleBrand.objects.get_or_create(
+                    name=name,
+                    defaults={"slug": brand_slug(name)},
+                )
+
+        for ref in refs:
+            ref.brand = self._brands.get(ref.manufacturer) if ref.manufacturer else None
+
+    def _remember_created(self, refs: list[DTCReference]) -> None:
+        if connection.features.can_return_rows_from_bulk_insert:
+            for ref in refs:
+                self._existing[reference_key(ref.code, ref.manufacturer)] = (ref.pk, ref.fingerprint, ref.manufacturer)
+            return
+
+        # MySQL не возвращает id из bulk_create: дочитываем их по кодам.
+        keys = {reference_key(ref.code, ref.manufacturer): ref.fingerprint for ref in refs}
+        codes = sorted({code for code, _ in keys})
+
+        for index in range(0, len(codes), self.batch_size):
+            rows = (
+                DTCReference.objects
+                .filter(code__in=codes[index:index + self.batch_size])
+                .values_list("code", "manufacturer", "id")
+            )
+
+            for code, manufacturer, pk in rows:
+                key = reference_key(code, manufacturer)
+                if key in keys:
+                    self._existing[key] = (pk, keys[key], manufacturer)
+
+
+class StagedBatchError(Exception):
+    """Пакет нельзя опубликовать или откатить в его текущем состоянии."""
+
+
+class DTCStagingWriter:
+    """
+    Загрузка строк пакета в DTCStagedReference вместо DTCReference. Интерфейс
+    тот же, что у DTCUpsertEngine; created/updated/unchanged остаются нулями —
+    их заполняет publish_staged_batch().
+    """
+
+    created = 0
+    updated = 0
+    unchanged = 0
+
+    def __init__(
+        self,
+        batch: DTCImportBatch,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        metrics: ImportMetrics | None = None,
+    ):
+        self.batch = batch
+        self.chunk_size = max(1, chunk_size)
+        self.batch_size = max(1, batch_size)
+        self.metrics = metrics
+
+        self.staged = 0
+        self.skipped = 0
+
+        self._pending: list[DTCStagedReference] = []
+
+    def load(self) -> None:
+        pass
+
+    def announce_changes(self) -> None:
+        """Справочник не меняется до публикации."""
+
+    def add_row(self, row: dict[str, Any], source_name: str = "", source_url: str = "") -> None:
+        fields = reference_fields_from_row(row, source_name, source_url)
+
+        if fields is None:
+            self.skipped += 1
+            return
+
+        self.add(fields)
+
+    def add(self, fields: dict[str, Any]) -> None:
+        ref = DTCReference(**fields)
+        ref.normalize_fields()
+
+        self._pending.append(DTCStagedReference(
+            batch=self.batch,
+            code=ref.code,
+            manufacturer=ref.manufacturer,
+            data={name: getattr(ref, name) for name in DTC_FINGERPRINT_FIELDS},
+            fingerprint=ref.fingerprint,
+        ))
+
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        rows, self._pending = self._pending, []
+
+        with optional_phase(self.metrics, "write", rows=len(rows)):
+            DTCStagedReference.objects.bulk_create(rows, batch_size=self.batch_size)
+
+        self.staged += len(rows)
+
+    def finish(self) -> dict[str, int]:
+        self.flush()
+        return {"staged": self.staged, "skipped": self.skipped}
+
+
+def snapshot_before_publish(
+    batch: DTCImportBatch,
+    rows: list[dict[str, Any]],
+    existing: dict[tuple[str, str], tuple[int, str, str]],
+    snapshotted: set[tuple[str, str]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Сохраняет в PREVIOUS строки DTCReference, которые изменит очередной
+    чанк публикации, и ключи, которые он создаст. Каждый ключ снимается
+    один раз — до первой записи; snapshotted пополняется на месте.
+    """
+    snapshots = []
+    changed_ids = []
+
+    for data in rows:
+        key = reference_key(data["code"], data["manufacturer"])
+
+        if key in snapshotted:
+            continue
+
+        current = existing.get(key)
+
+        if current is None:
+            snapshotted.add(key)
+            snapshots.append(DTCStagedReference(
+                batch=batch,
+                kind=DTCStagedReference.Kind.PREVIOUS,
+                code=data["code"],
+                manufacturer=data["manufacturer"],
+            ))
+        elif current[1] != dtc_reference_fingerprint({**data, "manufacturer": current[2]}):
+            snapshotted.add(key)
+            changed_ids.append(current[0])
+
+    columns = [*DTC_FINGERPRINT_FIELDS, "id", "brand_id", "import_batch_id", "fingerprint", "updated_at"]
+
+    for index in range(0, len(changed_ids), batch_size):
+        for values in DTCReference.objects.filter(id__in=changed_ids[index:index + batch_size]).values(*columns):
+            values["updated_at"] = values["updated_at"].isoformat()
+            snapshots.append(DTCStagedReference(
+                batch=batch,
+                kind=DTCStagedReference.Kind.PREVIOUS,
+                code=values["code"],
+                manufacturer=values["manufacturer"],
+                data=values,
+                fingerprint=values["fingerprint"],
+            ))
+
+    DTCStagedReference.objects.bulk_create(snapshots, batch_size=batch_size)
+
+    return len(snapshots)
+
+
+def publish_staged_batch(
+    batch: DTCImportBatch,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict[str, int]:
+    """
+    Публикация пакета из staging. Строки читаются по id чанками по
+    chunk_size; снимок изменяемых строк и запись чанка в DTCReference
+    идут в одной транзакции, так что в памяти и в блокировках никогда
+    не больше одного чанка. Смена статуса пакета — отдельная короткая
+    транзакция в конце.
+
+    Если публикация оборвалась, пакет остаётся STAGED и её можно
+    повторить: уже снятые ключи не переснимаются, поэтому откат вернёт
+    справочник к состоянию до первой попытки.
+
+    Публикации пакетов не должны выполняться параллельно.
+    """
+    if batch.status != DTCImportBatch.Status.STAGED:
+        raise StagedBatchError(f"Import batch {batch.pk} is not staged (status: {batch.status})")
+
+    incoming = batch.staged_references.filter(kind=DTCStagedReference.Kind.INCOMING)
+
+    if not incoming.exists():
+        raise StagedBatchError(f"Import batch {batch.pk} has no staged rows")
+
+    metrics = ImportMetrics()
+    engine = DTCUpsertEngine(batch=batch, chunk_size=chunk_size, batch_size=batch_size, metrics=metrics)
+    total = 0
+
+    with metrics.capture():
+        engine.load()
+
+        snapshotted = {
+            reference_key(code, manufacturer)
+            for code, manufacturer in (
+                batch.staged_references
+                .filter(kind=DTCStagedReference.Kind.PREVIOUS)
+                .values_list("code", "manufacturer")
+                .iterator(chunk_size=10000)
+            )
+        }
+        last_id = 0
+
+        while True:
+            with metrics.phase("load_staged"):
+                chunk = list(
+                    incoming
+                    .filter(id__gt=last_id)
+                    .order_by("id")
+                    .values_list("id", "data")[:engine.chunk_size]
+                )
+
+            if not chunk:
+                break
+
+            last_id = chunk[-1][0]
+            rows = [data for _, data in chunk]
+            total += len(rows)
+
+            with transaction.atomic():
+                with metrics.phase("snapshot", rows=len(rows)):
+                    snapshot_before_publish(batch, rows, engine._existing, snapshotted, batch_size)
+
+                with metrics.phase("normalize", rows=len(rows)):
+                    for data in rows:
+                        engine.add(data)
+
+                engine.flush()
+
+        with transaction.atomic():
+            stats = engine.finish()
+
+            batch.status = DTCImportBatch.Status.PUBLISHED
+            batch.published_at = timezone.now()
+            batch.rows_created = stats["created"]
+            batch.rows_updated = stats["updated"]
+            batch.rows_unchanged = stats["unchanged"]
+            batch.metrics = {**batch.metrics, "publish": metrics.as_dict(rows=total)}
+            batch.save(update_fields=[
+                "status",
+                "published_at",
+                "rows_created",
+                "rows_updated",
+                "rows_unchanged",
+                "metrics",
+            ])
+
+    incoming.delete()
+
+    return stats
+
+
+def rollback_published_batch(batch: DTCImportBatch, batch_size: int = DEFAULT_BATCH_SIZE) -> dict[str, int]:
+    """
+    Откат опубликованного пакета по снимку PREVIOUS: изменённые строки
+    возвращаются к прежним значениям, созданные пакетом удаляются.
+
+    Откатить можно только пакет, после публикации которого справочник
+    никто не менял: ни другой импорт (обычный или через staging), ни
+    правка отдельных строк — иначе откат молча затёр бы более поздние
+    изменения.
+    """
+    if batch.status != DTCImportBatch.Status.PUBLISHED:
+        raise StagedBatchError(f"Import batch {batch.pk} is not published (status: {batch.status})")
+
+    newer = (
+        DTCImportBatch.objects
+        .exclude(pk=batch.pk)
+        .exclude(status__in=[DTCImportBatch.Status.STAGED, DTCImportBatch.Status.ROLLED_BACK])
+        .filter(Q(created_at__gt=batch.published_at) | Q(published_at__gt=batch.published_at))
+        .filter(Q(rows_created__gt=0) | Q(rows_updated__gt=0) | Q(status=DTCImportBatch.Status.RUNNING))
+    )
+    if newer.exists():
+        raise StagedBatchError(f"Import batch {batch.pk} was followed by later imports and cannot be rolled back")
+
+    restore = []
+    created_keys = set()
+
+    for row in batch.staged_references.filter(kind=DTCStagedReference.Kind.PREVIOUS).iterator(chunk_size=10000):
+        if not row.data:
+            created_keys.add(reference_key(row.code, row.manufacturer))
+            continue
+
+        data = row.data
+        restore.append(DTCReference(
+            id=data["id"],
+            brand_id=data["brand_id"],
+            import_batch_id=data["import_batch_id"],
+            fingerprint=data["fingerprint"],
+            updated_at=parse_datetime(data["updated_at"]),
+            **{name: data[name] for name in DTC_FINGERPRINT_FIELDS},
+        ))
+
+    # Созданные строки ищутся по ключам из снимка: import_batch мог смениться.
+    created_codes = sorted({code for code, _ in created_keys})
+    created_ids = []
+
+    for index in range(0, len(created_codes), batch_size):
+        created_ids.extend(
+            pk
+            for pk, code, manufacturer in (
+                DTCReference.objects
+                .filter(code__in=created_codes[index:index + batch_size])
+                .values_list("id", "code", "manufacturer")
+            )
+            if reference_key(code, manufacturer) in created_keys
+        )
+
+    touched_ids = [ref.id for ref in restore] + created_ids
+    for index in range(0, len(touched_ids), batch_size):
+        edited = DTCReference.objects.filter(
+            id__in=touched_ids[index:index + batch_size],
+            updated_at__gt=batch.published_at,
+        )
+        if edited.exists():
+            raise StagedBatchError(
+                f"References written by import batch {batch.pk} were edited after publishing; rollback refused"
+            )
+
+    with transaction.atomic():
+        if restore:
+            DTCReference.objects.bulk_update(restore, REFERENCE_UPDATE_FIELDS, batch_size=batch_size)
+
+        for index in range(0, len(created_ids), batch_size):
+            DTCReference.objects.filter(id__in=created_ids[index:index + batch_size]).delete_without_bump()
+
+        bump_dtc_generation()
+
+        batch.status = DTCImportBatch.Status.ROLLED_BACK
+        batch.save(update_fields=["status"])
+
+    batch.staged_references.all().delete()
+
+    return {"restored": len(restore), "deleted": len(created_ids)}
+
+
+def vehicle_manufacturer(vehicle_model: str, manufacturers: list[str]) -> str:
+    """
+    Марка сессии по началу vehicle_model ("BMW X5 (F15)" -> "bmw").
+    manufacturers — в casefold, от длинных к коротким, чтобы
+    "land rover" находился раньше "land".
+    """
+    value = (vehicle_model or "").strip().casefold()
+
+    for manufacturer in manufacturers:
+        if value == manufacturer or value.startswith(manufacturer + " "):
+            return manufacturer
+
+    return ""
+
+
+def link_manufacturer_references(chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Непривязанные DiagnosticCode сессий с известной маркой -> бренд-специфичный
+    DTCReference. Карта (code, марка) -> id строится в памяти, коды читаются
+    чанками по id и записываются через bulk_update.
+    """
+    refs = {
+        (code, manufacturer.casefold()): pk
+        for code, manufacturer, pk in (
+            DTCReference.objects
+            .exclude(manufacturer="")
+            .values_list("code", "manufacturer", "id")
+            .iterator(chunk_size=10000)
+        )
+    }
+
+    if not refs:
+        return 0
+
+    manufacturers = sorted({manufacturer for _, manufacturer in refs}, key=len, reverse=True)
+    codes = {code for code, _ in refs}
+    linked = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            DiagnosticCode.objects
+            .filter(reference__isnull=True, id__gt=last_id)
+            .exclude(code="")
+            .order_by("id")
+            .values_list("id", "code", "session__vehicle_model")[:chunk_size]
+        )
+
+        if not rows:
+            break
+
+        last_id = rows[-1][0]
+        updates = []
+
+        for pk, code, vehicle_model in rows:
+            if code not in codes:
+                continue
+
+            manufacturer = vehicle_manufacturer(vehicle_model, manufacturers)
+            ref_id = refs.get((code, manufacturer)) if manufacturer else None
+
+            if ref_id:
+                updates.append(DiagnosticCode(id=pk, reference_id=ref_id))
+
+        if updates:
+            DiagnosticCode.objects.bulk_update(updates, ["reference"], batch_size=DEFAULT_BATCH_SIZE)
+            linked += len(updates)
+
+    return linked
+
+
+def link_generic_references() -> int:
+    """Оставшиеся непривязанные коды -> generic DTCReference одним UPDATE с подзапросом."""
+    generic = (
+        DTCReference.objects
+        .filter(code=OuterRef("code"), manufacturer="")
+        .order_by()
+        .values("id")[:1]
+    )
+
+    return (
+        DiagnosticCode.objects
+        .filter(reference__isnull=True)
+        .exclude(code="")
+        .filter(Exists(generic))
+        .update(reference=Subquery(generic))
+    )
+
+
+def relink_diagnostic_codes(chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, int]:
+    """Привязка кодов сессий к справочнику: сначала по марке, затем generic."""
+    return {
+        "manufacturer": link_manufacturer_references(chunk_size),
+        "generic": link_generic_references(),
+    }
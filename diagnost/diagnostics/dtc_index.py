@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connection
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from diagnostics.models import DTCImportBatch, DTCReference, DTCReferenceGeneration
+
+
+# Как часто (секунды) процесс сверяет версию справочника, если сам его не менял.
+DEFAULT_CHECK_SECONDS = 5.0
+# Сколько полных записей DTCReference держать в памяти для страниц кодов.
+DEFAULT_MAX_DETAILS = 5000
+
+GENERATION_ROW_ID = 1
+
+
+class DTCIndexEntry(NamedTuple):
+    id: int
+    is_active: bool
+    title_ru: str
+    fingerprint: str
+    updated_at: datetime
+
+
+def check_seconds() -> float:
+    return getattr(settings, "DTC_INDEX_CHECK_SECONDS", DEFAULT_CHECK_SECONDS)
+
+
+def max_details() -> int:
+    return getattr(settings, "DTC_INDEX_MAX_DETAILS", DEFAULT_MAX_DETAILS)
+
+
+def current_generation() -> str:
+    return (
+        DTCReferenceGeneration.objects
+        .filter(pk=GENERATION_ROW_ID)
+        .values_list("generation", flat=True)
+        .first()
+    ) or ""
+
+
+def bump_dtc_generation(changed: Iterable[DTCReference] | None = None, removed: Iterable[int] = ()) -> None:
+    """
+    Новая метка версии справочника. Вызывается один раз на операцию:
+    save()/delete() записи, импорт, публикацию и откат пакета. Запись идёт
+    в текущей транзакции, поэтому другие процессы видят новую метку вместе
+    с данными.
+
+    changed/removed — записи, которые операция создала или изменила, и id
+    удалённых. Если метка в БД совпадает с загруженной в индекс этого
+    процесса, индекс дополняется ими без перечитывания таблицы.
+    """
+    generation = uuid.uuid4().hex
+    now = timezone.now()
+    known = dtc_index.generation if changed is not None or removed else None
+
+    dtc_index.mark_written()
+
+    if known is not None:
+        patched = (
+            DTCReferenceGeneration.objects
+            .filter(pk=GENERATION_ROW_ID, generation=known)
+            .update(generation=generation, changed_at=now)
+        )
+
+        if patched:
+            dtc_index.patch(generation, changed or (), removed)
+            return
+
+    updated = (
+        DTCReferenceGeneration.objects
+        .filter(pk=GENERATION_ROW_ID)
+        .update(generation=generation, changed_at=now)
+    )
+
+    if not updated:
+        DTCReferenceGeneration.objects.update_or_create(
+            pk=GENERATION_ROW_ID,
+            defaults={"generation": generation},
+        )
+
+    dtc_index.invalidate()
+
+
+class DTCReferenceIndex:
+    """
+    Индекс справочника DTC в памяти процесса: (code, manufacturer) -> id,
+    активность и title_ru. Загружается одним запросом при первом
+    обращении и перезагружается, когда меняется метка DTCReferenceGeneration.
+
+    Метка сверяется не на каждый поиск: раз в DTC_INDEX_CHECK_SECONDS
+    и в начале каждого HTTP-запроса. Если процесс сам менял справочник
+    внутри транзакции, метка сверяется на каждом поиске, пока проверка не
+    пройдёт вне транзакции: транзакцию могли откатить.
+
+    Свои изменения процесс вносит в индекс сразу (patch()), без полной
+    перезагрузки. Структуры индекса при этом не меняются на месте, а
+    заменяются копиями: читатели в других потоках видят либо старую, либо
+    новую версию.
+
+    Полные записи для страниц кодов читаются из БД при первом обращении
+    и держатся до смены версии (не больше DTC_INDEX_MAX_DETAILS). Это
+    общие объекты: изменять их нельзя.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], DTCIndexEntry] | None = None
+        self._by_code: dict[str, list[str]] = {}
+        self._active_keys: list[tuple[str, str, int]] = []
+        self._key_by_id: dict[int, tuple[str, str]] = {}
+        self._details: OrderedDict[int, DTCReference] = OrderedDict()
+        self._generation: str | None = None
+        self._checked_at = 0.0
+        self._written_in_transaction = False
+
+    @property
+    def generation(self) -> str | None:
+        """Метка загруженной версии; None, если индекс ещё не загружен."""
+        return self._generation if self._entries is not None else None
+
+    def invalidate(self) -> None:
+        """Следующее обращение сверит метку версии с БД."""
+        self._checked_at = 0.0
+
+    def mark_written(self) -> None:
+        if connection.in_atomic_block:
+            self._written_in_transaction = True
+
+    def _current(self) -> dict[tuple[str, str], DTCIndexEntry]:
+        now = time.monotonic()
+        fresh = now - self._checked_at < check_seconds()
+
+        if self._entries is not None and fresh and not self._written_in_transaction:
+            return self._entries
+
+        generation = current_generation()
+
+        with self._lock:
+            if self._entries is None or generation != self._generation:
+                self._load(generation)
+
+            self._checked_at = now
+            if not connection.in_atomic_block:
+                self._written_in_transaction = False
+
+            return self._entries
+
+    def _load(self, generation: str) -> None:
+        entries = {}
+        by_code: dict[str, list[str]] = {}
+        active_keys = []
+        key_by_id = {}
+
+        for pk, code, manufacturer, is_active, title_ru, fingerprint, updated_at in (
+            DTCReference.objects
+            .order_by("code", "manufacturer")
+            .values_list("id", "code", "manufacturer", "is_active", "title_ru", "fingerprint", "updated_at")
+            .iterator(chunk_size=10000)
+        ):
+            entries[(code, manufacturer)] = DTCIndexEntry(pk, is_active, title_ru, fingerprint, updated_at)
+            by_code.setdefault(code, []).append(manufacturer)
+            key_by_id[pk] = (code, manufacturer)
+            if is_active:
+                active_keys.append((code, manufacturer, pk))
+
+        # Порядок сортировки БД зависит от collation: для bisect нужен питоновский.
+        active_keys.sort()
+
+        self._entries = entries
+        self._by_code = by_code
+        self._active_keys = active_keys
+        self._key_by_id = key_by_id
+        self._details = OrderedDict()
+        self._generation = generation
+
+    def patch(self, generation: str, changed: Iterable[DTCReference], removed: Iterable[int] = ()) -> None:
+        """Изменения этого процесса поверх загруженной версии — вместо перезагрузки таблицы."""
+        with self._lock:
+            if self._entries is None:
+                return
+
+            entries = dict(self._entries)
+            by_code = dict(self._by_code)
+            active_keys = list(self._active_keys)
+            key_by_id = dict(self._key_by_id)
+            details = OrderedDict(self._details)
+
+            def discard(pk):
+                key = key_by_id.pop(pk, None)
+                details.pop(pk, None)
+
+                if key is None:
+                    return
+
+                entry = entries.pop(key, None)
+                manufacturers = [item for item in by_code.get(key[0], []) if item != key[1]]
+                if manufacturers:
+                    by_code[key[0]] = manufacturers
+                else:
+                    by_code.pop(key[0], None)
+
+                if entry is not None and entry.is_active:
+                    position = bisect_left(active_keys, (*key, pk))
+                    if position < len(active_keys) and active_keys[position] == (*key, pk):
+                        del active_keys[position]
+
+            for pk in removed:
+                discard(pk)
+
+            for ref in changed:
+                discard(ref.pk)
+
+                key = (ref.code, ref.manufacturer)
+                entries[key] = DTCIndexEntry(ref.pk, ref.is_active, ref.title_ru, ref.fingerprint, ref.updated_at)
+                key_by_id[ref.pk] = key
+                by_code[ref.code] = sorted({*by_code.get(ref.code, []), ref.manufacturer})
+
+                if ref.is_active:
+                    insort(active_keys, (*key, ref.pk))
+
+            self._entries = entries
+            self._by_code = by_code
+            self._active_keys = active_keys
+            self._key_by_id = key_by_id
+            self._details = details
+            self._generation = generation
+
+    def snapshot(self) -> tuple[str, dict[tuple[str, str], DTCIndexEntry]]:
+        """Метка версии и все записи индекса — для построенных поверх него индексов."""
+        entries = self._current()
+        return self._generation, entries
+
+    def get(self, code: str, manufacturer: str = "") -> DTCIndexEntry | None:
+        return self._current().get((code, manufacturer))
+
+    def get_many(self, codes, manufacturer: str = "") -> dict[str, DTCIndexEntry]:
+        entries = self._current()
+        return {code: entries[(code, manufacturer)] for code in codes if (code, manufacturer) in entries}
+
+    def manufacturers(self, code: str) -> list[str]:
+        self._current()
+        return list(self._by_code.get(code, []))
+
+    def resolve(self, codes, brand: str = "") -> dict[str, DTCIndexEntry]:
+        """
+        Активная запись для каждого кода: сначала запись марки brand
+        (без учёта регистра), иначе generic. Коды без записи не попадают в ответ.
+        """
+        entries = self._current()
+        brand = (brand or "").strip().casefold()
+        resolved = {}
+
+        for code in codes:
+            entry = None
+
+            if brand:
+                for manufacturer in self._by_code.get(code, ()):
+                    candidate = entries.get((code, manufacturer))
+                    if manufacturer.casefold() == brand and candidate is not None and candidate.is_active:
+                        entry = candidate
+                        break
+
+            if entry is None:
+                entry = entries.get((code, ""))
+                if entry is not None and not entry.is_active:
+                    entry = None
+
+            if entry is not None:
+                resolved[code] = entry
+
+        return resolved
+
+    def active_keys(self) -> list[tuple[str, str, int]]:
+        """Отсортированные (code, manufacturer, id) активных записей — для поиска bisect."""
+        self._current()
+        return self._active_keys
+
+    def detail(self, code: str, manufacturer: str = "", active_only: bool = True) -> DTCReference | None:
+        entry = self.get(code, manufacturer)
+
+        if entry is None or (active_only and not entry.is_active):
+            return None
+
+        ref = self._details.get(entry.id)
+
+        if ref is not None:
+            self._details.move_to_end(entry.id)
+            return ref
+
+        ref = DTCReference.objects.filter(pk=entry.id).first()
+
+        if ref is not None:
+            with self._lock:
+                self._details[entry.id] = ref
+                while len(self._details) > max_details():
+                    self._details.popitem(last=False)
+
+        return ref
+
+
+dtc_index = DTCReferenceIndex()
+
+
+def get_dtc_index() -> DTCReferenceIndex:
+    return dtc_index
+
+
+def reference_saved(sender, instance, **kwargs):
+    bump_dtc_generation(changed=[instance])
+
+
+def import_batch_saved(sender, created=False, **kwargs):
+    if created:
+        bump_dtc_generation()
+
+
+def request_began(sender, **kwargs):
+    dtc_index.invalidate()
+
+
+def connect_signals() -> None:
+    """Вызывается из DiagnosticsConfig.ready()."""
+    # Удаления меняют метку не сигналом, а в DTCReference.delete() и QuerySet.delete():
+    # обработчик post_delete отключает быстрое удаление и давал бы UPDATE на каждую строку.
+    post_save.connect(reference_saved, sender=DTCReference, dispatch_uid="dtc_index_reference_saved")
+    post_save.connect(import_batch_saved, sender=DTCImportBatch, dispatch_uid="dtc_index_batch_created")
+    request_started.connect(request_began, dispatch_uid="dtc_index_request_started")
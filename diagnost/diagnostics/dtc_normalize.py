@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from diagnostics.dtc_import import reference_key
+from diagnostics.models import (
+    DTC_FINGERPRINT_FIELDS,
+    DiagnosticCode,
+    DTCReference,
+    dtc_reference_fingerprint,
+    normalize_dtc_code,
+    normalized_reference_values,
+)
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+REFERENCE_NORMALIZED_FIELDS = ["code", "manufacturer", "system", "scope", "fingerprint"]
+
+
+def normalize_dtc_references(
+    reference_model=DTCReference,
+    code_model=DiagnosticCode,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, int]:
+    """
+    Пакетная нормализация DTCReference по правилам normalize_fields():
+    таблица читается чанками по id, изменённые строки пишутся одним
+    bulk_update на чанк, без save() на каждую строку.
+
+    Если после нормализации ключ (code, manufacturer) совпал с уже
+    существующей строкой, остаётся существующая: ссылки DiagnosticCode
+    переводятся на неё, дубль удаляется.
+
+    Модели передаются параметрами.
+    """
+    keys = {
+        reference_key(code, manufacturer): pk
+        for code, manufacturer, pk in (
+            reference_model.objects
+            .values_list("code", "manufacturer", "id")
+            .iterator(chunk_size=10000)
+        )
+    }
+
+    normalized = 0
+    duplicates: dict[int, int] = {}
+    last_id = 0
+
+    while True:
+        rows = list(
+            reference_model.objects
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values("id", "fingerprint", *DTC_FINGERPRINT_FIELDS)[:chunk_size]
+        )
+
+        if not rows:
+            break
+
+        last_id = rows[-1]["id"]
+        updates = []
+
+        for row in rows:
+            old_key = reference_key(row["code"], row["manufacturer"])
+            original = (row["code"], row["manufacturer"], row["system"], row["scope"], row["fingerprint"])
+
+            values = normalized_reference_values(row["code"], row["manufacturer"], row["system"], row["scope"])
+            row["code"], row["manufacturer"], row["system"], row["scope"] = values
+            fingerprint = dtc_reference_fingerprint(row)
+
+            if (*values, fingerprint) == original:
+                continue
+
+            new_key = reference_key(row["code"], row["manufacturer"])
+            owner = keys.get(new_key)
+
+            if new_key != old_key and owner is not None and owner != row["id"]:
+                duplicates[row["id"]] = owner
+                continue
+
+            if new_key != old_key:
+                keys.pop(old_key, None)
+                keys[new_key] = row["id"]
+
+            updates.append(reference_model(
+                id=row["id"],
+                code=row["code"],
+                manufacturer=row["manufacturer"],
+                system=row["system"],
+                scope=row["scope"],
+                fingerprint=fingerprint,
+            ))
+
+        if updates:
+            reference_model.objects.bulk_update(updates, REFERENCE_NORMALIZED_FIELDS)
+            normalized += len(updates)
+
+    for duplicate_id, owner_id in duplicates.items():
+        code_model.objects.filter(reference_id=duplicate_id).update(reference_id=owner_id)
+
+    if duplicates:
+        reference_model.objects.filter(id__in=list(duplicates)).delete()
+
+    return {"normalized": normalized, "merged": len(duplicates)}
+
+
+def normalize_diagnostic_codes(code_model=DiagnosticCode, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Коды сессий в верхний регистр без пробелов по краям, чанками по id."""
+    normalized = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            code_model.objects
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "code")[:chunk_size]
+        )
+
+        if not rows:
+            break
+
+        last_id = rows[-1][0]
+        updates = [
+            code_model(id=pk, code=normalize_dtc_code(code))
+            for pk, code in rows
+            if normalize_dtc_code(code) != code
+        ]
+
+        if updates:
+            code_model.objects.bulk_update(updates, ["code"])
+            normalized += len(updates)
+
+    return normalized
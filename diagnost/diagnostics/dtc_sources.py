@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import gzip
+import io
+import json
+import zipfile
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZIP_MAGIC = b"PK\x03\x04"
+
+# Сколько байт распакованного потока смотрится для выбора CSV / JSON Lines.
+SNIFF_BYTES = 512
+
+# Ключ строки, которую не удалось прочитать (битый JSON и т.п.).
+ROW_ERROR_KEY = "__error__"
+
+# Номер строки файла у записи JSON Lines: пустые строки тоже считаются.
+ROW_LINE_KEY = "__line__"
+
+# Меньше этого кусок файла не делится между процессами валидации.
+MIN_SHARD_BYTES = 1024 * 1024
+
+
+class UnsupportedDTCSource(Exception):
+    """Файл справочника не удаётся открыть ни одним из поддерживаемых способов."""
+
+
+def not_utf8(name: str, exc: UnicodeDecodeError) -> UnsupportedDTCSource:
+    return UnsupportedDTCSource(f"{name} is not valid UTF-8: {exc.reason}")
+
+
+def strict_rows(rows: Iterator[dict[str, Any]], name: str) -> Iterator[dict[str, Any]]:
+    """Битый UTF-8 посреди файла — ошибка источника, а не исключение из TextIOWrapper."""
+    try:
+        yield from rows
+    except UnicodeDecodeError as exc:
+        raise not_utf8(name, exc) from exc
+
+
+@dataclass
+class DTCRowSource:
+    """
+    Открытый файл справочника. rows — словари в формате строки CSV,
+    position() — сколько байт исходного (сжатого) файла прочитано.
+    """
+
+    rows: Iterator[dict[str, Any]]
+    format: str
+    container: str
+    size: int
+    position: Callable[[], int]
+    # Номер первой строки данных в файле: у CSV первая строка — заголовок.
+    first_line: int
+
+
+def detect_container(head: bytes) -> str:
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZIP_MAGIC):
+        return "zip"
+    return "plain"
+
+
+def detect_text_format(head: bytes) -> str:
+    head = head.removeprefix(codecs.BOM_UTF8).lstrip()
+    return "jsonl" if head.startswith(b"{") else "csv"
+
+
+def zip_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """Первый файл архива; служебные файлы macOS пропускаются."""
+    for info in archive.infolist():
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/"):
+            return info
+
+    raise UnsupportedDTCSource("ZIP archive has no files")
+
+
+def iter_jsonl_rows(lines, first_line: int = 1) -> Iterator[dict[str, Any]]:
+    """
+    JSON Lines -> словари строк. Пустые строки пропускаются, битые отдаются
+    с ROW_ERROR_KEY; у каждой записи в ROW_LINE_KEY — номер её строки в lines,
+    считая от first_line.
+    """
+    for line_number, line in enumerate(lines, start=first_line):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            value = json.loads(line)
+        except ValueError as exc:
+            yield {ROW_ERROR_KEY: f"invalid JSON: {exc}", ROW_LINE_KEY: line_number}
+            continue
+
+        if not isinstance(value, dict):
+            yield {ROW_ERROR_KEY: "JSON line is not an object", ROW_LINE_KEY: line_number}
+            continue
+
+        row = {key: "" if item is None else str(item) for key, item in value.items()}
+        row[ROW_LINE_KEY] = line_number
+        yield row
+
+
+@contextmanager
+def open_dtc_rows(path: str | Path, delimiter: str = ",") -> Iterator[DTCRowSource]:
+    """
+    Открывает CSV или JSON Lines, в том числе внутри gzip или zip, без
+    распаковки на диск. Контейнер определяется по сигнатуре файла, формат
+    текста — по первым байтам распакованного потока.
+    """
+    path = Path(path)
+
+    with ExitStack() as stack:
+        raw = stack.enter_context(path.open("rb"))
+        container = detect_container(raw.read(len(ZIP_MAGIC)))
+        raw.seek(0)
+
+        if container == "gzip":
+            stream = stack.enter_context(gzip.GzipFile(fileobj=raw, mode="rb"))
+        elif container == "zip":
+            try:
+                archive = stack.enter_context(zipfile.ZipFile(raw))
+            except zipfile.BadZipFile as exc:
+                raise UnsupportedDTCSource(f"Broken ZIP archive: {path.name}") from exc
+            stream = stack.enter_context(archive.open(zip_member(archive)))
+        else:
+            stream = raw
+
+        try:
+            text_format = detect_text_format(stream.peek(SNIFF_BYTES))
+        except (OSError, EOFError) as exc:
+            raise UnsupportedDTCSource(f"Cannot read {path.name}: {exc}") from exc
+
+        text = stack.enter_context(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+        if text_format == "jsonl":
+            rows = iter_jsonl_rows(text)
+        else:
+            rows = iter(csv.DictReader(text, delimiter=delimiter))
+
+        yield DTCRowSource(
+            rows=strict_rows(rows, path.name),
+            format=text_format,
+            container=container,
+            size=path.stat().st_size,
+            position=raw.tell,
+            first_line=1 if text_format == "jsonl" else 2,
+        )
+
+
+def byte_ranges(start: int, end: int, parts: int) -> list[tuple[int, int]]:
+    """Делит [start, end) на parts смежных диапазонов примерно равной длины."""
+    parts = max(1, min(parts, (end - start) // MIN_SHARD_BYTES or 1))
+    step = (end - start) // parts
+    bounds = [start + step * index for index in range(parts)] + [end]
+    return list(zip(bounds, bounds[1:]))
+
+
+def iter_range_lines(path: str | Path, start: int, end: int) -> Iterator[bytes]:
+    """
+    Строки файла, которые начинаются в [start, end). Строка, начатая до
+    start, дочитывается и отбрасывается — её отдаёт предыдущий диапазон,
+    поэтому смежные диапазоны покрывают каждую строку ровно один раз.
+    """
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
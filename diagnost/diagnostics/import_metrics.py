@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_kb() -> int | None:
+    """Пиковый RSS процесса. На macOS ru_maxrss в байтах, на Linux — в КБ."""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def rows_per_second(rows: int, seconds: float) -> float | None:
+    return round(rows / seconds, 1) if rows and seconds else None
+
+
+class ImportMetrics:
+    """
+    Время, число SQL-запросов и строк по фазам импорта.
+
+    Фазы могут быть вложенными (запись пакета внутри добавления строки):
+    время и запросы относятся к самой внутренней фазе, поэтому сумма
+    по фазам равна общему времени без двойного счёта. Запросы вне фаз
+    попадают в фазу "other".
+    """
+
+    def __init__(self):
+        self.phases: dict[str, dict[str, float]] = {}
+        self._stack: list[list[Any]] = []
+        self._started = time.perf_counter()
+
+    def _phase_stats(self, name: str) -> dict[str, float]:
+        return self.phases.setdefault(name, {"seconds": 0.0, "queries": 0, "rows": 0})
+
+    @contextmanager
+    def phase(self, name: str, rows: int = 0):
+        # [имя, начало, время вложенных фаз]
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+
+            stats = self._phase_stats(name)
+            stats["seconds"] += elapsed - frame[2]
+            stats["rows"] += rows
+
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def add_rows(self, name: str, rows: int) -> None:
+        self._phase_stats(name)["rows"] += rows
+
+    def count_query(self, execute, sql, params, many, context):
+        name = self._stack[-1][0] if self._stack else "other"
+        self._phase_stats(name)["queries"] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def capture(self):
+        """Подсчёт запросов текущего соединения на время блока."""
+        with connection.execute_wrapper(self.count_query):
+            yield
+
+    def as_dict(self, rows: int = 0) -> dict[str, Any]:
+        total = time.perf_counter() - self._started
+        phases = {}
+
+        for name, stats in self.phases.items():
+            seconds = stats["seconds"]
+            phases[name] = {
+                "seconds": round(seconds, 3),
+                "queries": stats["queries"],
+                "rows": stats["rows"],
+                "rows_per_second": rows_per_second(stats["rows"], seconds),
+            }
+
+        return {
+            "total_seconds": round(total, 3),
+            "rows": rows,
+            "rows_per_second": rows_per_second(rows, total),
+            "queries": sum(stats["queries"] for stats in self.phases.values()),
+            "peak_rss_kb": peak_rss_kb(),
+            "phases": phases,
+        }
+
+
+def merge_metrics(previous: dict[str, Any] | None, current: dict[str, Any]) -> dict[str, Any]:
+    """
+    Сводка нескольких запусков одной команды (импорт, продолженный через
+    --resume): время, запросы и строки суммируются, пиковый RSS — максимум,
+    в attempts — число запусков.
+    """
+    if not previous:
+        return {**current, "attempts": 1}
+
+    phases = {name: dict(stats) for name, stats in previous.get("phases", {}).items()}
+
+    for name, stats in current["phases"].items():
+        merged = phases.setdefault(name, {"seconds": 0.0, "queries": 0, "rows": 0})
+        merged["seconds"] = round(merged["seconds"] + stats["seconds"], 3)
+        merged["queries"] += stats["queries"]
+        merged["rows"] += stats["rows"]
+        merged["rows_per_second"] = rows_per_second(merged["rows"], merged["seconds"])
+
+    total = round(previous["total_seconds"] + current["total_seconds"], 3)
+    rows = previous["rows"] + current["rows"]
+    peaks = [peak for peak in (previous.get("peak_rss_kb"), current["peak_rss_kb"]) if peak is not None]
+
+    return {
+        "total_seconds": total,
+        "rows": rows,
+        "rows_per_second": rows_per_second(rows, total),
+        "queries": previous["queries"] + current["queries"],
+        "peak_rss_kb": max(peaks, default=None),
+        "phases": phases,
+        "attempts": previous.get("attempts", 1) + 1,
+    }
+
+
+@contextmanager
+def optional_phase(metrics: ImportMetrics | None, name: str, rows: int = 0):
+    if metrics is None:
+        yield
+        return
+
+    with metrics.phase(name, rows):
+        yield
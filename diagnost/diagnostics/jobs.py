@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from diagnostics.models import DiagnosticJob
+from diagnostics.report_formats import UnsupportedReportFormat, parse_and_apply_report
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# Пауза перед повтором упавшей задачи, удваивается с каждой попыткой.
+DEFAULT_RETRY_DELAY_SECONDS = 30
+
+# Ошибки, которые не исчезнут при повторе: задача сразу помечается FAILED.
+PERMANENT_ERRORS = (UnsupportedReportFormat,)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    base = getattr(settings, "DIAGNOSTIC_JOB_RETRY_DELAY_SECONDS", DEFAULT_RETRY_DELAY_SECONDS)
+    return timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def run_launch_parse(job: DiagnosticJob) -> dict[str, Any]:
+    report_format, codes = parse_and_apply_report(job.session)
+    return {"format": report_format, "codes": codes}
+
+
+JOB_HANDLERS = {
+    DiagnosticJob.Kind.LAUNCH_PARSE: run_launch_parse,
+}
+
+
+def enqueue_launch_parse(session) -> DiagnosticJob:
+    return DiagnosticJob.objects.create(
+        session=session,
+        kind=DiagnosticJob.Kind.LAUNCH_PARSE,
+    )
+
+
+def claim_next_job(worker: str) -> DiagnosticJob | None:
+    """
+    Забирает самую старую задачу из очереди. SELECT ... FOR UPDATE SKIP LOCKED:
+    несколько воркеров не получат одну и ту же задачу и не ждут друг друга.
+    Задачи, отложенные после ошибки (not_before в будущем), пропускаются.
+    """
+    with transaction.atomic():
+        job = (
+            DiagnosticJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=DiagnosticJob.Status.PENDING)
+            .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()))
+            .order_by("id")
+            .first()
+        )
+
+        if job is None:
+            return None
+
+        job.status = DiagnosticJob.Status.RUNNING
+        job.attempts += 1
+        job.worker = worker[:128]
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "attempts", "worker", "started_at"])
+
+    return job
+
+
+def run_job(job: DiagnosticJob) -> DiagnosticJob:
+    handler = JOB_HANDLERS[job.kind]
+
+    try:
+        job.result = handler(job) or {}
+    except PERMANENT_ERRORS as exc:
+        logger.warning("Diagnostic job %s rejected: %s", job.id, exc)
+
+        job.error = f"{type(exc).__name__}: {exc}"
+        job.status = DiagnosticJob.Status.FAILED
+        note_session_error(job)
+    except Exception as exc:
+        logger.exception("Diagnostic job %s failed", job.id)
+
+        job.error = f"{type(exc).__name__}: {exc}"
+
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = DiagnosticJob.Status.FAILED
+            note_session_error(job)
+        else:
+            job.status = DiagnosticJob.Status.PENDING
+    else:
+        job.status = DiagnosticJob.Status.DONE
+        job.error = ""
+
+    job.finished_at = timezone.now()
+
+    if job.status == DiagnosticJob.Status.PENDING:
+        job.not_before = job.finished_at + retry_delay(job.attempts)
+
+    job.save(update_fields=["status", "result", "error", "finished_at", "not_before"])
+
+    return job
+
+
+def note_session_error(job: DiagnosticJob) -> None:
+    session = job.session
+    session.notes = ((session.notes or "") + f"\nReport parse error: {job.error}").strip()
+    session.save(update_fields=["notes"])
+
+
+def requeue_stale_jobs(older_than: timedelta) -> int:
+    """
+    Возвращает в очередь задачи, чей воркер умер, не закончив работу.
+    Зависшая попытка считается упавшей: повтор откладывается так же, как
+    в run_job(), а после MAX_ATTEMPTS задача помечается FAILED — отчёт,
+    который роняет воркер, не перезапускает его бесконечно.
+    """
+    now = timezone.now()
+    stale = 0
+
+    with transaction.atomic():
+        jobs = (
+            DiagnosticJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status=DiagnosticJob.Status.RUNNING,
+                started_at__lt=now - older_than,
+            )
+        )
+
+        for job in jobs:
+            stale += 1
+            job.error = f"Worker {job.worker} did not finish the job"
+            job.finished_at = now
+
+            if job.attempts >= MAX_ATTEMPTS:
+                logger.warning("Diagnostic job %s failed: %s", job.id, job.error)
+
+                job.status = DiagnosticJob.Status.FAILED
+                note_session_error(job)
+            else:
+                job.status = DiagnosticJob.Status.PENDING
+                job.not_before = now + retry_delay(job.attempts)
+
+            job.save(update_fields=["status", "error", "finished_at", "not_before"])
+
+    return stale
+
+
+def session_parse_status(session) -> dict[str, Any]:
+    job = (
+        DiagnosticJob.objects
+        .filter(session=session, kind=DiagnosticJob.Kind.LAUNCH_PARSE)
+        .order_by("-id")
+        .first()
+    )
+
+    if job is None:
+        status = "none"
+    elif job.is_active:
+        status = "parsing"
+    else:
+        status = job.status
+
+    return {
+        "status": status,
+        "ready": job is None or not job.is_active,
+        "codes": session.codes.count(),
+        "error": job.error if job and job.status == DiagnosticJob.Status.FAILED else "",
+    }
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from diagnostics.launch_pdf_parser import PARSER_VERSION, parse_launch_pages, parse_launch_pdf_stream
+from diagnostics.models import LaunchParseCache
+from diagnostics.pdf_backends import configured_backend
+
+
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def cache_max_entries() -> int:
+    return getattr(settings, "LAUNCH_PARSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+
+
+def cache_version() -> str:
+    """
+    Версия записей кэша: версия парсера и backend извлечения текста.
+    Разные backend могут дать разный текст, поэтому смена
+    LAUNCH_PDF_BACKEND тоже сбрасывает кэш.
+    """
+    return f"{PARSER_VERSION}:{configured_backend()}"
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def get_cached_parse(sha256: str) -> dict[str, Any] | None:
+    entry = (
+        LaunchParseCache.objects
+        .filter(sha256=sha256, parser_version=cache_version(), report_text__isnull=False)
+        .only("id", "result", "report_text")
+        .first()
+    )
+
+    if entry is None:
+        return None
+
+    LaunchParseCache.objects.filter(pk=entry.pk).update(
+        hits=F("hits") + 1,
+        last_used_at=timezone.now(),
+    )
+
+    return {**entry.result, "report_text": bytes(entry.report_text)}
+
+
+def store_parse(sha256: str, parsed: dict[str, Any], file_size: int = 0) -> None:
+    """Сжатый текст отчёта (report_text) хранится отдельно от JSON результата."""
+    result = {key: value for key, value in parsed.items() if key != "report_text"}
+
+    LaunchParseCache.objects.update_or_create(
+        sha256=sha256,
+        parser_version=cache_version(),
+        defaults={
+            "result": result,
+            "report_text": parsed.get("report_text"),
+            "file_size": file_size,
+            "last_used_at": timezone.now(),
+        },
+    )
+
+    evict_parse_cache()
+
+
+def evict_parse_cache(max_entries: int | None = None) -> int:
+    """
+    Удаляет записи других версий парсера (или backend) и самые давно использованные записи
+    сверх лимита LAUNCH_PARSE_CACHE_MAX_ENTRIES.
+    """
+    if max_entries is None:
+        max_entries = cache_max_entries()
+
+    deleted, _ = LaunchParseCache.objects.exclude(parser_version=cache_version()).delete()
+
+    stale_ids = list(
+        LaunchParseCache.objects
+        .order_by("-last_used_at", "-id")
+        .values_list("id", flat=True)[max_entries:]
+    )
+
+    if stale_ids:
+        stale_deleted, _ = LaunchParseCache.objects.filter(id__in=stale_ids).delete()
+        deleted += stale_deleted
+
+    return deleted
+
+
+def parse_launch_pdf_cached(
+    path: str | Path,
+    pages: Iterable[str] | None = None,
+    sha256: str | None = None,
+) -> dict[str, Any]:
+    """
+    parse_launch_pdf_stream() с кэшем по содержимому файла: повторная загрузка
+    того же PDF не запускает извлечение текста и разбор. Результат всегда
+    содержит report_text; записи кэша без текста не используются.
+
+    pages — уже открытый постраничный текст этого файла (например, после
+    определения формата по первой странице), чтобы не открывать PDF заново;
+    sha256 — уже посчитанный хэш этого файла.
+    """
+    path = Path(path)
+    sha256 = sha256 or file_sha256(path)
+
+    parsed = get_cached_parse(sha256)
+    if parsed is not None:
+        return parsed
+
+    if pages is None:
+        parsed = parse_launch_pdf_stream(path, keep_text=True)
+    else:
+        parsed = parse_launch_pages(pages, keep_text=True)
+    store_parse(sha256, parsed, file_size=path.stat().st_size)
+
+    return parsed
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
 import re
+import zlib
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 from typing import Any
 
+from django.db import transaction
 from django.utils import timezone
 
+from diagnostics.dtc_index import bump_dtc_generation, dtc_index
 from diagnostics.models import DiagnosticCode, DTCReference
+from diagnostics.pdf_backends import get_pdf_backend
 
 
+# Увеличивать при любом изменении разбора: записи LaunchParseCache
+# со старой версией перестают использоваться и удаляются.
+PARSER_VERSION = "1"
+
 STATUS_WORDS = {
     "Permanent",
     "Intermittent",
@@ -19,10 +28,52 @@ STATUS_WORDS = {
     "Present",
 }
 
+# Текст отчёта хранится сжатым zlib (DiagnosticSession.report_text),
+# чтобы после правки парсера пересобрать сессии без повторного чтения PDF.
+REPORT_TEXT_COMPRESSION_LEVEL = 6
+
+ABNORMAL_SYSTEMS_MARKER = "The following systems is abnormal:"
+OK_SYSTEMS_MARKER = "Следующие системы в порядке:"
+
+# Подпись в конце отчёта, после списка исправных систем.
+REPORT_END_MARKER = "Launch Tech Co., Ltd."
+
+# Только эти переводы строк видел прежний regex полей шапки ([^\n\r]).
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+
+VEHICLE_FIELDS = {
+    "test_time": "Время испытания",
+    "year": "Год выпуска",
+    "brand": "Серии а/м",
+    "model": "Модель",
+    "vin": "VIN",
+    "mileage": "Пробег",
+    "vehicle_software": "Версия ПО а/м",
+    "diagnostic_app_version": "Версия диагностической прикладной программы",
+    "diagnostic_path": "Диагностический путь",
+    "serial_number": "Серийный номер",
+}
+
+MODULE_HEADER_PATTERN = re.compile(
+    r"^([A-Z0-9/\-]+)\s+\((.+?)\)\s+(\d+)\s+Существуют проблемы",
+    flags=re.I,
+)
+OK_SYSTEM_PATTERN = re.compile(r"^\s*(\d+)\.([A-Z0-9/\-]+)\s+\((.+?)\)\s*$")
+FAULT_START_PATTERN = re.compile(
+    r"^\s*\d+\.\s*("
+    r"[PCBU][0-9A-Z]{4,8}"
+    r"|[A-Z][0-9A-F]{4,8}"
+    r"|[0-9A-F]{4,8}"
+    r"|S\s*[0-9A-F]{4,8}"
+    r")\s*(.*)$",
+    flags=re.I,
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
 
 def normalize_code(value: str) -> str:
     value = (value or "").strip().upper()
-    value = re.sub(r"\s+", "", value)
+    value = WHITESPACE_PATTERN.sub("", value)
     return value
 
 
@@ -35,69 +86,44 @@ def detect_system(code: str) -> str:
     return "O"
 
 
-def extract_pdf_text(path: str | Path) -> str:
-    path = Path(path)
-
-    try:
-        from pypdf import PdfReader
-    except ImportError as exc:
-        raise RuntimeError("pypdf is not installed. Run: pip install pypdf") from exc
-
-    reader = PdfReader(str(path))
-    parts = []
+def iter_pdf_pages(path: str | Path, backend: str | None = None) -> Iterator[str]:
+    """
+    Текст PDF постранично. Страница извлекается только когда её запросили,
+    поэтому потребитель может остановиться, не читая хвост документа.
+    Извлечение выполняет backend из diagnostics.pdf_backends
+    (по умолчанию — настройка LAUNCH_PDF_BACKEND).
+    """
+    return get_pdf_backend(backend)(Path(path))
 
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        parts.append(text)
 
-    return "\n".join(parts)
+def extract_pdf_text(path: str | Path, backend: str | None = None) -> str:
+    return "\n".join(iter_pdf_pages(path, backend))
 
 
-def extract_field(text: str, label: str) -> str:
+def find_field(text: str, label: str) -> str | None:
     pattern = rf"{re.escape(label)}\s*:?\s*([^\n\r]+)"
     m = re.search(pattern, text, flags=re.I)
 
     if not m:
-        return ""
+        return None
 
     return m.group(1).strip()
 
 
-def parse_vehicle_info(text: str) -> dict[str, str]:
-    return {
-        "test_time": extract_field(text, "Время испытания"),
-        "year": extract_field(text, "Год выпуска"),
-        "brand": extract_field(text, "Серии а/м"),
-        "model": extract_field(text, "Модель"),
-        "vin": extract_field(text, "VIN"),
-        "mileage": extract_field(text, "Пробег"),
-        "vehicle_software": extract_field(text, "Версия ПО а/м"),
-        "diagnostic_app_version": extract_field(text, "Версия диагностической прикладной программы"),
-        "diagnostic_path": extract_field(text, "Диагностический путь"),
-        "serial_number": extract_field(text, "Серийный номер"),
-    }
-
-
-def parse_ok_systems(text: str) -> list[dict[str, str]]:
-    marker = "Следующие системы в порядке:"
-    if marker not in text:
-        return []
-
-    tail = text.split(marker, 1)[1]
-    systems = []
+def extract_field(text: str, label: str) -> str:
+    return find_field(text, label) or ""
 
-    for raw_line in tail.splitlines():
-        line = raw_line.strip()
 
-        m = re.match(r"^\s*(\d+)\.([A-Z0-9/\-]+)\s+\((.+?)\)\s*$", line)
-        if m:
-            systems.append({
-                "index": m.group(1),
-                "module_code": m.group(2).strip(),
-                "module_name": m.group(3).strip(),
-            })
+def parse_ok_system_line(line: str) -> dict[str, str] | None:
+    m = OK_SYSTEM_PATTERN.match(line.strip())
+    if not m:
+        return None
 
-    return systems
+    return {
+        "index": m.group(1),
+        "module_code": m.group(2).strip(),
+        "module_name": m.group(3).strip(),
+    }
 
 
 def parse_fault_start(line: str) -> tuple[str, str] | None:
@@ -107,134 +133,353 @@ def parse_fault_start(line: str) -> tuple[str, str] | None:
     2.D90D38 Функциональный центр ...
     1.S 0248 Нет связи с ...
     """
-    m = re.match(r"^\s*\d+\.(.+?)\s*$", line)
+    m = FAULT_START_PATTERN.match(line)
     if not m:
         return None
 
-    rest = m.group(1).strip()
-
-    code_match = re.match(
-        r"^("
-        r"[PCBU][0-9A-Z]{4,8}"
-        r"|[A-Z][0-9A-F]{4,8}"
-        r"|[0-9A-F]{4,8}"
-        r"|S\s*[0-9A-F]{4,8}"
-        r")\s*(.*)$",
-        rest,
-        flags=re.I,
-    )
+    return normalize_code(m.group(1)), m.group(2).strip()
 
-    if not code_match:
-        return None
 
-    code = normalize_code(code_match.group(1))
-    description = (code_match.group(2) or "").strip()
+def finish_fault(fault: dict[str, Any]) -> dict[str, Any]:
+    desc_lines = fault.pop("_desc_lines", [])
+    full_description = " ".join(x.strip() for x in desc_lines if x.strip())
+    fault["description"] = WHITESPACE_PATTERN.sub(" ", full_description).strip()
+    return fault
 
-    return code, description
 
+def flatten_faults(abnormal_systems: list[dict[str, Any]]) -> list[dict[str, str]]:
+    faults = []
 
-def parse_abnormal_systems(text: str) -> list[dict[str, Any]]:
-    start_marker = "The following systems is abnormal:"
-    end_marker = "Следующие системы в порядке:"
+    for system in abnormal_systems:
+        for fault in system["faults"]:
+            faults.append({
+                "code": fault["code"],
+                "description": fault["description"],
+                "status": fault.get("status", ""),
+                "module_code": system["module_code"],
+                "module_name": system["module_name"],
+            })
 
-    if start_marker not in text:
-        return []
+    return faults
 
-    block = text.split(start_marker, 1)[1]
 
-    if end_marker in block:
-        block = block.split(end_marker, 1)[0]
+class VehicleFieldMatcher:
+    """
+    Поиск всех полей шапки за один проход по строкам.
 
-    lines = [line.strip() for line in block.splitlines() if line.strip()]
+    Одно регулярное выражение с lookahead находит в строке позиции, где
+    начинается любая из меток, значение берётся до конца строки. Если после
+    метки пусто, значение ищется в следующей непустой строке — так же, как
+    это делает extract_field() по всему тексту. Для каждого поля берётся
+    первое вхождение метки.
+    """
 
-    systems: list[dict[str, Any]] = []
-    current_system: dict[str, Any] | None = None
-    current_fault: dict[str, Any] | None = None
+    def __init__(self, fields: dict[str, str] = VEHICLE_FIELDS):
+        self.values = {key: "" for key in fields}
+        self._missing = list(fields)
+        # key -> (двоеточие уже было, после двоеточия были пробелы)
+        self._pending: dict[str, tuple[bool, bool]] = {}
+        self._label_pattern = re.compile(
+            "(?=(" + "|".join(re.escape(label) for label in fields.values()) + "))",
+            flags=re.I,
+        )
+        self._value_patterns = {
+            key: re.compile(re.escape(label) + r"\s*(:?)(\s*)(.*)", flags=re.I)
+            for key, label in fields.items()
+        }
+
+    @property
+    def done(self) -> bool:
+        return not self._missing and not self._pending
+
+    def feed_line(self, line: str) -> None:
+        if self._pending:
+            self._resolve_pending(line)
+
+        if not self._missing:
+            return
+
+        for m in self._label_pattern.finditer(line):
+            pos = m.start()
+
+            for key in list(self._missing):
+                value_match = self._value_patterns[key].match(line, pos)
+                if not value_match:
+                    continue
+
+                self._missing.remove(key)
+                value = value_match.group(3).strip()
+
+                if value:
+                    self.values[key] = value
+                else:
+                    colon_seen = bool(value_match.group(1))
+                    self._pending[key] = (colon_seen, colon_seen and bool(value_match.group(2)))
+
+            if not self._missing:
+                break
+
+    def finish(self) -> dict[str, str]:
+        for key, (colon_seen, space_after_colon) in self._pending.items():
+            # Метка с двоеточием в самом конце текста: прежний regex
+            # откатывался и возвращал само двоеточие, а если за ним были
+            # пробелы — последний пробел, то есть пустую строку.
+            self.values[key] = ":" if colon_seen and not space_after_colon else ""
+
+        self._pending = {}
+        return self.values
+
+    def _resolve_pending(self, line: str) -> None:
+        value = line.strip()
+
+        for key, (colon_seen, space_after_colon) in list(self._pending.items()):
+            if colon_seen:
+                if value:
+                    self.values[key] = value
+                    del self._pending[key]
+                elif line:
+                    self._pending[key] = (True, True)
+                continue
+
+            if not value:
+                continue
+
+            if not value.startswith(":"):
+                self.values[key] = value
+                del self._pending[key]
+                continue
+
+            after_colon = line.split(":", 1)[1]
+
+            if after_colon.strip():
+                self.values[key] = after_colon.strip()
+                del self._pending[key]
+            else:
+                self._pending[key] = (True, bool(after_colon))
 
-    module_pattern = re.compile(
-        r"^([A-Z0-9/\-]+)\s+\((.+?)\)\s+(\d+)\s+Существуют проблемы",
-        flags=re.I,
-    )
 
-    def flush_fault():
-        nonlocal current_fault, current_system
+class LaunchReportStream:
+    """
+    Однопроходный разбор отчёта Launch AllSystemDTC.
+
+    Текст подаётся страницами через feed() (или целиком одной «страницей»)
+    и читается один раз, строка за строкой. Состояние — раздел отчёта
+    (шапка, неисправные системы, исправные системы), текущий модуль,
+    незакрытая ошибка и ещё не найденные поля шапки. Все шаблоны
+    скомпилированы заранее, поэтому работа линейна по длине документа.
+
+    Разбор останавливается после страницы, на которой за блоком
+    "Следующие системы в порядке:" встретилась подпись конца отчёта
+    (REPORT_END_MARKER). Страницы без новых систем внутри списка (номер
+    страницы, перенос) разбор не останавливают.
+    """
+
+    def __init__(self):
+        self.abnormal_systems: list[dict[str, Any]] = []
+        self.ok_systems: list[dict[str, str]] = []
+        self.pages = 0
+        self.finished = False
+
+        self._vehicle = VehicleFieldMatcher()
+        # Блок неисправных систем: до маркера, внутри, после (закрыт маркером
+        # исправных). Список исправных систем идёт от своего маркера до конца.
+        self._abnormal = "before"
+        self._ok = False
+        self._current_system: dict[str, Any] | None = None
+        self._current_fault: dict[str, Any] | None = None
+
+    def feed(self, page_text: str) -> bool:
+        """Обработать страницу. Возвращает False, когда дальше читать не нужно."""
+        if self.finished:
+            return False
+
+        self.pages += 1
+
+        for raw_line in LINE_BREAK_RE.split(page_text):
+            if not self._vehicle.done:
+                self._vehicle.feed_line(raw_line)
+
+            # Блоки систем прежний парсер делил через splitlines(): там
+            # \x0c, \x85 и \u2028 тоже переводы строки, а в полях шапки — нет.
+            for part in raw_line.splitlines() or [raw_line]:
+                self._feed_line(part)
+
+            if self._ok and REPORT_END_MARKER in raw_line:
+                self.finished = True
+
+        return not self.finished
+
+    def result(self) -> dict[str, Any]:
+        self._flush_fault()
+
+        return {
+            "vehicle": self._vehicle.finish(),
+            "abnormal_systems": self.abnormal_systems,
+            "ok_systems": self.ok_systems,
+            "faults": flatten_faults(self.abnormal_systems),
+        }
+
+    def _feed_line(self, raw_line: str) -> None:
+        abnormal_part = None
+
+        if self._abnormal == "active":
+            abnormal_part = raw_line
+        elif self._abnormal == "before" and ABNORMAL_SYSTEMS_MARKER in raw_line:
+            abnormal_part = raw_line.split(ABNORMAL_SYSTEMS_MARKER, 1)[1]
+            self._abnormal = "active"
+
+        if abnormal_part is not None:
+            if OK_SYSTEMS_MARKER in abnormal_part:
+                abnormal_part = abnormal_part.split(OK_SYSTEMS_MARKER, 1)[0]
+                self._feed_abnormal_line(abnormal_part)
+                self._flush_fault()
+                self._abnormal = "done"
+            else:
+                self._feed_abnormal_line(abnormal_part)
 
-        if current_fault and current_system:
-            desc_lines = current_fault.pop("_desc_lines", [])
-            full_description = " ".join(x.strip() for x in desc_lines if x.strip())
-            current_fault["description"] = re.sub(r"\s+", " ", full_description).strip()
-            current_system["faults"].append(current_fault)
+        if self._ok:
+            ok_part = raw_line
+        elif OK_SYSTEMS_MARKER in raw_line:
+            ok_part = raw_line.split(OK_SYSTEMS_MARKER, 1)[1]
+            self._ok = True
+        else:
+            return
 
-        current_fault = None
+        system = parse_ok_system_line(ok_part)
+        if system:
+            self.ok_systems.append(system)
 
-    for line in lines:
-        module_match = module_pattern.match(line)
+    def _feed_abnormal_line(self, raw_line: str) -> None:
+        line = raw_line.strip()
+        if not line:
+            return
+
+        module_match = MODULE_HEADER_PATTERN.match(line)
 
         if module_match:
-            flush_fault()
+            self._flush_fault()
 
-            current_system = {
+            self._current_system = {
                 "module_code": module_match.group(1).strip(),
                 "module_name": module_match.group(2).strip(),
                 "declared_fault_count": int(module_match.group(3)),
                 "faults": [],
             }
-            systems.append(current_system)
-            continue
+            self.abnormal_systems.append(self._current_system)
+            return
 
         fault_start = parse_fault_start(line)
 
         if fault_start:
-            flush_fault()
+            self._flush_fault()
 
             code, first_description = fault_start
-            current_fault = {
+            self._current_fault = {
                 "code": code,
                 "status": "",
                 "_desc_lines": [first_description] if first_description else [],
             }
-            continue
+            return
 
-        if current_fault:
+        if self._current_fault:
             if line in STATUS_WORDS:
-                current_fault["status"] = line
-                flush_fault()
+                self._current_fault["status"] = line
+                self._flush_fault()
             else:
-                current_fault["_desc_lines"].append(line)
+                self._current_fault["_desc_lines"].append(line)
 
-    flush_fault()
+    def _flush_fault(self) -> None:
+        if self._current_fault and self._current_system:
+            self._current_system["faults"].append(finish_fault(self._current_fault))
 
-    return systems
+        self._current_fault = None
 
 
-def parse_launch_pdf(path: str | Path) -> dict[str, Any]:
-    text = extract_pdf_text(path)
-    vehicle = parse_vehicle_info(text)
-    abnormal_systems = parse_abnormal_systems(text)
-    ok_systems = parse_ok_systems(text)
+def parse_launch_text(text: str) -> dict[str, Any]:
+    stream = LaunchReportStream()
+    stream.feed(text)
+    return stream.result()
 
-    faults = []
 
-    for system in abnormal_systems:
-        for fault in system["faults"]:
-            faults.append({
-                "code": fault["code"],
-                "description": fault["description"],
-                "status": fault.get("status", ""),
-                "module_code": system["module_code"],
-                "module_name": system["module_name"],
-            })
+# Прежние функции разбора сохранены как обёртки над LaunchReportStream.
 
-    return {
-        "vehicle": vehicle,
-        "abnormal_systems": abnormal_systems,
-        "ok_systems": ok_systems,
-        "faults": faults,
-        "raw_text": text,
-    }
+def parse_vehicle_info(text: str) -> dict[str, str]:
+    return parse_launch_text(text)["vehicle"]
 
 
-def get_or_create_dtc_reference_from_launch_fault(fault: dict[str, str]) -> DTCReference:
+def parse_abnormal_systems(text: str) -> list[dict[str, Any]]:
+    return parse_launch_text(text)["abnormal_systems"]
+
+
+def parse_ok_systems(text: str) -> list[dict[str, str]]:
+    return parse_launch_text(text)["ok_systems"]
+
+
+def compress_report_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), REPORT_TEXT_COMPRESSION_LEVEL)
+
+
+def decompress_report_text(data: bytes | memoryview) -> str:
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def parse_launch_pages(pages: Iterable[str], keep_text: bool = False) -> dict[str, Any]:
+    """
+    С keep_text=True в результат добавляется report_text — сжатый текст
+    всех страниц документа, склеенных через перевод строки: ранняя
+    остановка отключается, страницы после конца отчёта только сжимаются.
+    Сжатие идёт по мере чтения, несжатый текст целиком в памяти не собирается.
+    """
+    stream = LaunchReportStream()
+    compressor = zlib.compressobj(REPORT_TEXT_COMPRESSION_LEVEL) if keep_text else None
+    chunks = []
+    read = 0
+
+    for page_text in pages:
+        if compressor is not None:
+            separator = "\n" if read else ""
+            chunks.append(compressor.compress((separator + page_text).encode("utf-8")))
+
+        read += 1
+
+        if not stream.feed(page_text) and compressor is None:
+            break
+
+    result = stream.result()
+    result["pages"] = read
+
+    if compressor is not None:
+        chunks.append(compressor.flush())
+        result["report_text"] = b"".join(chunks)
+
+    return result
+
+
+def parse_launch_pdf_stream(
+    path: str | Path,
+    backend: str | None = None,
+    keep_text: bool = False,
+) -> dict[str, Any]:
+    """
+    Потоковый вариант parse_launch_pdf(): страницы извлекаются по одной,
+    полный текст документа не собирается и raw_text не возвращается.
+    """
+    pages = iter_pdf_pages(path, backend)
+
+    try:
+        return parse_launch_pages(pages, keep_text=keep_text)
+    finally:
+        pages.close()
+
+
+def parse_launch_pdf(path: str | Path, backend: str | None = None) -> dict[str, Any]:
+    text = extract_pdf_text(path, backend)
+    result = parse_launch_text(text)
+    result["raw_text"] = text
+    return result
+
+
+def launch_reference_defaults(fault: dict[str, str]) -> dict[str, Any]:
     code = normalize_code(fault.get("code"))
     description = (fault.get("description") or "").strip()
     module_code = (fault.get("module_code") or "").strip()
@@ -244,40 +489,108 @@ def get_or_create_dtc_reference_from_launch_fault(fault: dict[str, str]) -> DTCR
 
     title = description[:500] if description else f"Код неисправности {code}"
 
+    return {
+        "system": system,
+        "scope": DTCReference.Scope.MANUFACTURER if system == "O" else DTCReference.Scope.GENERIC,
+        "title_ru": title,
+        "description_ru": (
+            f"Код {code} найден в отчёте Launch."
+            + (f" Модуль: {module_code} ({module_name})." if module_code or module_name else "")
+            + (f" Описание: {description}" if description else "")
+        ),
+        "diagnostic_notes": (
+            "Код получен из отчёта Launch AllSystemDTC. "
+            "Для точного вывода нужно учитывать модуль, статус ошибки, сопутствующие коды, "
+            "питание, массу, проводку, разъёмы и фактические симптомы автомобиля."
+        ),
+        "recommended_checks": (
+            "Проверить модуль, указанный в отчёте; считать сопутствующие блоки; "
+            "проверить питание, массу, разъёмы, проводку и условия появления ошибки. "
+            "Не менять блок или деталь только по одному коду."
+        ),
+        "severity": DTCReference.Severity.MEDIUM,
+        "source_name": "Launch diagnostic report",
+        "is_active": True,
+    }
+
+
+def get_or_create_dtc_reference_from_launch_fault(fault: dict[str, str]) -> DTCReference:
     ref, _ = DTCReference.objects.update_or_create(
-        code=code,
+        code=normalize_code(fault.get("code")),
         manufacturer="",
-        defaults={
-            "system": system,
-            "scope": DTCReference.Scope.MANUFACTURER if system == "O" else DTCReference.Scope.GENERIC,
-            "title_ru": title,
-            "description_ru": (
-                f"Код {code} найден в отчёте Launch."
-                + (f" Модуль: {module_code} ({module_name})." if module_code or module_name else "")
-                + (f" Описание: {description}" if description else "")
-            ),
-            "diagnostic_notes": (
-                "Код получен из отчёта Launch AllSystemDTC. "
-                "Для точного вывода нужно учитывать модуль, статус ошибки, сопутствующие коды, "
-                "питание, массу, проводку, разъёмы и фактические симптомы автомобиля."
-            ),
-            "recommended_checks": (
-                "Проверить модуль, указанный в отчёте; считать сопутствующие блоки; "
-                "проверить питание, массу, разъёмы, проводку и условия появления ошибки. "
-                "Не менять блок или деталь только по одному коду."
-            ),
-            "severity": DTCReference.Severity.MEDIUM,
-            "source_name": "Launch diagnostic report",
-            "is_active": True,
-        },
+        defaults=launch_reference_defaults(fault),
     )
 
     return ref
 
 
+def resolve_launch_references(faults: list[dict[str, str]]) -> dict[str, DTCReference]:
+    """
+    Generic-записи справочника для всех кодов отчёта: известные коды берутся
+    из индекса справочника в памяти, недостающие создаются одним bulk_create.
+    Существующие записи справочника не перезаписываются текстом из отчёта.
+    """
+    codes = {normalize_code(fault.get("code")) for fault in faults}
+    codes.discard("")
+
+    if not codes:
+        return {}
+
+    # Для привязки кода и текста рекомендации достаточно id и title_ru.
+    refs = {
+        code: DTCReference(id=entry.id, code=code, manufacturer="", title_ru=entry.title_ru)
+        for code, entry in dtc_index.get_many(codes).items()
+    }
+
+    missing: dict[str, DTCReference] = {}
+
+    for fault in faults:
+        code = normalize_code(fault.get("code"))
+
+        if code and code not in refs and code not in missing:
+            missing[code] = DTCReference(
+                code=code,
+                manufacturer="",
+                **launch_reference_defaults(fault),
+            )
+            # bulk_create не вызывает save(): system и fingerprint заполняются здесь.
+            missing[code].normalize_fields()
+
+    if missing:
+        # ignore_conflicts: тот же код мог быть создан параллельной загрузкой.
+        # bulk_create на MySQL не возвращает id, поэтому записи перечитываются.
+        DTCReference.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        created = list(DTCReference.objects.filter(code__in=missing.keys(), manufacturer=""))
+        refs.update({ref.code: ref for ref in created})
+        # Новые записи вносятся в индекс этого процесса без перечитывания таблицы.
+        bump_dtc_generation(changed=created)
+
+    return refs
+
+
 def apply_launch_parse_to_session(session, parsed: dict[str, Any]) -> int:
+    """
+    Записывает результат разбора в сессию. Число запросов не зависит от
+    количества ошибок: справочник читается и дополняется пачкой, коды сессии
+    заменяются одним bulk_create в одной транзакции.
+
+    Если в результате есть report_text, он сохраняется в сессию вместе
+    с PARSER_VERSION — для последующего reparse_sessions.
+    """
     vehicle = parsed.get("vehicle") or {}
     faults = parsed.get("faults") or []
+    update_fields = [
+        "vin",
+        "vehicle_model",
+        "system_report",
+        "recommendation",
+        "ai_generated_at",
+    ]
+
+    if parsed.get("report_text"):
+        session.report_text = parsed["report_text"]
+        session.report_parser_version = PARSER_VERSION
+        update_fields += ["report_text", "report_parser_version"]
 
     if vehicle.get("vin"):
         session.vin = vehicle["vin"]
@@ -298,53 +611,49 @@ def apply_launch_parse_to_session(session, parsed: dict[str, Any]) -> int:
         "ok_systems": parsed.get("ok_systems") or [],
     }
 
-    DiagnosticCode.objects.filter(session=session).delete()
+    with transaction.atomic():
+        refs = resolve_launch_references(faults)
 
-    created = 0
-    recommendation_lines = []
+        codes = []
+        recommendation_lines = []
 
-    for fault in faults:
-        code = normalize_code(fault.get("code"))
-        description = (fault.get("description") or "").strip()
-
-        if not code:
-            continue
-
-        ref = get_or_create_dtc_reference_from_launch_fault(fault)
-
-        DiagnosticCode.objects.create(
-            session=session,
-            code=code,
-            description=description[:500],
-            module_code=(fault.get("module_code") or "")[:64],
-            module_name=(fault.get("module_name") or "")[:255],
-            status_text=(fault.get("status") or "")[:64],
-            raw_text=description,
-            reference=ref,
-        )
+        for fault in faults:
+            code = normalize_code(fault.get("code"))
+            description = (fault.get("description") or "").strip()
 
-        created += 1
+            if not code:
+                continue
 
-        recommendation_lines.append(
-            f"{code} — {description or ref.title_ru}\n"
-            f"→ Модуль: {fault.get('module_code') or '—'} {fault.get('module_name') or ''}. "
-            f"Статус: {fault.get('status') or '—'}. "
-            f"Сначала проверить питание, массу, разъёмы, проводку и сопутствующие ошибки."
-        )
+            ref = refs.get(code)
 
-    if recommendation_lines:
-        session.recommendation = "\n\n".join(recommendation_lines)
-        session.ai_generated_at = timezone.now()
+            codes.append(DiagnosticCode(
+                session=session,
+                code=code,
+                description=description[:500],
+                module_code=(fault.get("module_code") or "")[:64],
+                module_name=(fault.get("module_name") or "")[:255],
+                status_text=(fault.get("status") or "")[:64],
+                raw_text=description,
+                reference=ref,
+            ))
 
-    session.save(update_fields=[
-        "vin",
-        "vehicle_model",
-        "system_report",
-        "recommendation",
-        "ai_generated_at",
-    ])
+            recommendation_lines.append(
+                f"{code} — {description or (ref.title_ru if ref else '')}\n"
+                f"→ Модуль: {fault.get('module_code') or '—'} {fault.get('module_name') or ''}. "
+                f"Статус: {fault.get('status') or '—'}. "
+                f"Сначала проверить питание, массу, разъёмы, проводку и сопутствующие ошибки."
+            )
 
-    return created
+        DiagnosticCode.objects.filter(session=session).delete()
+        DiagnosticCode.objects.bulk_create(codes)
+
+        if recommendation_lines:
+            session.recommendation = "\n\n".join(recommendation_lines)
+            session.ai_generated_at = timezone.now()
+
+        session.save(update_fields=update_fields)
+
+    return len(codes)
 
 
 def parse_and_apply_launch_pdf(session) -> int:
@@ -356,5 +665,7 @@ def parse_and_apply_launch_pdf(session) -> int:
     if not str(path).lower().endswith(".pdf"):
         return 0
 
-    parsed = parse_launch_pdf(path)
+    from diagnostics.launch_cache import parse_launch_pdf_cached
+
+    parsed = parse_launch_pdf_cached(path)
     return apply_launch_parse_to_session(session, parsed)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import math
+import random
+import zlib
+from pathlib import Path
+
+from diagnostics.launch_pdf_parser import (
+    ABNORMAL_SYSTEMS_MARKER,
+    OK_SYSTEMS_MARKER,
+    REPORT_END_MARKER,
+    STATUS_WORDS,
+)
+
+
+# Синтетические отчёты Launch AllSystemDTC для тестов и бенчмарков парсера.
+
+MODULES = [
+    ("DME", "Электроника цифрового двигателя"),
+    ("EGS", "Электронное управление коробкой передач"),
+    ("DSC", "Динамический контроль устойчивости"),
+    ("KOMBI", "Комбинация приборов"),
+    ("ACSM", "Система безопасности"),
+    ("FEM", "Фронтальный модуль"),
+    ("REM", "Задний модуль"),
+    ("EPS", "Электроусилитель рулевого управления"),
+    ("IHKA", "Автоматическая климатическая установка"),
+    ("PDC", "Парктроник"),
+    ("TRSVC", "Камера заднего вида"),
+    ("HEADUNIT", "Головное устройство"),
+]
+
+DESCRIPTIONS = [
+    "Слишком бедная смесь, банк 1",
+    "Нет связи с блоком управления",
+    "Датчик положения коленвала, сигнал неправдоподобен",
+    "Контрольная лампа неисправности двигателя: активирована",
+    "Напряжение бортовой сети слишком низкое",
+    "Lost Communication With ECM/PCM",
+    "Датчик давления во впускном коллекторе, короткое замыкание на массу",
+]
+
+STATUSES = sorted(STATUS_WORDS)
+
+
+def generate_fault_code(rng: random.Random) -> str:
+    kind = rng.randrange(3)
+
+    if kind == 0:
+        return rng.choice("PCBU") + f"{rng.randrange(0x10000):04X}"
+    if kind == 1:
+        return f"{rng.randrange(0x1000000):06X}"
+
+    return f"S {rng.randrange(0x10000):04X}"
+
+
+def generate_launch_report_lines(
+    modules: int = 5,
+    faults_per_module: int = 4,
+    ok_systems: int = 10,
+    seed: int = 0,
+) -> list[str]:
+    rng = random.Random(seed)
+    lines = [
+        "Launch AllSystemDTC",
+        "Время испытания: 2026-01-15 10:22:31",
+        "Год выпуска: 2018",
+        "Серии а/м: BMW",
+        "Модель: X5 (F15)",
+        f"VIN: WBAKS410X00A{seed % 100000:05d}",
+        "Пробег: 84500 km",
+        "Версия ПО а/м: V45.20",
+        "Версия диагностической прикладной программы: V4.11",
+        "Диагностический путь",
+        "BMW > Автоматический поиск > Быстрая проверка",
+        "Серийный номер: 979790012345",
+        ABNORMAL_SYSTEMS_MARKER,
+    ]
+
+    for module_index in range(modules):
+        code, name = MODULES[module_index % len(MODULES)]
+        lines.append(f"{code}{module_index // len(MODULES) or ''} ({name}) {faults_per_module} Существуют проблемы")
+
+        for fault_index in range(1, faults_per_module + 1):
+            description = rng.choice(DESCRIPTIONS)
+
+            if rng.random() < 0.3:
+                # Длинное описание переносится на следующую строку.
+                head, _, tail = description.rpartition(" ")
+                lines.append(f"{fault_index}.{generate_fault_code(rng)} {head}")
+                lines.append(f"   {tail}")
+            else:
+                lines.append(f"{fault_index}.{generate_fault_code(rng)} {description}")
+
+            lines.append(rng.choice(STATUSES))
+
+    lines.append(OK_SYSTEMS_MARKER)
+
+    for index in range(1, ok_systems + 1):
+        code, name = MODULES[(modules + index) % len(MODULES)]
+        lines.append(f"{index}.{code}{index} ({name})")
+
+    lines.append(REPORT_END_MARKER)
+    return lines
+
+
+def generate_launch_report_pages(
+    modules: int = 5,
+    faults_per_module: int = 4,
+    ok_systems: int = 10,
+    pages: int | None = None,
+    lines_per_page: int = 45,
+    seed: int = 0,
+) -> list[str]:
+    """
+    Текст отчёта по страницам. Если задано pages, строки делятся
+    на столько страниц (последние могут оказаться пустыми).
+    """
+    lines = generate_launch_report_lines(modules, faults_per_module, ok_systems, seed)
+
+    if pages:
+        lines_per_page = max(1, math.ceil(len(lines) / pages))
+    else:
+        pages = max(1, math.ceil(len(lines) / lines_per_page))
+
+    return [
+        "\n".join(lines[index * lines_per_page:(index + 1) * lines_per_page])
+        for index in range(pages)
+    ]
+
+
+def pdf_string(text: str) -> str:
+    return "<" + "".join(f"{ord(char):04X}" for char in text) + ">"
+
+
+def to_unicode_cmap(text: str) -> bytes:
+    """CMap CID -> Unicode: CID в шрифте совпадает с кодом символа."""
+    high_bytes = sorted({ord(char) >> 8 for char in text if ord(char) <= 0xFFFF})
+    ranges = [f"<{high:02X}00> <{high:02X}FF> <{high:02X}00>" for high in high_bytes]
+
+    blocks = []
+    for index in range(0, len(ranges), 100):
+        chunk = ranges[index:index + 100]
+        blocks.append(f"{len(chunk)} beginbfrange\n" + "\n".join(chunk) + "\nendbfrange")
+
+    return (
+        "/CIDInit /ProcSet findresource begin\n"
+        "12 dict begin\n"
+        "begincmap\n"
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+        "/CMapName /Adobe-Identity-UCS def\n"
+        "/CMapType 2 def\n"
+        "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+        + "\n".join(blocks)
+        + "\nendcmap\n"
+        "CMapName currentdict /CMap defineresource pop\n"
+        "end\nend\n"
+    ).encode("ascii")
+
+
+def build_launch_pdf(pages: list[str]) -> bytes:
+    """
+    Минимальный PDF без внешних зависимостей. Шрифт Type0/Identity-H
+    с ToUnicode, поэтому кириллица извлекается так же, как из отчётов Launch.
+    """
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def add_stream(data: bytes) -> int:
+        data = zlib.compress(data)
+        return add(
+            f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode("ascii")
+            + data
+            + b"\nendstream"
+        )
+
+    catalog_id = add(b"")
+    pages_id = add(b"")
+
+    cmap_id = add_stream(to_unicode_cmap("".join(pages)))
+    descriptor_id = add(
+        b"<< /Type /FontDescriptor /FontName /LaunchSans /Flags 32 "
+        b"/FontBBox [0 -200 1000 900] /ItalicAngle 0 /Ascent 900 /Descent -200 "
+        b"/CapHeight 700 /StemV 80 >>"
+    )
+    cid_font_id = add(
+        f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /LaunchSans "
+        f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+        f"/FontDescriptor {descriptor_id} 0 R /DW 500 >>".encode("ascii")
+    )
+    font_id = add(
+        f"<< /Type /Font /Subtype /Type0 /BaseFont /LaunchSans /Encoding /Identity-H "
+        f"/DescendantFonts [{cid_font_id} 0 R] /ToUnicode {cmap_id} 0 R >>".encode("ascii")
+    )
+
+    page_ids = []
+    for page_text in pages:
+        commands = ["BT", "/F1 9 Tf", "11 TL", "36 806 Td"]
+        for line in page_text.splitlines():
+            commands.append(f"{pdf_string(line)} Tj T*")
+        commands.append("ET")
+
+        content_id = add_stream("\n".join(commands).encode("ascii"))
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>".encode("ascii")
+        ))
+
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode("ascii")
+    objects[pages_id - 1] = (
+        f"<< /Type /Pages /Count {len(page_ids)} "
+        f"/Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] >>"
+    ).encode("ascii")
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("ascii")
+
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("ascii")
+
+    return bytes(out)
+
+
+def write_launch_pdf(path: str | Path, pages: list[str]) -> Path:
+    path = Path(path)
+    path.write_bytes(build_launch_pdf(pages))
+    return path
@@ -0,0 +1,195 @@
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from diagnostics.launch_pdf_parser import (
+    PARSER_VERSION,
+    apply_launch_parse_to_session,
+    extract_pdf_text,
+    parse_launch_pages,
+    parse_launch_text,
+)
+from diagnostics.launch_synthetic import generate_launch_report_pages, write_launch_pdf
+from diagnostics.models import DiagnosticSession
+from diagnostics.pdf_backends import configured_backend
+
+
+DEFAULT_BASELINE = "launch_parser_baseline.json"
+
+# Метрики, где больше — лучше; для peak_kb и seconds лучше меньше.
+HIGHER_IS_BETTER = {"pages_per_second", "faults_per_second"}
+
+
+class Rollback(Exception):
+    pass
+
+
+def measure(func, repeat):
+    """Лучшее время из repeat запусков и пик памяти отдельным запуском под tracemalloc."""
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, best, peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the Launch report pipeline on a synthetic report: PDF text extraction, "
+        "parsing and saving to the database. Stores and compares JSON baselines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", type=int, default=20)
+        parser.add_argument("--faults", type=int, default=5, help="Faults per module")
+        parser.add_argument("--ok-systems", type=int, default=30)
+        parser.add_argument("--pages", type=int, default=0, help="Spread the report over this many pages")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--backend", default="", help="PDF backend (default: LAUNCH_PDF_BACKEND)")
+        parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+        parser.add_argument("--save-baseline", action="store_true", help="Write results to the baseline file")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=0.0,
+            help="Fail if any metric is worse than the baseline by more than this many percent",
+        )
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        backend = options["backend"] or configured_backend()
+        scenario = {
+            "modules": options["modules"],
+            "faults_per_module": options["faults"],
+            "ok_systems": options["ok_systems"],
+            "pages": options["pages"] or None,
+            "seed": options["seed"],
+        }
+
+        pages = generate_launch_report_pages(**scenario)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = write_launch_pdf(Path(tmp) / "report.pdf", pages)
+            text, extract_seconds, extract_peak = measure(
+                lambda: extract_pdf_text(pdf_path, backend),
+                repeat,
+            )
+
+        parsed, parse_seconds, parse_peak = measure(lambda: parse_launch_text(text), repeat)
+        streamed, stream_seconds, stream_peak = measure(lambda: parse_launch_pages(pages), repeat)
+        _, apply_seconds, apply_peak = measure(lambda: self.apply_in_rollback(parsed), repeat)
+
+        page_count = len(pages)
+        fault_count = len(parsed["faults"])
+
+        if fault_count != scenario["modules"] * scenario["faults_per_module"]:
+            raise CommandError(f"Parser found {fault_count} faults in the synthetic report")
+
+        if streamed["faults"] != parsed["faults"]:
+            raise CommandError("Streaming and full-text parsers disagree on the synthetic report")
+
+        def phase(seconds, peak, pages_done):
+            return {
+                "seconds": round(seconds, 6),
+                "pages_per_second": round(pages_done / seconds, 1) if seconds else 0.0,
+                "faults_per_second": round(fault_count / seconds, 1) if seconds else 0.0,
+                "peak_kb": round(peak / 1024, 1),
+            }
+
+        results = {
+            "parser_version": PARSER_VERSION,
+            "backend": backend,
+            "scenario": scenario,
+            "pages": page_count,
+            "faults": fault_count,
+            "created_at": timezone.now().isoformat(),
+            "phases": {
+                "extract": phase(extract_seconds, extract_peak, page_count),
+                "parse": phase(parse_seconds, parse_peak, page_count),
+                "parse_stream": phase(stream_seconds, stream_peak, streamed["pages"]),
+                "apply": phase(apply_seconds, apply_peak, page_count),
+            },
+        }
+
+        baseline_path = Path(options["baseline"])
+        baseline = None
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+
+        regressions = self.report(results, baseline)
+
+        if options["save_baseline"]:
+            baseline_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved: {baseline_path}"))
+
+        limit = options["max_regression"]
+        if baseline and limit:
+            worst = [item for item in regressions if item[2] > limit]
+            if worst:
+                raise CommandError(
+                    "Regression against baseline: "
+                    + ", ".join(f"{name}.{metric} {delta:+.1f}%" for name, metric, delta in worst)
+                )
+
+    def apply_in_rollback(self, parsed):
+        """Запись в БД внутри транзакции, которая затем откатывается."""
+        try:
+            with transaction.atomic():
+                session = DiagnosticSession.objects.create(vin="BENCHMARK")
+                apply_launch_parse_to_session(session, parsed)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def report(self, results, baseline):
+        """Печатает метрики и возвращает ухудшения в процентах относительно baseline."""
+        regressions = []
+        base_phases = {}
+
+        if baseline:
+            if baseline.get("scenario") != results["scenario"]:
+                self.stdout.write(self.style.WARNING("Baseline was recorded for a different scenario"))
+            base_phases = baseline.get("phases", {})
+
+        self.stdout.write(
+            f"pages={results['pages']} faults={results['faults']} "
+            f"backend={results['backend']} parser_version={results['parser_version']}"
+        )
+
+        for name, metrics in results["phases"].items():
+            parts = []
+
+            for metric, value in metrics.items():
+                part = f"{metric}={value}"
+                base_value = base_phases.get(name, {}).get(metric)
+
+                if base_value:
+                    delta = (value - base_value) / base_value * 100
+                    worse = -delta if metric in HIGHER_IS_BETTER else delta
+                    regressions.append((name, metric, worse))
+                    part += f" ({delta:+.1f}%)"
+
+                parts.append(part)
+
+            self.stdout.write(f"{name:<13} " + " ".join(parts))
+
+        return regressions
@@ -0,0 +1,143 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics.launch_pdf_parser import parse_launch_pages
+from diagnostics.management.commands.parse_launch_pdf import collect_pdf_paths
+from diagnostics.pdf_backends import PDF_BACKENDS, available_backends, get_pdf_backend
+
+
+def fault_key(fault):
+    return (
+        fault["code"],
+        fault["description"],
+        fault["status"],
+        fault["module_code"],
+        fault["module_name"],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark PDF text-extraction backends on sample Launch reports: "
+        "checks that every backend yields the same faults as the reference one and measures throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf_path", nargs="+", help="PDF file, directory or glob pattern")
+        parser.add_argument(
+            "--backend",
+            action="append",
+            dest="backends",
+            default=[],
+            help=f"Backend to test, can be repeated (default: all installed of {', '.join(PDF_BACKENDS)})",
+        )
+        parser.add_argument("--reference", default="pypdf", help="Backend whose faults are treated as correct")
+        parser.add_argument("--repeat", type=int, default=1, help="Parse every file this many times")
+        parser.add_argument("--output", default="", help="Write results as JSON to this file")
+
+    def handle(self, *args, **options):
+        paths = collect_pdf_paths(options["pdf_path"])
+        if not paths:
+            raise CommandError("No PDF files matched")
+
+        installed = available_backends()
+        backends = options["backends"] or installed
+        reference = options["reference"]
+
+        for name in set(backends) | {reference}:
+            if name not in installed:
+                raise CommandError(f"PDF backend is not available: {name}")
+
+        if reference not in backends:
+            backends = [reference] + backends
+        else:
+            backends = [reference] + [name for name in backends if name != reference]
+
+        repeat = max(1, options["repeat"])
+        reference_faults = {}
+        results = []
+
+        for name in backends:
+            result = self.run_backend(name, paths, repeat)
+
+            if name == reference:
+                reference_faults = result.pop("_faults")
+            else:
+                faults = result.pop("_faults")
+                result["mismatched_files"] = [
+                    path for path in paths if faults.get(path) != reference_faults.get(path)
+                ]
+
+            results.append(result)
+            self.stdout.write(
+                f"{name:<10} files={result['files']} errors={len(result['errors'])} "
+                f"pages={result['pages']} seconds={result['seconds']:.3f} "
+                f"pages/s={result['pages_per_second']:.1f} "
+                f"mismatched={len(result['mismatched_files'])}"
+            )
+
+        eligible = [
+            result for result in results
+            if not result["errors"] and not result["mismatched_files"]
+        ]
+
+        recommended = max(eligible, key=lambda r: r["pages_per_second"])["backend"] if eligible else ""
+
+        if recommended:
+            self.stdout.write(self.style.SUCCESS(f"Recommended: LAUNCH_PDF_BACKEND = {recommended!r}"))
+        else:
+            self.stdout.write(self.style.WARNING("No backend matched the reference output"))
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "reference": reference,
+                        "repeat": repeat,
+                        "files": paths,
+                        "recommended": recommended,
+                        "backends": results,
+                    },
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+
+    def run_backend(self, name, paths, repeat):
+        extract = get_pdf_backend(name)
+        faults = {}
+        errors = {}
+        pages = 0
+        seconds = 0.0
+
+        for path in paths:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                document = extract(path)
+
+                try:
+                    parsed = parse_launch_pages(document)
+                except Exception as exc:
+                    errors[path] = f"{type(exc).__name__}: {exc}"
+                    break
+                finally:
+                    document.close()
+                    seconds += time.perf_counter() - started
+
+                pages += parsed["pages"]
+
+            if path not in errors:
+                faults[path] = [fault_key(fault) for fault in parsed["faults"]]
+
+        return {
+            "backend": name,
+            "files": len(paths),
+            "pages": pages,
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 2) if seconds else 0.0,
+            "errors": errors,
+            "mismatched_files": [],
+            "_faults": faults,
+        }
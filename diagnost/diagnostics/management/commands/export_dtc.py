@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics.dtc_export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_queryset, iter_export_bytes
+
+
+class Command(BaseCommand):
+    help = (
+        "Export DTCReference rows as CSV (the import_dtc_csv column layout) or NDJSON. "
+        "Rows are read in chunks and written as a stream, optionally gzip-compressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="Output file, '-' for stdout")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="")
+        parser.add_argument("--gzip", action="store_true", help="Compress output (default for *.gz files)")
+        parser.add_argument("--system", default="", help="Only codes of this system: P, C, B, U or O")
+        parser.add_argument(
+            "--manufacturer",
+            default=None,
+            help="Only codes of this manufacturer; an empty value exports generic codes",
+        )
+        parser.add_argument("--active-only", action="store_true")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        name = output[:-3] if output.endswith(".gz") else output
+        fmt = options["format"] or ("ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv")
+        compress = options["gzip"] or output.endswith(".gz")
+
+        if output == "-" and compress:
+            raise CommandError("gzip output needs --output FILE")
+
+        queryset = export_queryset(
+            system=options["system"],
+            manufacturer=options["manufacturer"],
+            active_only=options["active_only"],
+        )
+        chunks = iter_export_bytes(queryset, fmt, compress=compress, chunk_size=max(1, options["chunk_size"]))
+
+        if output == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk.decode("utf-8"), ending="")
+            return
+
+        written = 0
+        with open(output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported to {output}: format={fmt} gzip={compress} bytes={written}"))
@@ -1,154 +1,442 @@
 import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
-from django.utils.text import slugify
+from django.db import transaction
+
+from diagnostics.dtc_import import (
+    ALLOWED_SEVERITY,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    DTCStagingWriter,
+    DTCUpsertEngine,
+    code_system,
+    normalize_code,
+)
+from diagnostics.dtc_sources import (
+    ROW_ERROR_KEY,
+    ROW_LINE_KEY,
+    UnsupportedDTCSource,
+    byte_ranges,
+    iter_jsonl_rows,
+    iter_range_lines,
+    not_utf8,
+    open_dtc_rows,
+)
+from diagnostics.import_metrics import ImportMetrics, merge_metrics
+from diagnostics.models import DTCImportBatch
+
+
+MAX_REPORTED_BAD_ROWS = 50
+DRY_RUN_BAD_ROWS = 30
+DRY_RUN_SAMPLE_ROWS = 5
+
+
+def row_problems(index, row):
+    # У JSON Lines номер строки файла известен точно: пустые строки не сбивают счёт.
+    index = row.get(ROW_LINE_KEY, index)
+
+    if ROW_ERROR_KEY in row:
+        return [(index, "", row[ROW_ERROR_KEY])]
+
+    code = normalize_code(row.get("code"))
+    severity = (row.get("severity") or "").strip().lower()
+    problems = []
+
+    if not code_system(code):
+        problems.append((index, code, "bad code"))
+
+    if severity and severity not in ALLOWED_SEVERITY:
+        problems.append((index, code, f"bad severity: {severity[:120]}"))
+
+    # Если в CSV есть лишние колонки из-за незакрытых запятых, csv кладёт их в None.
+    if None in row:
+        problems.append((index, code, f"extra columns: {row[None]}"))
+
+    return problems
+
+
+def scan_rows(rows, first_index):
+    """
+    Проверка строк: (число строк, первые проблемы, число плохих строк,
+    образец строк). Плохая строка — хотя бы с одной проблемой, как
+    batch.rows_bad при импорте.
+    """
+    count = 0
+    bad_total = 0
+    bad_rows = []
+    sample = []
+
+    for count, row in enumerate(rows, start=1):
+        problems = row_problems(first_index + count - 1, row)
+        bad_total += bool(problems)
+
+        if len(bad_rows) < DRY_RUN_BAD_ROWS:
+            bad_rows.extend(problems)
+        if len(sample) < DRY_RUN_SAMPLE_ROWS:
+            sample.append(row)
+
+    return count, bad_rows, bad_total, sample
+
+
+def validate_shard(task):
+    """
+    Проверка строк одного диапазона байт файла. Выполняется в процессе пула.
+    Номера строк в ответе — от начала диапазона; multiline=True значит, что
+    в диапазоне есть значение CSV в кавычках с переводом строки и деление
+    по строкам файла неверно.
+    """
+    path, start, end, text_format, fieldnames, delimiter = task
+    multiline = False
+    lines_read = 0
+
+    def decoded(lines):
+        nonlocal lines_read
+        for line in lines:
+            lines_read += 1
+            # Так же строго, как последовательный разбор и импорт.
+            try:
+                yield line.decode("utf-8-sig")
+            except UnicodeDecodeError as exc:
+                raise not_utf8(Path(path).name, exc) from exc
+
+    lines = decoded(iter_range_lines(path, start, end))
+
+    if text_format == "jsonl":
+        rows = iter_jsonl_rows(lines, first_line=0)
+    else:
+        def balanced(lines):
+            nonlocal multiline
+            for line in lines:
+                if line.count('"') % 2:
+                    multiline = True
+                    return
+                yield line
+
+        rows = csv.DictReader(balanced(lines), fieldnames=fieldnames, delimiter=delimiter)
+
+    count, bad_rows, bad_total, sample = scan_rows(rows, 0)
+    return count, bad_rows, bad_total, sample, multiline, lines_read
 
-from diagnostics.models import DTCImportBatch, DTCReference, VehicleBrand
 
-
-ALLOWED_SEVERITY = {"info", "low", "medium", "high", "critical"}
-
-
-def normalize_code(value):
-    return (value or "").strip().upper()
-
-
-def code_system(code):
-    code = normalize_code(code)
-    return code[0] if code and code[0] in ["P", "C", "B", "U"] else ""
-
-
-def normalize_severity(value):
-    value = (value or "").strip().lower()
-
-    if value in ALLOWED_SEVERITY:
-        return value
-
-    return DTCReference.Severity.MEDIUM
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
 
 
 class Command(BaseCommand):
-    help = "Import DTCReference rows from CSV."
+    help = (
+        "Import DTCReference rows from CSV or JSON Lines, plain or gzip/zip compressed "
+        "(detected from the file contents). The file is streamed and written in chunks; "
+        "each committed chunk is checkpointed on the import batch, see --resume."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("--csv", required=True, help="Path to CSV file")
+        parser.add_argument("--csv", required=True, help="Path to CSV / JSON Lines file, optionally .gz or .zip")
         parser.add_argument("--source-name", default="Manual DTC CSV")
         parser.add_argument("--source-url", default="")
         parser.add_argument("--delimiter", default=",")
         parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes for --dry-run validation of plain files",
+        )
         parser.add_argument("--show-bad-rows", action="store_true")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows validated and written per transaction",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows per bulk INSERT/UPDATE statement",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="BATCH_ID",
+            help="Continue an interrupted import from its last committed row",
+        )
+        parser.add_argument(
+            "--stage",
+            action="store_true",
+            help="Load rows into the staging table only; publish them later with publish_dtc_batch",
+        )
 
     def handle(self, *args, **options):
         csv_path = Path(options["csv"])
-        source_name = options["source_name"]
-        source_url = options["source_url"]
-        delimiter = options["delimiter"]
-        dry_run = options["dry_run"]
-        show_bad_rows = options["show_bad_rows"]
 
         if not csv_path.exists():
             raise CommandError(f"CSV not found: {csv_path}")
 
-        with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-            rows = list(csv.DictReader(f, delimiter=delimiter))
-
-        bad_rows = []
-
-        for index, row in enumerate(rows, start=2):
-            code = normalize_code(row.get("code"))
-            severity = (row.get("severity") or "").strip().lower()
+        if options["dry_run"]:
+            try:
+                self.dry_run(csv_path, options["delimiter"], options["workers"])
+            except UnsupportedDTCSource as exc:
+                raise CommandError(str(exc))
+            return
 
-            if not code_system(code):
-                bad_rows.append((index, code, "bad code"))
+        if options["resume"]:
+            batch = DTCImportBatch.objects.filter(pk=options["resume"]).first()
 
-            if severity and severity not in ALLOWED_SEVERITY:
-                bad_rows.append((index, code, f"bad severity: {severity[:120]}"))
+            if batch is None:
+                raise CommandError(f"Import batch not found: {options['resume']}")
+            if batch.status not in (DTCImportBatch.Status.RUNNING, DTCImportBatch.Status.FAILED):
+                raise CommandError(f"Import batch {batch.pk} is already finished")
+            if batch.file_name != csv_path.name:
+                raise CommandError(
+                    f"Import batch {batch.pk} was started for {batch.file_name}, not {csv_path.name}"
+                )
 
-            # Если в CSV есть лишние колонки из-за незакрытых запятых, csv кладёт их в None.
-            if None in row:
-                bad_rows.append((index, code, f"extra columns: {row[None]}"))
+            batch.status = DTCImportBatch.Status.RUNNING
+            batch.save(update_fields=["status"])
+            self.stdout.write(f"Resuming batch {batch.pk} after row {batch.last_row_offset}")
+        else:
+            batch = DTCImportBatch.objects.create(
+                source_name=options["source_name"],
+                source_url=options["source_url"],
+                file_name=csv_path.name,
+                status=DTCImportBatch.Status.RUNNING,
+                use_staging=options["stage"],
+            )
 
-        if dry_run:
-            self.stdout.write(f"DRY RUN rows={len(rows)} bad_rows={len(bad_rows)}")
-            for item in bad_rows[:30]:
+        metrics = ImportMetrics()
+        start_offset = batch.last_row_offset
+
+        try:
+            with metrics.capture():
+                bad_rows = self.import_rows(csv_path, batch, options, metrics)
+        except UnsupportedDTCSource as exc:
+            batch.status = DTCImportBatch.Status.FAILED
+            batch.notes = str(exc)
+            batch.save(update_fields=["status", "notes"])
+            raise CommandError(str(exc))
+        except BaseException:
+            batch.status = DTCImportBatch.Status.FAILED
+            self.store_metrics(batch, metrics.as_dict(rows=batch.last_row_offset - start_offset))
+            batch.save(update_fields=["status", "metrics"])
+            self.stderr.write(
+                f"Import interrupted after row {batch.last_row_offset}. "
+                f"Continue with --resume {batch.pk}"
+            )
+            raise
+
+        if batch.use_staging:
+            batch.status = DTCImportBatch.Status.STAGED
+        else:
+            batch.status = DTCImportBatch.Status.DONE
+        batch.rows_total = batch.last_row_offset
+        batch.notes = f"bad_rows={batch.rows_bad}"
+        self.store_metrics(batch, metrics.as_dict(rows=batch.last_row_offset - start_offset))
+        batch.save(update_fields=["status", "rows_total", "notes", "metrics"])
+
+        if options["show_bad_rows"] and bad_rows:
+            self.stdout.write(self.style.WARNING(f"Bad rows detected: {batch.rows_bad}"))
+            for item in bad_rows:
                 self.stdout.write(str(item))
-            for row in rows[:5]:
-                self.stdout.write(str(row))
+
+        if batch.use_staging:
+            self.stdout.write(self.style.SUCCESS(
+                f"DTC CSV staged: total={batch.rows_total} skipped={batch.rows_skipped} "
+                f"bad_rows={batch.rows_bad}. Publish with: publish_dtc_batch {batch.pk}"
+            ))
             return
 
-        if show_bad_rows and bad_rows:
-            self.stdout.write(self.style.WARNING(f"Bad rows detected: {len(bad_rows)}"))
-            for item in bad_rows[:50]:
-                self.stdout.write(str(item))
+        self.stdout.write(self.style.SUCCESS(
+            f"DTC CSV imported: total={batch.rows_total} created={batch.rows_created} "
+            f"updated={batch.rows_updated} unchanged={batch.rows_unchanged} "
+            f"skipped={batch.rows_skipped} bad_rows={batch.rows_bad}"
+        ))
 
-        batch = DTCImportBatch.objects.create(
-            source_name=source_name,
-            source_url=source_url,
-            file_name=csv_path.name,
+    def store_metrics(self, batch, run_metrics):
+        # После --resume метрики прежних запусков не затираются, а суммируются.
+        batch.metrics = {**batch.metrics, "import": merge_metrics(batch.metrics.get("import"), run_metrics)}
+
+    def import_rows(self, csv_path, batch, options, metrics=None):
+        """
+        Читает файл потоком и пишет чанками по --chunk-size строк. Запись
+        чанка и сдвиг last_row_offset коммитятся в одной транзакции, поэтому
+        после падения --resume продолжает ровно с первой незаписанной строки.
+        Пакет со staging пишет строки в DTCStagedReference, а не в справочник.
+        Время и запросы по фазам копятся в metrics.
+        """
+        metrics = metrics or ImportMetrics()
+        chunk_size = max(1, options["chunk_size"])
+        writer_class = DTCStagingWriter if batch.use_staging else DTCUpsertEngine
+        engine = writer_class(
+            batch=batch,
+            chunk_size=chunk_size,
+            batch_size=options["batch_size"],
+            metrics=metrics,
         )
+        engine.load()
+        bad_rows = []
 
-        created = 0
-        updated = 0
-        skipped = 0
+        try:
+            self.write_chunks(csv_path, batch, options, engine, metrics, bad_rows)
+        finally:
+            # Одна новая метка версии справочника на импорт, в том числе прерванный.
+            engine.announce_changes()
+
+        return bad_rows[:MAX_REPORTED_BAD_ROWS]
+
+    def write_chunks(self, csv_path, batch, options, engine, metrics, bad_rows):
+        chunk_size = max(1, options["chunk_size"])
+        base_counts = (batch.rows_created, batch.rows_updated, batch.rows_unchanged, batch.rows_skipped)
+
+        with open_dtc_rows(csv_path, options["delimiter"]) as source:
+            rows = source.rows
+
+            # Уже записанные строки пропускаются через тот же reader:
+            # значения CSV в кавычках могут занимать несколько строк файла.
+            with metrics.phase("resume_skip", rows=batch.last_row_offset):
+                for _ in islice(rows, batch.last_row_offset):
+                    pass
+
+            start_offset = batch.last_row_offset
+            start_position = source.position()
+            started = time.perf_counter()
+
+            while True:
+                with metrics.phase("read"):
+                    chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                metrics.add_rows("read", len(chunk))
+
+                first_index = batch.last_row_offset + source.first_line
+
+                with metrics.phase("validate", rows=len(chunk)):
+                    for index, row in enumerate(chunk, start=first_index):
+                        problems = row_problems(index, row)
+
+                        if problems:
+                            batch.rows_bad += 1
+                            if len(bad_rows) < MAX_REPORTED_BAD_ROWS:
+                                bad_rows.extend(problems)
+
+                with transaction.atomic():
+                    # Запись пакета (фазы brands/write) идёт внутри: время
+                    # вложенных фаз в normalize не попадает.
+                    with metrics.phase("normalize", rows=len(chunk)):
+                        for row in chunk:
+                            engine.add_row(row, source_name=batch.source_name, source_url=batch.source_url)
+
+                        engine.flush()
+
+                    batch.last_row_offset += len(chunk)
+                    batch.rows_created = base_counts[0] + engine.created
+                    batch.rows_updated = base_counts[1] + engine.updated
+                    batch.rows_unchanged = base_counts[2] + engine.unchanged
+                    batch.rows_skipped = base_counts[3] + engine.skipped
+
+                    with metrics.phase("checkpoint"):
+                        batch.save(update_fields=[
+                            "last_row_offset",
+                            "rows_created",
+                            "rows_updated",
+                            "rows_unchanged",
+                            "rows_skipped",
+                            "rows_bad",
+                        ])
+
+                self.report_progress(
+                    rows_done=batch.last_row_offset - start_offset,
+                    offset=batch.last_row_offset,
+                    elapsed=time.perf_counter() - started,
+                    position=source.position(),
+                    start_position=start_position,
+                    file_size=source.size,
+                )
 
-        for row in rows:
-            code = normalize_code(row.get("code"))
-            system = code_system(code)
+    def report_progress(self, rows_done, offset, elapsed, position, start_position, file_size):
+        # Позиция в байтах неточна на размер буфера чтения, для ETA этого достаточно.
+        rate = rows_done / elapsed if elapsed else 0.0
+        read = position - start_position
+        percent = position / file_size * 100 if file_size else 100.0
 
-            if not code or not system:
-                skipped += 1
-                continue
+        eta = ""
+        if read > 0 and elapsed:
+            eta = f" ETA={format_eta((file_size - position) / (read / elapsed))}"
 
-            manufacturer = (row.get("manufacturer") or "").strip()
-            brand = None
+        self.stdout.write(f"rows={offset} rows/s={rate:.0f} read={min(percent, 100.0):.1f}%{eta}")
 
-            if manufacturer:
-                brand, _ = VehicleBrand.objects.get_or_create(
-                    name=manufacturer,
-                    defaults={
-                        "slug": slugify(manufacturer) or manufacturer.lower().replace(" ", "-")
-                    },
-                )
+    def dry_run(self, csv_path, delimiter, workers=1):
+        with open_dtc_rows(csv_path, delimiter) as source:
+            result = None
 
-            defaults = {
-                "system": system,
-                "scope": DTCReference.Scope.MANUFACTURER if manufacturer else DTCReference.Scope.GENERIC,
-                "manufacturer": manufacturer,
-                "brand": brand,
-                "title_ru": (row.get("title_ru") or "").strip()[:500],
-                "title_en": (row.get("title_en") or "").strip()[:500],
-                "description_ru": (row.get("description_ru") or "").strip(),
-                "description_en": (row.get("description_en") or "").strip(),
-                "symptoms": (row.get("symptoms") or "").strip(),
-                "possible_causes": (row.get("possible_causes") or "").strip(),
-                "diagnostic_notes": (row.get("diagnostic_notes") or "").strip(),
-                "recommended_checks": (row.get("recommended_checks") or "").strip(),
-                "severity": normalize_severity(row.get("severity")),
-                "source_name": (row.get("source_name") or "").strip() or source_name,
-                "source_url": (row.get("source_url") or "").strip() or source_url,
-                "is_active": True,
-                "import_batch": batch,
-            }
-
-            _, was_created = DTCReference.objects.update_or_create(
-                code=code,
-                manufacturer=manufacturer,
-                defaults=defaults,
-            )
+            if workers > 1 and source.container == "plain":
+                result = self.validate_parallel(csv_path, source, delimiter, workers)
 
-            if was_created:
-                created += 1
-            else:
-                updated += 1
+            if result is None:
+                result = scan_rows(source.rows, source.first_line)
 
-        batch.rows_total = len(rows)
-        batch.rows_created = created
-        batch.rows_updated = updated
-        batch.rows_skipped = skipped
-        batch.notes = f"bad_rows={len(bad_rows)}"
-        batch.save()
+        rows_total, bad_rows, bad_total, sample = result
 
-        self.stdout.write(self.style.SUCCESS(
-            f"DTC CSV imported: total={len(rows)} created={created} updated={updated} skipped={skipped} bad_rows={len(bad_rows)}"
-        ))
+        self.stdout.write(
+            f"DRY RUN format={source.format} container={source.container} "
+            f"rows={rows_total} bad_rows={bad_total}"
+        )
+        for item in bad_rows[:DRY_RUN_BAD_ROWS]:
+            self.stdout.write(str(item))
+        for row in sample:
+            self.stdout.write(str(row))
+
+    def validate_parallel(self, csv_path, source, delimiter, workers):
+        """
+        Валидация несжатого файла в пуле процессов по диапазонам байт,
+        выровненным на границы строк. Ответы сводятся в исходном порядке
+        строк. None — файл нельзя делить по строкам (многострочные значения CSV).
+        """
+        fieldnames = None
+        data_start = 0
+
+        if source.format == "csv":
+            with open(csv_path, "rb") as f:
+                header = f.readline()
+                data_start = f.tell()
+            fieldnames = next(csv.reader([header.decode("utf-8-sig")], delimiter=delimiter), [])
+
+        ranges = byte_ranges(data_start, source.size, workers)
+
+        if len(ranges) < 2:
+            return None
+
+        tasks = [
+            (str(csv_path), start, end, source.format, fieldnames, delimiter)
+            for start, end in ranges
+        ]
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            shards = list(executor.map(validate_shard, tasks))
+
+        if any(shard[4] for shard in shards):
+            self.stdout.write("Multi-line CSV values found, validating sequentially")
+            return None
+
+        rows_total = 0
+        lines_total = 0
+        bad_total = 0
+        bad_rows = []
+        sample = []
+
+        for count, shard_bad_rows, shard_bad_total, shard_sample, _, lines_read in shards:
+            # Номера JSON Lines в диапазоне — по строкам файла, CSV — по записям.
+            first_index = (lines_total if source.format == "jsonl" else rows_total) + source.first_line
+            bad_rows.extend((first_index + index, *rest) for index, *rest in shard_bad_rows)
+            sample.extend(shard_sample)
+            rows_total += count
+            lines_total += lines_read
+            bad_total += shard_bad_total
+
+        return rows_total, bad_rows[:DRY_RUN_BAD_ROWS], bad_total, sample[:DRY_RUN_SAMPLE_ROWS]
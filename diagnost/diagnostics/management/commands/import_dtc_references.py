@@ -1,12 +1,8 @@
 from django.core.management.base import BaseCommand
-from django.utils.text import slugify
 
-from diagnostics.models import (
-    DTCImportBatch,
-    DTCReference,
-    DiagnosticCode,
-    VehicleBrand,
-)
+from diagnostics.dtc_import import DTCUpsertEngine, code_system, normalize_code, relink_diagnostic_codes
+from diagnostics.import_metrics import ImportMetrics
+from diagnostics.models import DTCImportBatch, DiagnosticCode
 
 
 BASIC_DTC = [
@@ -183,15 +179,6 @@ BASIC_DTC = [
 ]
 
 
-def normalize_code(value):
-    return (value or "").strip().upper()
-
-
-def code_system(code):
-    code = normalize_code(code)
-    return code[0] if code and code[0] in ["P", "C", "B", "U"] else ""
-
-
 class Command(BaseCommand):
     help = "Import starter DTC references and link existing DiagnosticCode rows."
 
@@ -209,112 +196,82 @@ class Command(BaseCommand):
             file_name="seed-basic",
         )
 
-        created = 0
-        updated = 0
-        skipped = 0
+        metrics = ImportMetrics()
 
-        rows = []
+        with metrics.capture():
+            rows, counts, linked = self.import_rows(batch, options, metrics)
 
-        if options["seed_basic"]:
-            rows.extend(BASIC_DTC)
+        created = counts["created"]
+        updated = counts["updated"]
+        unchanged = counts["unchanged"]
+        skipped = counts["skipped"]
 
-        if options["from_existing_codes"]:
-            existing_codes = (
-                DiagnosticCode.objects
-                .exclude(code="")
-                .values_list("code", flat=True)
-                .distinct()
-            )
+        batch.rows_total = len(rows)
+        batch.rows_created = created
+        batch.rows_updated = updated
+        batch.rows_unchanged = unchanged
+        batch.rows_skipped = skipped
+        batch.notes = (
+            f"linked_existing={sum(linked.values())} "
+            f"(manufacturer={linked['manufacturer']}, generic={linked['generic']})"
+        )
+        batch.metrics = {"import": metrics.as_dict(rows=len(rows))}
+        batch.save()
 
-            known = {normalize_code(row["code"]) for row in rows}
+        self.stdout.write(self.style.SUCCESS(
+            f"DTC references imported: total={len(rows)} created={created} updated={updated} "
+            f"unchanged={unchanged} skipped={skipped} "
+            f"linked_manufacturer={linked['manufacturer']} linked_generic={linked['generic']}"
+        ))
 
-            for code in existing_codes:
-                code = normalize_code(code)
+    def import_rows(self, batch, options, metrics):
+        source_name = options["source_name"]
+        rows = []
 
-                if not code or code in known or code_system(code) == "":
-                    continue
+        if options["seed_basic"]:
+            rows.extend(BASIC_DTC)
 
-                rows.append({
-                    "code": code,
-                    "title_ru": f"Код неисправности {code}",
-                    "title_en": "",
-                    "description_ru": "Код найден в диагностической сессии. Подробная расшифровка требует уточнения по марке, модели, блоку управления и данным live data.",
-                    "symptoms": "",
-                    "possible_causes": "Возможные причины зависят от конкретного автомобиля, блока управления и условий появления ошибки.",
-                    "recommended_checks": "Считать все блоки, проверить freeze frame/live data, сопутствующие ошибки, питание, массу, проводку и условия возникновения.",
-                    "severity": "medium",
-                })
+        if options["from_existing_codes"]:
+            with metrics.phase("existing_codes"):
+                existing_codes = (
+                    DiagnosticCode.objects
+                    .exclude(code="")
+                    .values_list("code", flat=True)
+                    .distinct()
+                )
 
-        for row in rows:
-            code = normalize_code(row.get("code"))
-            system = code_system(code)
+                known = {normalize_code(row["code"]) for row in rows}
 
-            if not code or not system:
-                skipped += 1
-                continue
+                for code in existing_codes:
+                    code = normalize_code(code)
 
-            manufacturer = (row.get("manufacturer") or "").strip()
-            brand = None
+                    if not code or code in known or code_system(code) == "":
+                        continue
 
-            if manufacturer:
-                brand, _ = VehicleBrand.objects.get_or_create(
-                    name=manufacturer,
-                    defaults={
-                        "slug": slugify(manufacturer) or manufacturer.lower().replace(" ", "-")
-                    },
-                )
+                    rows.append({
+                        "code": code,
+                        "title_ru": f"Код неисправности {code}",
+                        "title_en": "",
+                        "description_ru": "Код найден в диагностической сессии. Подробная расшифровка требует уточнения по марке, модели, блоку управления и данным live data.",
+                        "symptoms": "",
+                        "possible_causes": "Возможные причины зависят от конкретного автомобиля, блока управления и условий появления ошибки.",
+                        "recommended_checks": "Считать все блоки, проверить freeze frame/live data, сопутствующие ошибки, питание, массу, проводку и условия возникновения.",
+                        "severity": "medium",
+                    })
 
-            defaults = {
-                "system": system,
-                "scope": DTCReference.Scope.MANUFACTURER if manufacturer else DTCReference.Scope.GENERIC,
-                "manufacturer": manufacturer,
-                "brand": brand,
-                "title_ru": row.get("title_ru", ""),
-                "title_en": row.get("title_en", ""),
-                "description_ru": row.get("description_ru", ""),
-                "description_en": row.get("description_en", ""),
-                "symptoms": row.get("symptoms", ""),
-                "possible_causes": row.get("possible_causes", ""),
-                "diagnostic_notes": row.get("diagnostic_notes", ""),
-                "recommended_checks": row.get("recommended_checks", ""),
-                "severity": row.get("severity") or DTCReference.Severity.MEDIUM,
-                "source_name": source_name,
-                "is_active": True,
-                "import_batch": batch,
-            }
+        engine = DTCUpsertEngine(batch=batch, metrics=metrics)
+        engine.load()
 
-            _, was_created = DTCReference.objects.update_or_create(
-                code=code,
-                manufacturer=manufacturer,
-                defaults=defaults,
-            )
+        with metrics.phase("normalize", rows=len(rows)):
+            for row in rows:
+                engine.add_row(row, source_name=source_name)
 
-            if was_created:
-                created += 1
-            else:
-                updated += 1
+            counts = engine.finish()
 
-        linked = 0
+        linked = {"manufacturer": 0, "generic": 0}
 
         if options["link_existing"]:
-            for dc in DiagnosticCode.objects.filter(reference__isnull=True).exclude(code=""):
-                ref = DTCReference.objects.filter(
-                    code=normalize_code(dc.code),
-                    manufacturer="",
-                ).first()
-
-                if ref:
-                    dc.reference = ref
-                    dc.save(update_fields=["reference"])
-                    linked += 1
+            with metrics.phase("relink"):
+                linked = relink_diagnostic_codes()
 
-        batch.rows_total = len(rows)
-        batch.rows_created = created
-        batch.rows_updated = updated
-        batch.rows_skipped = skipped
-        batch.notes = f"linked_existing={linked}"
-        batch.save()
-
-        self.stdout.write(self.style.SUCCESS(
-            f"DTC references imported: total={len(rows)} created={created} updated={updated} skipped={skipped} linked={linked}"
-        ))
+        return rows, counts, linked
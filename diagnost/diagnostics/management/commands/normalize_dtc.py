@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from diagnostics.dtc_import import relink_diagnostic_codes
+from diagnostics.dtc_index import bump_dtc_generation
+from diagnostics.dtc_normalize import DEFAULT_CHUNK_SIZE, normalize_diagnostic_codes, normalize_dtc_references
+
+
+class Command(BaseCommand):
+    help = (
+        "Normalize DTCReference and DiagnosticCode rows in chunks (the rules of "
+        "DTCReference.save()) and link unlinked session codes to references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--no-link", action="store_true", help="Do not relink session codes")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+
+        references = normalize_dtc_references(chunk_size=chunk_size)
+        codes = normalize_diagnostic_codes(chunk_size=chunk_size)
+
+        if references["normalized"] or references["merged"]:
+            bump_dtc_generation()
+
+        linked = {"manufacturer": 0, "generic": 0}
+        if not options["no_link"]:
+            linked = relink_diagnostic_codes(chunk_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"References normalized={references['normalized']} merged={references['merged']} "
+            f"session_codes_normalized={codes} "
+            f"linked_manufacturer={linked['manufacturer']} linked_generic={linked['generic']}"
+        ))
@@ -1,26 +1,139 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
 
-from diagnostics.launch_pdf_parser import parse_launch_pdf
+from diagnostics.launch_pdf_parser import iter_pdf_pages, parse_launch_pages
+
+
+GLOB_CHARS = set("*?[")
+
+
+def collect_pdf_paths(specs):
+    paths = []
+
+    for spec in specs:
+        path = Path(spec)
+
+        if path.is_dir():
+            matches = [p for p in path.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf"]
+        elif GLOB_CHARS & set(spec):
+            matches = [Path(p) for p in glob.glob(spec, recursive=True) if Path(p).is_file()]
+        elif path.exists():
+            matches = [path]
+        else:
+            raise CommandError(f"PDF not found: {path}")
+
+        paths.extend(matches)
+
+    return sorted({str(p) for p in paths})
+
+
+def parse_report(path):
+    """Разбор одного отчёта для пакетного режима. Выполняется в процессе пула."""
+    record = {
+        "path": path,
+        "vehicle": {},
+        "faults": [],
+        "pages": 0,
+        "timings": {},
+        "error": "",
+    }
+    extract_seconds = 0.0
+
+    def timed_pages():
+        nonlocal extract_seconds
+        pages = iter_pdf_pages(path)
+
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    page_text = next(pages)
+                except StopIteration:
+                    return
+                finally:
+                    extract_seconds += time.perf_counter() - started
+
+                yield page_text
+        finally:
+            pages.close()
+
+    started = time.perf_counter()
+    pages = timed_pages()
+
+    try:
+        parsed = parse_launch_pages(pages)
+    except Exception as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    else:
+        record["vehicle"] = parsed["vehicle"]
+        record["faults"] = parsed["faults"]
+        record["pages"] = parsed["pages"]
+    finally:
+        pages.close()
+
+    total = time.perf_counter() - started
+    record["timings"] = {
+        "extract": round(extract_seconds, 4),
+        "parse": round(max(total - extract_seconds, 0.0), 4),
+        "total": round(total, 4),
+    }
+
+    return record
 
 
 class Command(BaseCommand):
-    help = "Parse Launch AllSystemDTC PDF and print extracted vehicle info and DTC faults."
+    help = (
+        "Parse Launch AllSystemDTC PDF and print extracted vehicle info and DTC faults. "
+        "With several paths, directories or globs runs in batch mode and writes one JSONL record per report."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("pdf_path")
+        parser.add_argument("pdf_path", nargs="+", help="PDF file, directory or glob pattern")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of parser processes in batch mode",
+        )
+        parser.add_argument(
+            "--output",
+            default="",
+            help="JSONL output file for batch mode (default: stdout)",
+        )
 
     def handle(self, *args, **options):
-        path = Path(options["pdf_path"])
+        specs = options["pdf_path"]
+        single = (
+            len(specs) == 1
+            and not options["output"]
+            and Path(specs[0]).is_file()
+        )
 
-        if not path.exists():
-            raise CommandError(f"PDF not found: {path}")
+        if single:
+            self.print_report(Path(specs[0]))
+            return
+
+        paths = collect_pdf_paths(specs)
 
-        parsed = parse_launch_pdf(path)
+        if not paths:
+            raise CommandError("No PDF files matched")
 
-        vehicle = parsed["vehicle"]
-        faults = parsed["faults"]
+        self.run_batch(paths, workers=max(1, options["workers"]), output=options["output"])
+
+    def print_report(self, path):
+        record = parse_report(str(path))
+
+        if record["error"]:
+            raise CommandError(record["error"])
+
+        vehicle = record["vehicle"]
+        faults = record["faults"]
 
         self.stdout.write("=== VEHICLE ===")
         for key, value in vehicle.items():
@@ -35,3 +148,47 @@ class Command(BaseCommand):
                 f"{fault.get('module_code') or '-'} ({fault.get('module_name') or '-'}) | "
                 f"{fault.get('description') or '-'}"
             )
+
+    def run_batch(self, paths, workers, output):
+        out = open(output, "w", encoding="utf-8") if output else self.stdout
+        summary = self.stdout if output else self.stderr
+
+        started = time.perf_counter()
+        reports = 0
+        errors = 0
+        pages = 0
+        faults = 0
+
+        try:
+            if workers == 1:
+                records = map(parse_report, paths)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                chunksize = max(1, len(paths) // (workers * 4))
+                records = executor.map(parse_report, paths, chunksize=chunksize)
+
+            try:
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+                    reports += 1
+                    pages += record["pages"]
+                    faults += len(record["faults"])
+
+                    if record["error"]:
+                        errors += 1
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+        finally:
+            if output:
+                out.close()
+
+        elapsed = time.perf_counter() - started
+        pages_per_second = pages / elapsed if elapsed else 0.0
+
+        summary.write(
+            f"Parsed reports={reports} errors={errors} pages={pages} faults={faults} "
+            f"workers={workers} wall={elapsed:.2f}s pages/s={pages_per_second:.1f}"
+        )
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnostics.dtc_import import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    StagedBatchError,
+    publish_staged_batch,
+    relink_diagnostic_codes,
+    rollback_published_batch,
+)
+from diagnostics.models import DTCImportBatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish a DTC import batch loaded with import_dtc_csv --stage into DTCReference "
+        "chunk by chunk, or roll a published batch back with --rollback."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("batch_id", type=int)
+        parser.add_argument(
+            "--rollback",
+            action="store_true",
+            help="Restore DTCReference rows changed by the batch and delete rows it created",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Staged rows read and published per transaction",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows per bulk INSERT/UPDATE statement",
+        )
+
+    def handle(self, *args, **options):
+        batch = DTCImportBatch.objects.filter(pk=options["batch_id"]).first()
+
+        if batch is None:
+            raise CommandError(f"Import batch not found: {options['batch_id']}")
+
+        try:
+            if options["rollback"]:
+                stats = rollback_published_batch(batch, batch_size=options["batch_size"])
+            else:
+                stats = publish_staged_batch(
+                    batch,
+                    chunk_size=options["chunk_size"],
+                    batch_size=options["batch_size"],
+                )
+        except StagedBatchError as exc:
+            raise CommandError(str(exc))
+
+        if options["rollback"]:
+            # Коды сессий, ссылавшиеся на удалённые строки, привязываются заново.
+            linked = relink_diagnostic_codes()
+            self.stdout.write(self.style.SUCCESS(
+                f"Batch {batch.pk} rolled back: restored={stats['restored']} deleted={stats['deleted']} "
+                f"relinked={linked['manufacturer'] + linked['generic']}"
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Batch {batch.pk} published: created={stats['created']} updated={stats['updated']} "
+            f"unchanged={stats['unchanged']}"
+        ))
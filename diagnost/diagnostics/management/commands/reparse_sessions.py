@@ -0,0 +1,117 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from diagnostics.launch_pdf_parser import (
+    PARSER_VERSION,
+    apply_launch_parse_to_session,
+    decompress_report_text,
+    parse_launch_text,
+)
+from diagnostics.models import DiagnosticSession
+
+
+def reparse_report_text(item):
+    """Разбор сохранённого текста одной сессии. Выполняется в процессе пула."""
+    session_id, report_text = item
+
+    try:
+        return session_id, parse_launch_text(decompress_report_text(report_text)), ""
+    except Exception as exc:
+        return session_id, None, f"{type(exc).__name__}: {exc}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parse stored Launch report text of sessions parsed by an older parser version. "
+        "PDF files are not read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=200, help="Sessions per chunk")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of parser processes",
+        )
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many sessions (0 = all)")
+        parser.add_argument("--all", action="store_true", help="Re-parse sessions of the current version too")
+        parser.add_argument("--dry-run", action="store_true", help="Only count sessions to re-parse")
+
+    def handle(self, *args, **options):
+        queryset = DiagnosticSession.objects.filter(report_text__isnull=False)
+
+        if not options["all"]:
+            queryset = queryset.filter(~Q(report_parser_version=PARSER_VERSION))
+
+        total = queryset.count()
+        self.stdout.write(f"Sessions to re-parse: {total} (parser version {PARSER_VERSION})")
+
+        if options["dry_run"] or not total:
+            return
+
+        chunk_size = max(1, options["chunk_size"])
+        workers = max(1, options["workers"])
+        limit = options["limit"]
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        started = time.perf_counter()
+        last_id = 0
+        processed = 0
+        codes = 0
+        errors = 0
+
+        try:
+            while not limit or processed < limit:
+                size = min(chunk_size, limit - processed) if limit else chunk_size
+
+                # Ключевая пагинация по id: выборка не зависит от уже обновлённых строк.
+                items = list(
+                    queryset
+                    .filter(id__gt=last_id)
+                    .order_by("id")
+                    .values_list("id", "report_text")[:size]
+                )
+
+                if not items:
+                    break
+
+                last_id = items[-1][0]
+
+                if executor is None:
+                    results = list(map(reparse_report_text, items))
+                else:
+                    results = list(executor.map(reparse_report_text, items))
+
+                parsed_by_id = {}
+                for session_id, parsed, error in results:
+                    if error:
+                        errors += 1
+                        self.stderr.write(f"Session #{session_id}: {error}")
+                    else:
+                        parsed_by_id[session_id] = parsed
+
+                sessions = DiagnosticSession.objects.filter(id__in=parsed_by_id).defer("report_text")
+
+                for session in sessions:
+                    codes += apply_launch_parse_to_session(session, parsed_by_id[session.id])
+
+                DiagnosticSession.objects.filter(id__in=parsed_by_id).update(
+                    report_parser_version=PARSER_VERSION,
+                )
+
+                processed += len(items)
+                self.stdout.write(f"Re-parsed {processed}/{total} sessions, last id {last_id}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: sessions={processed} codes={codes} errors={errors} "
+            f"workers={workers} wall={elapsed:.2f}s"
+        ))
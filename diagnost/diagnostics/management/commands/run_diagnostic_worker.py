@@ -0,0 +1,61 @@
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from diagnostics.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run background diagnostic jobs (Launch PDF parsing) from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process queued jobs and exit")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Poll interval in seconds when the queue is empty")
+        parser.add_argument("--max-jobs", type=int, default=0, help="Exit after this many jobs (0 = no limit)")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Requeue running jobs started more than this many seconds ago",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        stale_after = timedelta(seconds=options["stale_after"])
+        max_jobs = options["max_jobs"]
+        processed = 0
+
+        self.stdout.write(f"Diagnostic worker {worker} started")
+
+        try:
+            while not max_jobs or processed < max_jobs:
+                close_old_connections()
+
+                requeued = requeue_stale_jobs(stale_after)
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f"Stale jobs requeued or failed: {requeued}"))
+
+                job = claim_next_job(worker)
+
+                if job is None:
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+
+                job = run_job(job)
+                processed += 1
+
+                message = f"Job #{job.id} {job.kind} session={job.session_id} -> {job.status}"
+                if job.error:
+                    self.stdout.write(self.style.ERROR(f"{message}: {job.error}"))
+                else:
+                    self.stdout.write(f"{message} {job.result}")
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Diagnostic worker {worker} stopped: processed={processed}"))
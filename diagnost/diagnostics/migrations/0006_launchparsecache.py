@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0005_diagnosticcode_module_code_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaunchParseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('parser_version', models.CharField(max_length=32)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('file_size', models.PositiveBigIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Кэш разбора отчёта Launch',
+                'verbose_name_plural': 'Кэш разбора отчётов Launch',
+                'ordering': ['-last_used_at'],
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'parser_version'), name='unique_launch_parse_cache_entry')],
+            },
+        ),
+    ]
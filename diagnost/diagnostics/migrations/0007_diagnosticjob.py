@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0006_launchparsecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosticJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('launch_parse', 'Разбор отчёта Launch')], default='launch_parse', max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=128)),
+                ('error', models.TextField(blank=True)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='diagnostics.diagnosticsession')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача диагностики',
+                'verbose_name_plural': 'Фоновые задачи диагностики',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='diagnostics_status_16d684_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0007_diagnosticjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosticsession',
+            name='report_parser_version',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='diagnosticsession',
+            name='report_text',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='launchparsecache',
+            name='report_text',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0008_diagnosticsession_report_parser_version_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='last_row_offset',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='rows_bad',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='status',
+            field=models.CharField(choices=[('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='done', max_length=16),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:22
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# Копия набора полей и хеша на момент миграции: последующие изменения
+# diagnostics.models не должны менять то, что записывает эта миграция.
+FINGERPRINT_FIELDS = (
+    "code",
+    "system",
+    "scope",
+    "manufacturer",
+    "title_ru",
+    "title_en",
+    "description_ru",
+    "description_en",
+    "symptoms",
+    "possible_causes",
+    "diagnostic_notes",
+    "recommended_checks",
+    "severity",
+    "source_name",
+    "source_url",
+    "is_active",
+)
+
+
+def compute_fingerprint(values):
+    payload = "\x1f".join(
+        "" if values.get(name) is None else str(values[name])
+        for name in FINGERPRINT_FIELDS
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fill_fingerprints(apps, schema_editor):
+    DTCReference = apps.get_model("diagnostics", "DTCReference")
+    batch = []
+
+    for values in DTCReference.objects.values("id", *FINGERPRINT_FIELDS).iterator(chunk_size=2000):
+        batch.append(DTCReference(id=values["id"], fingerprint=compute_fingerprint(values)))
+
+        if len(batch) >= 2000:
+            DTCReference.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+
+    if batch:
+        DTCReference.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0009_dtcimportbatch_last_row_offset_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='rows_unchanged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dtcreference',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0010_dtcimportbatch_rows_unchanged_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='use_staging',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='dtcimportbatch',
+            name='status',
+            field=models.CharField(choices=[('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка'), ('staged', 'Загружен в staging'), ('published', 'Опубликован'), ('rolled_back', 'Откачен')], default='done', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='DTCStagedReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('incoming', 'Новая строка'), ('previous', 'Снимок до публикации')], default='incoming', max_length=16)),
+                ('code', models.CharField(max_length=32)),
+                ('manufacturer', models.CharField(blank=True, default='', max_length=120)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('fingerprint', models.CharField(blank=True, default='', max_length=32)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staged_references', to='diagnostics.dtcimportbatch')),
+            ],
+            options={
+                'verbose_name': 'Staging-строка DTC',
+                'verbose_name_plural': 'Staging-строки DTC',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['batch', 'kind'], name='diagnostics_batch_i_30570e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0011_dtcimportbatch_published_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dtcimportbatch',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,172 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:35
+
+import hashlib
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# Правила нормализации и fingerprint на момент миграции — копия, а не
+# импорт из diagnostics: последующие изменения кода не меняют миграцию.
+SYSTEM_PREFIXES = ("P", "C", "B", "U")
+
+FINGERPRINT_FIELDS = (
+    "code",
+    "system",
+    "scope",
+    "manufacturer",
+    "title_ru",
+    "title_en",
+    "description_ru",
+    "description_en",
+    "symptoms",
+    "possible_causes",
+    "diagnostic_notes",
+    "recommended_checks",
+    "severity",
+    "source_name",
+    "source_url",
+    "is_active",
+)
+
+CHUNK_SIZE = 5000
+
+
+def compute_fingerprint(values):
+    payload = "\x1f".join(
+        "" if values.get(name) is None else str(values[name])
+        for name in FINGERPRINT_FIELDS
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def normalize_code(value):
+    return (value or "").upper().strip()
+
+
+def normalize_references(DTCReference, DiagnosticCode):
+    # Ключ без учёта регистра марки, как в уникальном индексе MySQL.
+    keys = {
+        (code, manufacturer.casefold()): pk
+        for code, manufacturer, pk in DTCReference.objects.values_list("code", "manufacturer", "id").iterator(chunk_size=10000)
+    }
+    duplicates = {}
+    last_id = 0
+
+    while True:
+        rows = list(
+            DTCReference.objects
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values("id", "fingerprint", *FINGERPRINT_FIELDS)[:CHUNK_SIZE]
+        )
+
+        if not rows:
+            break
+
+        last_id = rows[-1]["id"]
+        updates = []
+
+        for row in rows:
+            old_key = (row["code"], row["manufacturer"].casefold())
+            original = (row["code"], row["manufacturer"], row["system"], row["scope"], row["fingerprint"])
+
+            row["code"] = normalize_code(row["code"])
+            row["manufacturer"] = (row["manufacturer"] or "").strip()
+            if row["code"]:
+                row["system"] = row["code"][0] if row["code"][0] in SYSTEM_PREFIXES else "O"
+            if not row["scope"] or row["scope"] == "unknown":
+                row["scope"] = "manufacturer" if row["manufacturer"] else "generic"
+            row["fingerprint"] = compute_fingerprint(row)
+
+            if (row["code"], row["manufacturer"], row["system"], row["scope"], row["fingerprint"]) == original:
+                continue
+
+            new_key = (row["code"], row["manufacturer"].casefold())
+            owner = keys.get(new_key)
+
+            if new_key != old_key and owner is not None and owner != row["id"]:
+                duplicates[row["id"]] = owner
+                continue
+
+            if new_key != old_key:
+                keys.pop(old_key, None)
+                keys[new_key] = row["id"]
+
+            updates.append(DTCReference(
+                id=row["id"],
+                code=row["code"],
+                manufacturer=row["manufacturer"],
+                system=row["system"],
+                scope=row["scope"],
+                fingerprint=row["fingerprint"],
+            ))
+
+        if updates:
+            DTCReference.objects.bulk_update(updates, ["code", "manufacturer", "system", "scope", "fingerprint"])
+
+    for duplicate_id, owner_id in duplicates.items():
+        DiagnosticCode.objects.filter(reference_id=duplicate_id).update(reference_id=owner_id)
+
+    if duplicates:
+        DTCReference.objects.filter(id__in=list(duplicates)).delete()
+
+
+def normalize_codes(DiagnosticCode):
+    last_id = 0
+
+    while True:
+        rows = list(DiagnosticCode.objects.filter(id__gt=last_id).order_by("id").values_list("id", "code")[:CHUNK_SIZE])
+
+        if not rows:
+            break
+
+        last_id = rows[-1][0]
+        updates = [
+            DiagnosticCode(id=pk, code=normalize_code(code))
+            for pk, code in rows
+            if normalize_code(code) != code
+        ]
+
+        if updates:
+            DiagnosticCode.objects.bulk_update(updates, ["code"])
+
+
+def normalize_existing_rows(apps, schema_editor):
+    # Строки, записанные в обход save(), приводятся к норме до CHECK-ограничений.
+    DTCReference = apps.get_model("diagnostics", "DTCReference")
+    DiagnosticCode = apps.get_model("diagnostics", "DiagnosticCode")
+
+    normalize_references(DTCReference, DiagnosticCode)
+    normalize_codes(DiagnosticCode)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0012_dtcimportbatch_metrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_existing_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='diagnosticcode',
+            constraint=models.CheckConstraint(condition=models.Q(('code', django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('code')))), name='diagnostic_code_normalized'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(('code', django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('code')))), name='dtc_reference_code_normalized'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(('manufacturer', django.db.models.functions.text.Trim('manufacturer'))), name='dtc_reference_manufacturer_trimmed'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(('code', ''), models.Q(('system', 'O'), models.Q(models.Q(('code__startswith', 'P')), models.Q(('code__startswith', 'C')), models.Q(('code__startswith', 'B')), models.Q(('code__startswith', 'U')), _connector='OR', _negated=True)), models.Q(('code__startswith', 'P'), ('system', 'P')), models.Q(('code__startswith', 'C'), ('system', 'C')), models.Q(('code__startswith', 'B'), ('system', 'B')), models.Q(('code__startswith', 'U'), ('system', 'U')), _connector='OR'), name='dtc_reference_system_matches_code'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(('scope__in', ['', 'unknown']), _negated=True), name='dtc_reference_scope_resolved'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0013_diagnosticcode_diagnostic_code_normalized_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DTCReferenceGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.CharField(default='', max_length=32)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Версия справочника DTC',
+                'verbose_name_plural': 'Версия справочника DTC',
+            },
+        ),
+    ]
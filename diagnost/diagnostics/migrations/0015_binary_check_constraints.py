@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:00
+
+import diagnostics.models
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0014_dtcreferencegeneration'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='diagnosticcode',
+            name='diagnostic_code_normalized',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dtcreference',
+            name='dtc_reference_code_normalized',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dtcreference',
+            name='dtc_reference_manufacturer_trimmed',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dtcreference',
+            name='dtc_reference_system_matches_code',
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosticcode',
+            constraint=models.CheckConstraint(condition=models.Q(django.db.models.lookups.Exact(diagnostics.models.BinaryString('code'), diagnostics.models.BinaryString(django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('code'))))), name='diagnostic_code_normalized'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(django.db.models.lookups.Exact(diagnostics.models.BinaryString('code'), diagnostics.models.BinaryString(django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('code'))))), name='dtc_reference_code_normalized'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(django.db.models.lookups.Exact(diagnostics.models.BinaryString('manufacturer'), diagnostics.models.BinaryString(django.db.models.functions.text.Trim('manufacturer')))), name='dtc_reference_manufacturer_trimmed'),
+        ),
+        migrations.AddConstraint(
+            model_name='dtcreference',
+            constraint=models.CheckConstraint(condition=models.Q(('code', ''), models.Q(django.db.models.lookups.Exact(diagnostics.models.BinaryString('system'), diagnostics.models.BinaryString(models.Value('O'))), models.Q(models.Q(('code__startswith', 'P')), models.Q(('code__startswith', 'C')), models.Q(('code__startswith', 'B')), models.Q(('code__startswith', 'U')), _connector='OR', _negated=True)), models.Q(('code__startswith', 'P'), django.db.models.lookups.Exact(diagnostics.models.BinaryString('system'), diagnostics.models.BinaryString(models.Value('P')))), models.Q(('code__startswith', 'C'), django.db.models.lookups.Exact(diagnostics.models.BinaryString('system'), diagnostics.models.BinaryString(models.Value('C')))), models.Q(('code__startswith', 'B'), django.db.models.lookups.Exact(diagnostics.models.BinaryString('system'), diagnostics.models.BinaryString(models.Value('B')))), models.Q(('code__startswith', 'U'), django.db.models.lookups.Exact(diagnostics.models.BinaryString('system'), diagnostics.models.BinaryString(models.Value('U')))), _connector='OR'), name='dtc_reference_system_matches_code'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnostics', '0015_binary_check_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosticjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,12 @@
 # main/models.py
 from __future__ import annotations
 
+import hashlib
+
 from django.db import models
+from django.db.models import Func, Q, Value
+from django.db.models.functions import Trim, Upper
+from django.db.models.lookups import Exact
 from django.utils import timezone
 
 from users.models import UserProfile
@@ -21,17 +26,39 @@ class VehicleBrand(models.Model):
 
 
 class DTCImportBatch(models.Model):
+    class Status(models.TextChoices):
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+        STAGED = "staged", "Загружен в staging"
+        PUBLISHED = "published", "Опубликован"
+        ROLLED_BACK = "rolled_back", "Откачен"
+
     source_name = models.CharField(max_length=255, blank=True)
     source_url = models.URLField(blank=True)
     file_name = models.CharField(max_length=255, blank=True)
 
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.DONE)
+
     rows_total = models.PositiveIntegerField(default=0)
     rows_created = models.PositiveIntegerField(default=0)
     rows_updated = models.PositiveIntegerField(default=0)
     rows_skipped = models.PositiveIntegerField(default=0)
+    rows_unchanged = models.PositiveIntegerField(default=0)
+    rows_bad = models.PositiveIntegerField(default=0)
+
+    # Строки грузятся в DTCStagedReference и публикуются отдельным шагом.
+    use_staging = models.BooleanField(default=False)
+
+    # Число строк данных файла, уже записанных в БД (контрольная точка для --resume).
+    last_row_offset = models.PositiveBigIntegerField(default=0)
+
+    # Время, запросы и скорость по фазам каждой команды, см. diagnostics.import_metrics.
+    metrics = models.JSONField(default=dict, blank=True)
 
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
@@ -42,6 +69,122 @@ class DTCImportBatch(models.Model):
         return f"{self.source_name or 'DTC import'} — {self.created_at:%Y-%m-%d %H:%M}"
 
 
+# Поля, которые задаёт импорт справочника. По ним считается DTCReference.fingerprint:
+# повторный импорт тех же данных не переписывает строку.
+DTC_FINGERPRINT_FIELDS = (
+    "code",
+    "system",
+    "scope",
+    "manufacturer",
+    "title_ru",
+    "title_en",
+    "description_ru",
+    "description_en",
+    "symptoms",
+    "possible_causes",
+    "diagnostic_notes",
+    "recommended_checks",
+    "severity",
+    "source_name",
+    "source_url",
+    "is_active",
+)
+
+
+DTC_SYSTEM_PREFIXES = ("P", "C", "B", "U")
+
+
+def normalize_dtc_code(value) -> str:
+    return (value or "").upper().strip()
+
+
+def normalized_reference_values(code, manufacturer, system, scope) -> tuple[str, str, str, str]:
+    """
+    (code, manufacturer, system, scope) после нормализации. Одни и те же
+    правила для save() и для пакетной нормализации в diagnostics.dtc_normalize.
+    """
+    code = normalize_dtc_code(code)
+    manufacturer = (manufacturer or "").strip()
+
+    if code:
+        system = code[0] if code[0] in DTC_SYSTEM_PREFIXES else "O"
+
+    if not scope or scope == "unknown":
+        scope = "manufacturer" if manufacturer else "generic"
+
+    return code, manufacturer, system, scope
+
+
+class BinaryString(Func):
+    """
+    Строка для побайтового сравнения в CHECK-ограничениях. В MySQL
+    collation регистронезависимая и PAD SPACE, и "p0171 " там равно
+    "P0171"; в SQLite и PostgreSQL сравнение строк и так побайтовое.
+    """
+
+    template = "%(expressions)s"
+    output_field = models.CharField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="CAST(%(expressions)s AS BINARY)", **extra_context)
+
+
+def binary_equals(left, right) -> Q:
+    return Q(Exact(BinaryString(left), BinaryString(right)))
+
+
+def dtc_code_normalized_q(field: str = "code") -> Q:
+    """Условие CHECK: код без пробелов по краям и в верхнем регистре."""
+    return binary_equals(field, Upper(Trim(field)))
+
+
+def dtc_system_matches_code_q() -> Q:
+    condition = Q(code="") | (
+        binary_equals("system", Value("O"))
+        & ~Q(*[Q(code__startswith=prefix) for prefix in DTC_SYSTEM_PREFIXES], _connector=Q.OR)
+    )
+
+    for prefix in DTC_SYSTEM_PREFIXES:
+        condition |= Q(code__startswith=prefix) & binary_equals("system", Value(prefix))
+
+    return condition
+
+
+def dtc_reference_fingerprint(values) -> str:
+    """values — объект или словарь с полями DTC_FINGERPRINT_FIELDS."""
+    if not isinstance(values, dict):
+        values = {name: getattr(values, name) for name in DTC_FINGERPRINT_FIELDS}
+
+    payload = "\x1f".join(
+        "" if values.get(name) is None else str(values[name])
+        for name in DTC_FINGERPRINT_FIELDS
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DTCReferenceQuerySet(models.QuerySet):
+    def delete(self):
+        from diagnostics.dtc_index import bump_dtc_generation
+
+        result = super().delete()
+
+        # Одна новая метка версии на всё удаление, а не на каждую строку.
+        if result[0]:
+            bump_dtc_generation()
+
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def delete_without_bump(self):
+        """Удаление чанками в одной операции: метку версии вызывающий меняет сам, один раз."""
+        return super().delete()
+
+    delete_without_bump.alters_data = True
+    delete_without_bump.queryset_only = True
+
+
 class DTCReference(models.Model):
     class System(models.TextChoices):
         POWERTRAIN = "P", "Двигатель / трансмиссия"
@@ -114,16 +257,38 @@ class DTCReference(models.Model):
         related_name="dtc_references",
     )
 
+    fingerprint = models.CharField(max_length=32, blank=True, default="", editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DTCReferenceQuerySet.as_manager()
+
     class Meta:
         ordering = ["code", "manufacturer"]
         constraints = [
             models.UniqueConstraint(
                 fields=["code", "manufacturer"],
                 name="unique_dtc_reference_per_manufacturer",
-            )
+            ),
+            # Те же правила, что в normalize_fields(): bulk_create и
+            # QuerySet.update не могут записать ненормализованную строку.
+            models.CheckConstraint(
+                condition=dtc_code_normalized_q(),
+                name="dtc_reference_code_normalized",
+            ),
+            models.CheckConstraint(
+                condition=binary_equals("manufacturer", Trim("manufacturer")),
+                name="dtc_reference_manufacturer_trimmed",
+            ),
+            models.CheckConstraint(
+                condition=dtc_system_matches_code_q(),
+                name="dtc_reference_system_matches_code",
+            ),
+            models.CheckConstraint(
+                condition=~Q(scope__in=["", "unknown"]),
+                name="dtc_reference_scope_resolved",
+            ),
         ]
         indexes = [
             models.Index(fields=["code"]),
@@ -133,21 +298,31 @@ class DTCReference(models.Model):
         verbose_name = "Справочник DTC"
         verbose_name_plural = "Справочник DTC"
 
-    def save(self, *args, **kwargs):
-        self.code = (self.code or "").upper().strip()
+    def normalize_fields(self):
+        """Нормализация перед записью. Вызывается из save(), clean() и при bulk-импорте."""
+        self.code, self.manufacturer, self.system, self.scope = normalized_reference_values(
+            self.code,
+            self.manufacturer,
+            self.system,
+            self.scope,
+        )
+        self.fingerprint = dtc_reference_fingerprint(self)
 
-        if self.code:
-            if self.code[0] in ["P", "C", "B", "U"]:
-                self.system = self.code[0]
-            else:
-                self.system = self.System.OEM
+    def clean(self):
+        # Формы админки проверяют CHECK-ограничения до save().
+        self.normalize_fields()
 
-        self.manufacturer = (self.manufacturer or "").strip()
+    def save(self, *args, **kwargs):
+        self.normalize_fields()
+        super().save(*args, **kwargs)
 
-        if not self.scope or self.scope == self.Scope.UNKNOWN:
-            self.scope = self.Scope.MANUFACTURER if self.manufacturer else self.Scope.GENERIC
+    def delete(self, *args, **kwargs):
+        from diagnostics.dtc_index import bump_dtc_generation
 
-        super().save(*args, **kwargs)
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        bump_dtc_generation(removed=[pk])
+        return result
 
     def __str__(self):
         if self.manufacturer:
@@ -155,6 +330,61 @@ class DTCReference(models.Model):
         return self.code
 
 
+class DTCStagedReference(models.Model):
+    """
+    Строка справочника вне DTCReference. INCOMING — загруженные, но ещё
+    не опубликованные строки пакета. PREVIOUS — снимок строк DTCReference,
+    которые пакет изменил при публикации (data пустой — строку пакет
+    создал); по нему пакет откатывается.
+    """
+
+    class Kind(models.TextChoices):
+        INCOMING = "incoming", "Новая строка"
+        PREVIOUS = "previous", "Снимок до публикации"
+
+    batch = models.ForeignKey(
+        DTCImportBatch,
+        on_delete=models.CASCADE,
+        related_name="staged_references",
+    )
+    kind = models.CharField(max_length=16, choices=Kind.choices, default=Kind.INCOMING)
+
+    code = models.CharField(max_length=32)
+    manufacturer = models.CharField(max_length=120, blank=True, default="")
+    data = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=32, blank=True, default="")
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["batch", "kind"]),
+        ]
+        verbose_name = "Staging-строка DTC"
+        verbose_name_plural = "Staging-строки DTC"
+
+    def __str__(self):
+        return f"{self.code} [{self.manufacturer}] ({self.kind})"
+
+
+class DTCReferenceGeneration(models.Model):
+    """
+    Одна строка с меткой версии справочника DTC. Метка меняется при любой
+    записи в DTCReference (см. diagnostics.dtc_index); по ней процессы
+    понимают, что их индекс в памяти устарел. Метка случайная, а не
+    счётчик: после отката транзакции значение не повторяется.
+    """
+
+    generation = models.CharField(max_length=32, default="")
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Версия справочника DTC"
+        verbose_name_plural = "Версия справочника DTC"
+
+    def __str__(self):
+        return self.generation
+
+
 class OBDLiveDataPIDReference(models.Model):
     pid = models.CharField(max_length=20, unique=True)
     name_ru = models.CharField(max_length=255, blank=True)
@@ -180,6 +410,34 @@ class OBDLiveDataPIDReference(models.Model):
 
 
 
+class LaunchParseCache(models.Model):
+    """Результат разбора PDF Launch по SHA-256 содержимого файла и версии парсера."""
+    sha256 = models.CharField(max_length=64)
+    parser_version = models.CharField(max_length=32)
+    result = models.JSONField(default=dict, blank=True)
+    # Сжатый zlib текст отчёта, см. launch_pdf_parser.compress_report_text().
+    report_text = models.BinaryField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(default=0)
+
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sha256", "parser_version"],
+                name="unique_launch_parse_cache_entry",
+            )
+        ]
+        verbose_name = "Кэш разбора отчёта Launch"
+        verbose_name_plural = "Кэш разбора отчётов Launch"
+
+    def __str__(self):
+        return f"{self.sha256[:12]} (v{self.parser_version})"
+
+
 class DiagnosticSession(models.Model):
     user_profile = models.ForeignKey(
         UserProfile, on_delete=models.SET_NULL, null=True, blank=True
@@ -190,6 +448,9 @@ class DiagnosticSession(models.Model):
     vehicle_model = models.CharField(max_length=128, blank=True)
 
     raw_file = models.FileField(upload_to="diagnostic_reports/")
+    # --- Извлечённый из PDF текст (zlib) и версия парсера, которая его разобрала
+    report_text = models.BinaryField(null=True, blank=True)
+    report_parser_version = models.CharField(max_length=32, blank=True, default="", db_index=True)
     recommendation = models.TextField(blank=True)
     notes = models.TextField(blank=True)
 
@@ -258,14 +519,25 @@ class DiagnosticCode(models.Model):
         help_text="Связь с глобальным справочником DTC.",
     )
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=dtc_code_normalized_q(),
+                name="diagnostic_code_normalized",
+            ),
+        ]
+
+    def clean(self):
+        self.code = normalize_dtc_code(self.code)
+
     def save(self, *args, **kwargs):
-        self.code = (self.code or "").upper().strip()
+        self.code = normalize_dtc_code(self.code)
 
         if self.reference_id is None and self.code:
-            self.reference = (
-                DTCReference.objects.filter(code=self.code, manufacturer="")
-                .first()
-            )
+            from diagnostics.dtc_index import dtc_index
+
+            entry = dtc_index.get(self.code)
+            self.reference_id = entry.id if entry else None
 
         super().save(*args, **kwargs)
 
@@ -273,6 +545,51 @@ class DiagnosticCode(models.Model):
         return f"{self.code} ({self.session.vin})"
 
 
+class DiagnosticJob(models.Model):
+    """Фоновая задача по сессии. Выполняется командой run_diagnostic_worker."""
+
+    class Kind(models.TextChoices):
+        LAUNCH_PARSE = "launch_parse", "Разбор отчёта Launch"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+
+    session = models.ForeignKey(
+        DiagnosticSession, on_delete=models.CASCADE, related_name="jobs"
+    )
+    kind = models.CharField(max_length=32, choices=Kind.choices, default=Kind.LAUNCH_PARSE)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=128, blank=True)
+    error = models.TextField(blank=True)
+    result = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Повтор после ошибки не раньше этого времени.
+    not_before = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+        verbose_name = "Фоновая задача диагностики"
+        verbose_name_plural = "Фоновые задачи диагностики"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.get_status_display()})"
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (self.Status.PENDING, self.Status.RUNNING)
+
+
 class SensorReading(models.Model):
     session = models.ForeignKey(
         DiagnosticSession, on_delete=models.CASCADE, related_name="readings"
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import importlib.util
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULT_BACKEND = "pypdf"
+
+# Порядок для LAUNCH_PDF_BACKEND = "auto": первый установленный backend.
+# Проверять на своих отчётах командой benchmark_pdf_backends.
+AUTO_PREFERENCE = ("pymupdf", "pdftotext", "pdfminer", "pypdf")
+
+
+def pypdf_pages(path: Path) -> Iterator[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:
+        raise RuntimeError("pypdf is not installed. Run: pip install pypdf") from exc
+
+    reader = PdfReader(str(path))
+
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def pymupdf_pages(path: Path) -> Iterator[str]:
+    try:
+        import pymupdf
+    except ImportError as exc:
+        raise RuntimeError("PyMuPDF is not installed. Run: pip install pymupdf") from exc
+
+    with pymupdf.open(str(path)) as document:
+        for page in document:
+            yield page.get_text() or ""
+
+
+def pdftotext_pages(path: Path) -> Iterator[str]:
+    try:
+        import pdftotext
+    except ImportError as exc:
+        raise RuntimeError("pdftotext is not installed. Run: pip install pdftotext") from exc
+
+    with open(path, "rb") as f:
+        document = pdftotext.PDF(f, physical=False)
+
+        for index in range(len(document)):
+            yield document[index] or ""
+
+
+def pdfminer_pages(path: Path) -> Iterator[str]:
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+    except ImportError as exc:
+        raise RuntimeError("pdfminer.six is not installed. Run: pip install pdfminer.six") from exc
+
+    for layout in extract_pages(str(path)):
+        yield "".join(
+            element.get_text()
+            for element in layout
+            if isinstance(element, LTTextContainer)
+        )
+
+
+# name -> (модуль, наличие которого проверяется, функция постраничного извлечения)
+PDF_BACKENDS: dict[str, tuple[str, Callable[[Path], Iterator[str]]]] = {
+    "pypdf": ("pypdf", pypdf_pages),
+    "pymupdf": ("pymupdf", pymupdf_pages),
+    "pdftotext": ("pdftotext", pdftotext_pages),
+    "pdfminer": ("pdfminer", pdfminer_pages),
+}
+
+
+def backend_available(name: str) -> bool:
+    if name not in PDF_BACKENDS:
+        return False
+
+    module, _ = PDF_BACKENDS[name]
+    return importlib.util.find_spec(module) is not None
+
+
+def available_backends() -> list[str]:
+    return [name for name in PDF_BACKENDS if backend_available(name)]
+
+
+def configured_backend() -> str:
+    """
+    Имя backend из настройки LAUNCH_PDF_BACKEND (по умолчанию pypdf).
+    "auto" выбирает первый установленный по AUTO_PREFERENCE.
+    """
+    name = getattr(settings, "LAUNCH_PDF_BACKEND", DEFAULT_BACKEND) or DEFAULT_BACKEND
+
+    if name == "auto":
+        for candidate in AUTO_PREFERENCE:
+            if backend_available(candidate):
+                return candidate
+
+        return DEFAULT_BACKEND
+
+    return name
+
+
+def get_pdf_backend(name: str | None = None) -> Callable[[Path], Iterator[str]]:
+    name = name or configured_backend()
+
+    if name not in PDF_BACKENDS:
+        raise ValueError(
+            f"Unknown PDF backend: {name}. Available: {', '.join(PDF_BACKENDS)}"
+        )
+
+    _, pages = PDF_BACKENDS[name]
+    return pages
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from itertools import chain
+from pathlib import Path
+from typing import Any
+
+from diagnostics.launch_pdf_parser import (
+    ABNORMAL_SYSTEMS_MARKER,
+    OK_SYSTEMS_MARKER,
+    VEHICLE_FIELDS,
+    apply_launch_parse_to_session,
+    iter_pdf_pages,
+)
+
+
+# Сколько байт начала файла читается для проверки сигнатуры.
+SNIFF_BYTES = 1024
+
+PDF_MAGIC = b"%PDF-"
+
+
+class UnsupportedReportFormat(Exception):
+    """Файл не подходит ни к одному зарегистрированному формату отчёта."""
+
+
+class ReportFormat:
+    """
+    Формат отчёта сканера. Определение формата дешёвое и двухступенчатое:
+    сначала сигнатура по первым SNIFF_BYTES байтам файла, затем — только
+    для PDF-форматов — текст первой страницы. Полный документ читает уже
+    parse() выбранного формата.
+
+    Новый формат (другой производитель сканера) — подкласс с декоратором
+    @register_report_format, парсер Launch при этом не меняется.
+    """
+
+    name = ""
+    label = ""
+    # Формат определяется по тексту первой страницы PDF.
+    pdf = False
+
+    def matches_head(self, head: bytes) -> bool:
+        if self.pdf:
+            return PDF_MAGIC in head
+        return False
+
+    def matches_first_page(self, text: str) -> bool:
+        return True
+
+    def cached_parse(self, sha256: str) -> dict[str, Any] | None:
+        """Готовый результат разбора файла с таким содержимым, если формат его кэширует."""
+        return None
+
+    def parse(self, path: Path, pages: Iterator[str] | None, sha256: str | None = None) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def apply(self, session, parsed: dict[str, Any]) -> int:
+        raise NotImplementedError
+
+
+REPORT_FORMATS: dict[str, ReportFormat] = {}
+
+
+def register_report_format(cls: type[ReportFormat]) -> type[ReportFormat]:
+    REPORT_FORMATS[cls.name] = cls()
+    return cls
+
+
+@register_report_format
+class LaunchAllSystemDTCFormat(ReportFormat):
+    name = "launch_allsystemdtc"
+    label = "Launch AllSystemDTC (PDF)"
+    pdf = True
+
+    # Для отчёта без неисправностей маркеров может не быть на первой
+    # странице, поэтому достаточно нескольких полей шапки.
+    MIN_HEADER_LABELS = 2
+
+    def matches_first_page(self, text: str) -> bool:
+        if ABNORMAL_SYSTEMS_MARKER in text or OK_SYSTEMS_MARKER in text:
+            return True
+
+        lowered = text.lower()
+        found = sum(1 for label in VEHICLE_FIELDS.values() if label.lower() in lowered)
+        return found >= self.MIN_HEADER_LABELS
+
+    def cached_parse(self, sha256: str) -> dict[str, Any] | None:
+        from diagnostics.launch_cache import get_cached_parse
+
+        return get_cached_parse(sha256)
+
+    def parse(self, path: Path, pages: Iterator[str] | None, sha256: str | None = None) -> dict[str, Any]:
+        from diagnostics.launch_cache import parse_launch_pdf_cached
+
+        return parse_launch_pdf_cached(path, pages=pages, sha256=sha256)
+
+    def apply(self, session, parsed: dict[str, Any]) -> int:
+        return apply_launch_parse_to_session(session, parsed)
+
+
+def read_head(path: str | Path, size: int = SNIFF_BYTES) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(size)
+
+
+def is_report_file(path: str | Path) -> bool:
+    """
+    Дешёвая проверка при загрузке: сигнатура подходит хотя бы одному
+    формату. Первую страницу PDF проверяет уже воркер.
+    """
+    head = read_head(path)
+    return any(fmt.matches_head(head) for fmt in REPORT_FORMATS.values())
+
+
+def parse_report_file(path: str | Path) -> tuple[ReportFormat, dict[str, Any]]:
+    """
+    Определяет формат файла и разбирает его. Для PDF первая страница
+    извлекается один раз: по ней выбирается формат, затем она же вместе
+    с остальными страницами уходит в parse(). Чужой PDF отклоняется
+    после чтения одной страницы.
+
+    Кэш разбора проверяется по хэшу содержимого до открытия PDF: уже
+    разобранный файл не извлекает ни одной страницы.
+    """
+    from diagnostics.launch_cache import file_sha256
+
+    path = Path(path)
+    head = read_head(path)
+    candidates = [fmt for fmt in REPORT_FORMATS.values() if fmt.matches_head(head)]
+
+    if not candidates:
+        raise UnsupportedReportFormat(f"Unsupported report file: {path.name}")
+
+    sha256 = file_sha256(path)
+
+    for fmt in candidates:
+        parsed = fmt.cached_parse(sha256)
+        if parsed is not None:
+            return fmt, parsed
+
+    pages = None
+
+    try:
+        for fmt in candidates:
+            if not fmt.pdf:
+                return fmt, fmt.parse(path, None, sha256)
+
+            if pages is None:
+                pages = iter_pdf_pages(path)
+                first_page = next(pages, "")
+
+            if fmt.matches_first_page(first_page):
+                return fmt, fmt.parse(path, chain([first_page], pages), sha256)
+    finally:
+        if pages is not None:
+            pages.close()
+
+    raise UnsupportedReportFormat(f"Unknown PDF report (first page did not match any format): {path.name}")
+
+
+def parse_and_apply_report(session) -> tuple[str, int]:
+    """Разбор файла сессии зарегистрированным форматом. Возвращает (формат, число кодов)."""
+    if not session.raw_file:
+        raise UnsupportedReportFormat("Session has no report file")
+
+    fmt, parsed = parse_report_file(session.raw_file.path)
+    return fmt.name, fmt.apply(session, parsed)
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from diagnostics import dtc_import, jobs, launch_cache, pdf_backends, report_formats
+from diagnostics.launch_pdf_parser import (
+    PARSER_VERSION,
+    apply_launch_parse_to_session,
+    compress_report_text,
+    decompress_report_text,
+    parse_abnormal_systems,
+    parse_launch_pages,
+    parse_launch_pdf_stream,
+    parse_launch_text,
+    parse_ok_systems,
+    parse_vehicle_info,
+)
+from diagnostics.dtc_import import relink_diagnostic_codes
+from diagnostics.dtc_code_search import parse_code_query, search_codes
+from diagnostics.dtc_fulltext import DTCFullTextIndex, builtin_stem, search_references, tokenize
+from diagnostics.dtc_index import DTCReferenceIndex, current_generation, dtc_index
+from diagnostics.launch_synthetic import generate_launch_report_pages, write_launch_pdf
+from diagnostics.models import (
+    DiagnosticCode,
+    DiagnosticJob,
+    DiagnosticSession,
+    DTCImportBatch,
+    DTCReference,
+    VehicleBrand,
+    dtc_reference_fingerprint,
+)
+
+
+LAUNCH_FIXTURES_DIR = Path(__file__).resolve().parent / "testdata" / "launch_reports"
+
+LAUNCH_REPORT_PAGES = [
+    "Launch AllSystemDTC\n"
+    "Время испытания: 2026-01-15 10:22:31\n"
+    "Год выпуска: 2018\n"
+    "Серии а/м: BMW\n"
+    "Модель: X5 (F15)\n"
+    "VIN: WBAKS410X00A12345\n"
+    "Пробег: 84500 km\n"
+    "Версия ПО а/м: V45.20\n"
+    "Версия диагностической прикладной программы: V4.11\n"
+    "Диагностический путь\n",
+
+    "BMW > Автоматический поиск > Быстрая проверка\n"
+    "Серийный номер: 979790012345\n"
+    "The following systems is abnormal:\n"
+    "DME (Электроника цифрового двигателя) 2 Существуют проблемы\n"
+    "1.930AB2 Контрольная лампа неисправности двигателя:\n"
+    "активирована\n"
+    "Permanent\n"
+    "2.P0171 Слишком бедная смесь, банк 1\n"
+    "Intermittent\n",
+
+    "KOMBI (Комбинация приборов) 1 Существуют проблемы\n"
+    "1.S 0248 Нет связи с блоком\n"
+    "   управления DSC\n"
+    "Stored\n"
+    "Следующие системы в порядке:\n"
+    "1.EGS (Электронное управление коробкой передач)\n",
+
+    "2.DSC (Динамический контроль устойчивости)\n"
+    "3.ACSM (Система безопасности)\n",
+
+    "Страница 5/6\n",
+
+    "4.FEM (Фронтальный модуль)\n"
+    "Launch Tech Co., Ltd.\n",
+
+    "Приложение: журнал сеанса связи\n",
+]
+
+
+class LaunchReportStreamTests(SimpleTestCase):
+    def test_stream_matches_full_text_parse(self):
+        text = "\n".join(LAUNCH_REPORT_PAGES[:4])
+        parsed = parse_launch_pages(LAUNCH_REPORT_PAGES[:4])
+
+        self.assertEqual(parsed["vehicle"], parse_vehicle_info(text))
+        self.assertEqual(parsed["abnormal_systems"], parse_abnormal_systems(text))
+        self.assertEqual(parsed["ok_systems"], parse_ok_systems(text))
+        self.assertEqual(
+            [fault["code"] for fault in parsed["faults"]],
+            ["930AB2", "P0171", "S0248"],
+        )
+        self.assertEqual(
+            parsed["vehicle"]["diagnostic_path"],
+            "BMW > Автоматический поиск > Быстрая проверка",
+        )
+
+    def test_stream_stops_at_end_of_report(self):
+        consumed = []
+
+        def pages():
+            for page_text in LAUNCH_REPORT_PAGES:
+                consumed.append(page_text)
+                yield page_text
+
+        parsed = parse_launch_pages(pages())
+
+        # Страница с одним номером внутри списка не останавливает разбор.
+        self.assertEqual(parsed["pages"], 6)
+        self.assertEqual(len(consumed), 6)
+        self.assertEqual(
+            [system["module_code"] for system in parsed["ok_systems"]],
+            ["EGS", "DSC", "ACSM", "FEM"],
+        )
+
+
+class LaunchParserCorpusTests(SimpleTestCase):
+    """Эталонные *.json получены прежним парсером (по одному re.search на поле)."""
+
+    def test_engine_matches_reference_output(self):
+        for text_path in sorted(LAUNCH_FIXTURES_DIR.glob("*.txt")):
+            with self.subTest(report=text_path.name):
+                text = text_path.read_text(encoding="utf-8")
+                expected = json.loads(text_path.with_suffix(".json").read_text(encoding="utf-8"))
+
+                self.assertEqual(parse_launch_text(text), expected)
+                self.assertEqual(parse_vehicle_info(text), expected["vehicle"])
+                self.assertEqual(parse_abnormal_systems(text), expected["abnormal_systems"])
+                self.assertEqual(parse_ok_systems(text), expected["ok_systems"])
+
+
+class LaunchSyntheticReportTests(SimpleTestCase):
+    def test_generated_report_parses_back(self):
+        pages = generate_launch_report_pages(modules=15, faults_per_module=3, ok_systems=12, pages=4, seed=7)
+        parsed = parse_launch_pages(pages)
+
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(len(parsed["faults"]), 45)
+        self.assertEqual(len(parsed["ok_systems"]), 12)
+        self.assertEqual(parsed["vehicle"]["brand"], "BMW")
+
+    @skipUnless(pdf_backends.backend_available("pypdf"), "pypdf is not installed")
+    def test_generated_pdf_round_trips_cyrillic_text(self):
+        pages = generate_launch_report_pages(modules=3, faults_per_module=2, seed=1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_launch_pdf(Path(tmp) / "report.pdf", pages)
+            parsed = parse_launch_pdf_stream(path, backend="pypdf")
+
+        self.assertEqual(parsed["faults"], parse_launch_pages(pages)["faults"])
+        self.assertEqual(parsed["vehicle"]["diagnostic_path"], "BMW > Автоматический поиск > Быстрая проверка")
+
+    @skipUnless(pdf_backends.backend_available("pypdf"), "pypdf is not installed")
+    def test_batch_mode_writes_jsonl_to_command_stdout(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+
+        for seed in (1, 2):
+            write_launch_pdf(tmp / f"report{seed}.pdf", generate_launch_report_pages(modules=2, faults_per_module=2, seed=seed))
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command("parse_launch_pdf", str(tmp), workers=1, stdout=stdout, stderr=stderr)
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+        self.assertEqual([Path(record["path"]).name for record in records], ["report1.pdf", "report2.pdf"])
+        self.assertEqual([len(record["faults"]) for record in records], [4, 4])
+        self.assertIn("Parsed reports=2 errors=0", stderr.getvalue())
+
+
+class PdfBackendTests(SimpleTestCase):
+    def test_auto_picks_first_installed_backend(self):
+        with self.settings(LAUNCH_PDF_BACKEND="auto"):
+            with mock.patch.object(pdf_backends, "backend_available", lambda name: name == "pdfminer"):
+                self.assertEqual(pdf_backends.configured_backend(), "pdfminer")
+
+            with mock.patch.object(pdf_backends, "backend_available", lambda name: False):
+                self.assertEqual(pdf_backends.configured_backend(), pdf_backends.DEFAULT_BACKEND)
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            pdf_backends.get_pdf_backend("ocr")
+
+
+class LaunchParseCacheTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        tmp.write(b"%PDF-1.4 launch report")
+        tmp.close()
+        self.path = Path(tmp.name)
+        self.addCleanup(self.path.unlink)
+
+    def test_second_parse_is_served_from_cache(self):
+        parsed = parse_launch_pages(LAUNCH_REPORT_PAGES, keep_text=True)
+
+        with mock.patch.object(launch_cache, "parse_launch_pdf_stream", return_value=parsed) as parse:
+            first = launch_cache.parse_launch_pdf_cached(self.path)
+            second = launch_cache.parse_launch_pdf_cached(self.path)
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(first, second)
+
+    def test_parser_upgrade_invalidates_entries(self):
+        sha256 = launch_cache.file_sha256(self.path)
+        launch_cache.store_parse(sha256, {"faults": []})
+
+        with mock.patch.object(launch_cache, "PARSER_VERSION", "next"):
+            self.assertIsNone(launch_cache.get_cached_parse(sha256))
+            launch_cache.store_parse(sha256, {"faults": []})
+
+        self.assertEqual(
+            list(launch_cache.LaunchParseCache.objects.values_list("parser_version", flat=True)),
+            [f"next:{pdf_backends.DEFAULT_BACKEND}"],
+        )
+
+    def test_eviction_keeps_most_recent_entries(self):
+        for index in range(5):
+            launch_cache.store_parse(f"{index:064d}", {"faults": []})
+
+        launch_cache.evict_parse_cache(max_entries=2)
+
+        self.assertEqual(
+            sorted(launch_cache.LaunchParseCache.objects.values_list("sha256", flat=True)),
+            [f"{3:064d}", f"{4:064d}"],
+        )
+
+
+class ReportFormatTests(TestCase):
+    def make_file(self, content, suffix=".pdf"):
+        tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        tmp.write(content)
+        tmp.close()
+        self.addCleanup(Path(tmp.name).unlink)
+        return tmp.name
+
+    def patch_pages(self, pages):
+        consumed = []
+
+        def iter_pages(path):
+            for page_text in pages:
+                consumed.append(page_text)
+                yield page_text
+
+        patcher = mock.patch.object(report_formats, "iter_pdf_pages", iter_pages)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return consumed
+
+    def test_launch_report_is_detected_by_first_page(self):
+        consumed = self.patch_pages(LAUNCH_REPORT_PAGES)
+
+        fmt, parsed = report_formats.parse_report_file(self.make_file(b"%PDF-1.4 launch"))
+
+        self.assertEqual(fmt.name, "launch_allsystemdtc")
+        self.assertEqual(len(parsed["faults"]), 3)
+        # Текст отчёта сохраняется целиком, поэтому читаются все страницы.
+        self.assertEqual(len(consumed), len(LAUNCH_REPORT_PAGES))
+
+    def test_cached_report_is_not_opened(self):
+        path = self.make_file(b"%PDF-1.4 launch")
+        launch_cache.store_parse(
+            launch_cache.file_sha256(path),
+            parse_launch_pages(LAUNCH_REPORT_PAGES, keep_text=True),
+        )
+        consumed = self.patch_pages(LAUNCH_REPORT_PAGES)
+
+        fmt, parsed = report_formats.parse_report_file(path)
+
+        self.assertEqual(fmt.name, "launch_allsystemdtc")
+        self.assertEqual(len(parsed["faults"]), 3)
+        self.assertEqual(consumed, [])
+
+    def test_only_known_signatures_are_report_files(self):
+        self.assertTrue(report_formats.is_report_file(self.make_file(b"%PDF-1.4 launch")))
+        self.assertFalse(report_formats.is_report_file(self.make_file(b"\xff\xd8\xff\xe0 JFIF", suffix=".jpg")))
+
+    def test_foreign_pdf_is_rejected_after_first_page(self):
+        consumed = self.patch_pages(["Autel MaxiSys Health Report", "page 2", "page 3"])
+
+        with self.assertRaises(report_formats.UnsupportedReportFormat):
+            report_formats.parse_report_file(self.make_file(b"%PDF-1.7 other vendor"))
+
+        self.assertEqual(consumed, ["Autel MaxiSys Health Report"])
+
+    def test_unknown_file_is_rejected_by_signature(self):
+        consumed = self.patch_pages(LAUNCH_REPORT_PAGES)
+
+        with self.assertRaises(report_formats.UnsupportedReportFormat):
+            report_formats.parse_report_file(self.make_file(b"P0171,P0420", suffix=".txt"))
+
+        self.assertEqual(consumed, [])
+
+
+class DiagnosticJobTests(TestCase):
+    def setUp(self):
+        self.session = DiagnosticSession(vin="WBA")
+        self.session.raw_file.save("report.pdf", ContentFile(b"%PDF-1.4"), save=True)
+        self.addCleanup(self.session.raw_file.delete, save=False)
+
+    def test_worker_claims_and_completes_job(self):
+        job = jobs.enqueue_launch_parse(self.session)
+        self.assertEqual(jobs.session_parse_status(self.session)["status"], "parsing")
+
+        claimed = jobs.claim_next_job("test-worker")
+        self.assertEqual(claimed.id, job.id)
+        self.assertIsNone(jobs.claim_next_job("test-worker"))
+
+        with mock.patch.dict(jobs.JOB_HANDLERS, {DiagnosticJob.Kind.LAUNCH_PARSE: lambda job: {"codes": 3}}):
+            jobs.run_job(claimed)
+
+        status = jobs.session_parse_status(self.session)
+        self.assertEqual(status["status"], "done")
+        self.assertTrue(status["ready"])
+
+    def test_failed_job_is_retried_then_noted_on_session(self):
+        jobs.enqueue_launch_parse(self.session)
+
+        def fail(job):
+            raise ValueError("broken pdf")
+
+        with mock.patch.dict(jobs.JOB_HANDLERS, {DiagnosticJob.Kind.LAUNCH_PARSE: fail}):
+            with self.assertLogs("diagnostics.jobs", level="ERROR"):
+                job = jobs.run_job(jobs.claim_next_job("test-worker"))
+
+                for attempt in range(2, jobs.MAX_ATTEMPTS + 1):
+                    # Повтор отложен: воркер не крутит упавшую задачу в цикле.
+                    self.assertEqual(job.status, DiagnosticJob.Status.PENDING)
+                    self.assertIsNone(jobs.claim_next_job("test-worker"))
+                    self.assertEqual(job.not_before - job.finished_at, jobs.retry_delay(attempt - 1))
+
+                    with mock.patch.object(jobs.timezone, "now", return_value=job.not_before):
+                        job = jobs.run_job(jobs.claim_next_job("test-worker"))
+
+        self.assertEqual(job.status, DiagnosticJob.Status.FAILED)
+        self.session.refresh_from_db()
+        self.assertIn("broken pdf", self.session.notes)
+
+    def test_stale_job_is_delayed_then_failed(self):
+        job = jobs.enqueue_launch_parse(self.session)
+        stale_after = timedelta(minutes=10)
+
+        def claim_and_abandon(job):
+            with mock.patch.object(jobs.timezone, "now", return_value=job.not_before or timezone.now()):
+                job = jobs.claim_next_job("dead-worker")
+
+            with mock.patch.object(jobs.timezone, "now", return_value=job.started_at + stale_after * 2):
+                self.assertEqual(jobs.requeue_stale_jobs(stale_after), 1)
+
+            job.refresh_from_db()
+            return job
+
+        for attempt in range(1, jobs.MAX_ATTEMPTS):
+            job = claim_and_abandon(job)
+
+            # Зависшая попытка засчитана и отложена, как обычная ошибка.
+            self.assertEqual((job.status, job.attempts), (DiagnosticJob.Status.PENDING, attempt))
+            self.assertEqual(job.not_before - job.finished_at, jobs.retry_delay(attempt))
+
+        with self.assertLogs("diagnostics.jobs", level="WARNING"):
+            job = claim_and_abandon(job)
+
+        self.assertEqual(job.status, DiagnosticJob.Status.FAILED)
+        self.session.refresh_from_db()
+        self.assertIn("dead-worker", self.session.notes)
+
+    def test_unsupported_report_fails_without_retries(self):
+        jobs.enqueue_launch_parse(self.session)
+
+        pages = (page_text for page_text in ["Not a Launch report"])
+
+        with mock.patch.object(report_formats, "iter_pdf_pages", return_value=pages):
+            with self.assertLogs("diagnostics.jobs", level="WARNING"):
+                job = jobs.run_job(jobs.claim_next_job("test-worker"))
+
+        self.assertEqual(job.status, DiagnosticJob.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("UnsupportedReportFormat", job.error)
+
+
+class ApplyLaunchParseTests(TestCase):
+    def make_parsed(self, count):
+        return {
+            "vehicle": {"vin": "WBA", "brand": "BMW", "model": "X5"},
+            "faults": [
+                {
+                    "code": f"P{index:04d}",
+                    "description": f"Fault {index}",
+                    "status": "Stored",
+                    "module_code": "DME",
+                    "module_name": "Engine",
+                }
+                for index in range(count)
+            ],
+        }
+
+    def test_query_count_does_not_depend_on_fault_count(self):
+        DTCReference.objects.create(code="P0001", title_ru="Curated title")
+
+        dtc_index.get("P0001")
+
+        # Индекс не перечитывается: созданные записи процесс вносит в него сам.
+        # Сверка версии (1 запрос) — только потому, что транзакция теста уже
+        # меняла справочник; в обычной загрузке её нет.
+        small = DiagnosticSession.objects.create()
+        with self.assertNumQueries(9):
+            self.assertEqual(apply_launch_parse_to_session(small, self.make_parsed(3)), 3)
+
+        large = DiagnosticSession.objects.create()
+        with self.assertNumQueries(9):
+            self.assertEqual(apply_launch_parse_to_session(large, self.make_parsed(40)), 40)
+
+        self.assertEqual(DiagnosticCode.objects.filter(session=large, reference__isnull=True).count(), 0)
+        self.assertEqual(DTCReference.objects.get(code="P0001").title_ru, "Curated title")
+        self.assertEqual(large.vehicle_model, "BMW X5")
+
+    def test_created_references_are_normalized(self):
+        apply_launch_parse_to_session(DiagnosticSession.objects.create(), self.make_parsed(2))
+
+        for ref in DTCReference.objects.filter(code__in=["P0000", "P0001"]):
+            self.assertEqual(ref.system, "P")
+            self.assertTrue(ref.fingerprint)
+            self.assertEqual(ref.fingerprint, dtc_reference_fingerprint(ref))
+
+    def test_reapply_replaces_session_codes(self):
+        session = DiagnosticSession.objects.create()
+        apply_launch_parse_to_session(session, self.make_parsed(5))
+        apply_launch_parse_to_session(session, self.make_parsed(2))
+
+        self.assertEqual(session.codes.count(), 2)
+
+
+class ReparseSessionsTests(TestCase):
+    def test_outdated_sessions_are_reparsed_from_stored_text(self):
+        text = "\n".join(LAUNCH_REPORT_PAGES)
+        outdated = DiagnosticSession.objects.create(
+            report_text=compress_report_text(text),
+            report_parser_version="0",
+        )
+        current = DiagnosticSession.objects.create(
+            report_text=compress_report_text(text),
+            report_parser_version=PARSER_VERSION,
+        )
+
+        call_command("reparse_sessions", workers=1, chunk_size=1, stdout=StringIO())
+
+        outdated.refresh_from_db()
+        self.assertEqual(outdated.report_parser_version, PARSER_VERSION)
+        self.assertEqual(outdated.vin, "WBAKS410X00A12345")
+        self.assertEqual(
+            list(outdated.codes.order_by("id").values_list("code", flat=True)),
+            ["930AB2", "P0171", "S0248"],
+        )
+        self.assertEqual(current.codes.count(), 0)
+
+    def test_stream_keeps_compressed_text_of_whole_document(self):
+        parsed = parse_launch_pages(LAUNCH_REPORT_PAGES, keep_text=True)
+        session = DiagnosticSession.objects.create()
+        apply_launch_parse_to_session(session, parsed)
+
+        session.refresh_from_db()
+        self.assertEqual(session.report_parser_version, PARSER_VERSION)
+        self.assertEqual(
+            decompress_report_text(session.report_text),
+            "\n".join(LAUNCH_REPORT_PAGES),
+        )
+        # Страница после подписи конца отчёта сжата, но не разобрана.
+        self.assertEqual(parsed["pages"], len(LAUNCH_REPORT_PAGES))
+        self.assertEqual(len(parsed["faults"]), 3)
+
+
+class ImportDTCCsvTests(TestCase):
+    CSV_HEADER = "code,manufacturer,title_ru,severity\n"
+
+    def write_csv(self, body):
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        tmp.write(self.CSV_HEADER + body)
+        tmp.close()
+        self.addCleanup(Path(tmp.name).unlink)
+        return tmp.name
+
+    def import_csv(self, body, **options):
+        path = options.pop("path", None) or self.write_csv(body)
+        call_command("import_dtc_csv", csv=path, stdout=StringIO(), **options)
+        return DTCImportBatch.objects.latest("id")
+
+    def test_bulk_upsert_counts_and_normalization(self):
+        existing = DTCReference.objects.create(code="P0171", title_ru="Old title")
+
+        batch = self.import_csv(
+            "p0171 ,,Бедная смесь,high\n"
+            "P0420,,Катализатор,\n"
+            "P1234, BMW ,Код BMW,critical\n"
+            "P0420,,Катализатор (повтор),low\n"
+            "X,,Плохой код,\n"
+            "P1234,Toyota,Код Toyota,medium\n",
+            chunk_size=2,
+            batch_size=2,
+        )
+
+        self.assertEqual(
+            (batch.rows_total, batch.rows_created, batch.rows_updated, batch.rows_skipped),
+            (6, 3, 2, 1),
+        )
+
+        existing_after = DTCReference.objects.get(pk=existing.pk)
+        self.assertEqual(existing_after.title_ru, "Бедная смесь")
+        self.assertEqual(existing_after.severity, "high")
+        self.assertEqual(existing_after.import_batch, batch)
+        self.assertGreater(existing_after.updated_at, existing.updated_at)
+
+        bmw = DTCReference.objects.get(code="P1234", manufacturer="BMW")
+        self.assertEqual(bmw.scope, DTCReference.Scope.MANUFACTURER)
+        self.assertEqual(bmw.brand, VehicleBrand.objects.get(name="BMW"))
+        self.assertEqual(DTCReference.objects.get(code="P0420").severity, "low")
+        self.assertEqual(VehicleBrand.objects.count(), 2)
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        from diagnostics.management.commands import import_dtc_csv
+
+        path = self.write_csv("".join(f"P{index:04d},,Код {index},\n" for index in range(5)))
+        real_flush = import_dtc_csv.DTCUpsertEngine.flush
+
+        def crash_on_second_chunk(engine):
+            if engine.created and engine._pending:
+                raise RuntimeError("connection lost")
+            real_flush(engine)
+
+        with mock.patch.object(import_dtc_csv.DTCUpsertEngine, "flush", crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.import_csv("", path=path, chunk_size=2, stderr=StringIO())
+
+        batch = DTCImportBatch.objects.get()
+        self.assertEqual(batch.status, DTCImportBatch.Status.FAILED)
+        self.assertEqual(batch.last_row_offset, 2)
+        self.assertEqual(DTCReference.objects.count(), 2)
+
+        batch = self.import_csv("", path=path, chunk_size=2, resume=batch.pk)
+
+        self.assertEqual(batch.status, DTCImportBatch.Status.DONE)
+        self.assertEqual((batch.rows_total, batch.rows_created, batch.rows_updated), (5, 5, 0))
+        self.assertEqual(DTCReference.objects.count(), 5)
+        # Метрики упавшего запуска сложены с метриками продолжения.
+        self.assertEqual((batch.metrics["import"]["attempts"], batch.metrics["import"]["rows"]), (2, 5))
+
+    def test_reimport_of_same_file_writes_nothing(self):
+        path = self.write_csv("P0171,,Бедная смесь,high\nP1234,BMW,Код BMW,\n")
+        self.import_csv("", path=path)
+        before = dict(DTCReference.objects.values_list("code", "updated_at"))
+
+        # Пакет, версия индекса, ключи, марки, чекпоинт и статус — ни одной записи в справочник.
+        with self.assertNumQueries(10):
+            call_command("import_dtc_csv", csv=path, stdout=StringIO())
+
+        batch = DTCImportBatch.objects.latest("id")
+
+        self.assertEqual((batch.rows_created, batch.rows_updated, batch.rows_unchanged), (0, 0, 2))
+        self.assertEqual(dict(DTCReference.objects.values_list("code", "updated_at")), before)
+
+    def test_batch_records_phase_metrics(self):
+        from django.contrib.admin.sites import site
+
+        batch = self.import_csv("P0171,,Бедная смесь,high\nP1234,BMW,Код BMW,\n", chunk_size=1)
+        metrics = batch.metrics["import"]
+        phases = metrics["phases"]
+
+        self.assertEqual(metrics["rows"], 2)
+        self.assertTrue({"read", "validate", "normalize", "brands", "write", "checkpoint"} <= phases.keys())
+        self.assertEqual(phases["write"]["rows"], 2)
+        self.assertEqual(phases["checkpoint"]["queries"], 2)
+        self.assertEqual(metrics["queries"], sum(phase["queries"] for phase in phases.values()))
+
+        html = site._registry[DTCImportBatch].metrics_table(batch)
+        self.assertIn("<td>checkpoint</td>", html)
+
+    def test_compressed_and_json_lines_sources(self):
+        import gzip
+        import zipfile
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+
+        # Расширения намеренно не совпадают: формат определяется по содержимому.
+        gz_path = tmp / "dump.bin"
+        with gzip.open(gz_path, "wt", encoding="utf-8") as f:
+            f.write(self.CSV_HEADER + "P0171,,Бедная смесь,high\n")
+
+        zip_path = tmp / "dump.dat"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(
+                "dtc.jsonl",
+                '{"code": "P0420", "title_ru": "Катализатор", "severity": null}\n'
+                "\n"
+                "{broken\n"
+                '{"code": "P1234", "manufacturer": "BMW", "severity": "critical"}\n',
+            )
+
+        self.import_csv("", path=str(gz_path))
+        batch = self.import_csv("", path=str(zip_path))
+
+        self.assertEqual((batch.rows_total, batch.rows_created, batch.rows_bad), (3, 2, 1))
+        self.assertEqual(DTCReference.objects.get(code="P0171").severity, "high")
+        self.assertEqual(DTCReference.objects.get(code="P0420").severity, "medium")
+        self.assertEqual(DTCReference.objects.get(code="P1234").manufacturer, "BMW")
+
+    def test_parallel_dry_run_matches_sequential(self):
+        from diagnostics import dtc_sources
+
+        rows = []
+        for index in range(200):
+            code = "X1" if index % 37 == 0 else f"P{index:04d}"
+            severity = "urgent" if index % 53 == 0 else "low"
+            rows.append(f'{code},,"Код, {index}",{severity}\n')
+        path = self.write_csv("".join(rows))
+
+        def dry_run(workers):
+            out = StringIO()
+            call_command("import_dtc_csv", csv=path, dry_run=True, workers=workers, stdout=out)
+            return out.getvalue()
+
+        with mock.patch.object(dtc_sources, "MIN_SHARD_BYTES", 256):
+            self.assertEqual(len(dtc_sources.byte_ranges(0, 4096, 3)), 3)
+            self.assertEqual(dry_run(workers=3), dry_run(workers=1))
+
+            multiline = self.write_csv('P0001,,"Первая\nвторая строка",\n' * 100)
+            out = StringIO()
+            call_command("import_dtc_csv", csv=multiline, dry_run=True, workers=3, stdout=out)
+
+        self.assertIn("validating sequentially", out.getvalue())
+        self.assertIn("rows=100 bad_rows=0", out.getvalue())
+
+    def test_dry_run_and_import_count_bad_rows_alike(self):
+        path = self.write_csv("X1,,Две проблемы,urgent\nP0171,,Бедная смесь,high\n")
+
+        out = StringIO()
+        call_command("import_dtc_csv", csv=path, dry_run=True, stdout=out)
+        batch = self.import_csv("", path=path)
+
+        self.assertIn("rows=2 bad_rows=1", out.getvalue())
+        self.assertEqual(batch.rows_bad, 1)
+
+    def test_json_lines_report_physical_line_numbers(self):
+        from diagnostics import dtc_sources
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        path = tmp / "dtc.jsonl"
+
+        lines = []
+        for index in range(60):
+            lines.append(json.dumps({"code": "X1" if index == 45 else f"P{index:04d}", "title_ru": "Код"}))
+            lines.append("")
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        def dry_run(workers):
+            out = StringIO()
+            call_command("import_dtc_csv", csv=str(path), dry_run=True, workers=workers, stdout=out)
+            return out.getvalue()
+
+        # Запись с индексом 45 стоит на строке 91: перед ней 45 записей и 45 пустых строк.
+        self.assertIn("(91, 'X1', 'bad code')", dry_run(workers=1))
+
+        with mock.patch.object(dtc_sources, "MIN_SHARD_BYTES", 256):
+            self.assertIn("(91, 'X1', 'bad code')", dry_run(workers=3))
+
+        out = StringIO()
+        call_command("import_dtc_csv", csv=str(path), show_bad_rows=True, chunk_size=7, stdout=out)
+        self.assertIn("(91, 'X1', 'bad code')", out.getvalue())
+
+    def test_invalid_utf8_fails_in_every_path(self):
+        from diagnostics import dtc_sources
+
+        path = self.write_csv("".join(f"P{index:04d},,Код {index},low\n" for index in range(100)))
+        with open(path, "ab") as f:
+            f.write(b"P0999,,\xff\xfe,low\n")
+
+        with mock.patch.object(dtc_sources, "MIN_SHARD_BYTES", 256):
+            for workers in (1, 3):
+                with self.assertRaisesMessage(CommandError, "is not valid UTF-8"):
+                    call_command("import_dtc_csv", csv=path, dry_run=True, workers=workers, stdout=StringIO())
+
+        with self.assertRaisesMessage(CommandError, "is not valid UTF-8"):
+            self.import_csv("", path=path)
+
+        batch = DTCImportBatch.objects.latest("id")
+        self.assertEqual(batch.status, DTCImportBatch.Status.FAILED)
+
+    def test_staged_import_publish_and_rollback(self):
+        old = DTCReference.objects.create(code="P0171", title_ru="Старое описание")
+        session = DiagnosticSession.objects.create(vin="TESTVIN")
+
+        batch = self.import_csv("P0171,,Бедная смесь,high\nP0420,,Катализатор,\n", stage=True)
+
+        # До публикации справочник не меняется.
+        self.assertEqual(batch.status, DTCImportBatch.Status.STAGED)
+        self.assertEqual(DTCReference.objects.count(), 1)
+
+        call_command("publish_dtc_batch", batch.pk, stdout=StringIO())
+        batch.refresh_from_db()
+
+        self.assertEqual(batch.status, DTCImportBatch.Status.PUBLISHED)
+        self.assertEqual((batch.rows_created, batch.rows_updated), (1, 1))
+        self.assertEqual(DTCReference.objects.get(pk=old.pk).title_ru, "Бедная смесь")
+
+        new = DTCReference.objects.get(code="P0420")
+        code = DiagnosticCode.objects.create(session=session, code="P0420", reference=new)
+
+        call_command("publish_dtc_batch", batch.pk, rollback=True, stdout=StringIO())
+        batch.refresh_from_db()
+
+        restored = DTCReference.objects.get()
+        self.assertEqual(batch.status, DTCImportBatch.Status.ROLLED_BACK)
+        self.assertEqual((restored.pk, restored.title_ru), (old.pk, "Старое описание"))
+        self.assertEqual(restored.fingerprint, old.fingerprint)
+        self.assertIsNone(DiagnosticCode.objects.get(pk=code.pk).reference)
+        self.assertFalse(batch.staged_references.exists())
+
+    def test_staged_publish_in_chunks_can_be_retried(self):
+        old = DTCReference.objects.create(code="P0171", title_ru="Старое описание")
+        batch = self.import_csv(
+            "P0171,,Бедная смесь,high\nP0420,,Катализатор,\nP0171,,Бедная смесь (уточнено),high\n",
+            stage=True,
+        )
+
+        # Второй чанк падает: первый уже записан вместе со своим снимком.
+        snapshot = dtc_import.snapshot_before_publish
+        calls = []
+
+        def failing_snapshot(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return snapshot(*args, **kwargs)
+
+        with mock.patch.object(dtc_import, "snapshot_before_publish", failing_snapshot):
+            with self.assertRaises(RuntimeError):
+                call_command("publish_dtc_batch", batch.pk, chunk_size=1, stdout=StringIO())
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, DTCImportBatch.Status.STAGED)
+        self.assertEqual(DTCReference.objects.get(pk=old.pk).title_ru, "Бедная смесь")
+
+        call_command("publish_dtc_batch", batch.pk, chunk_size=1, stdout=StringIO())
+        batch.refresh_from_db()
+
+        self.assertEqual(batch.status, DTCImportBatch.Status.PUBLISHED)
+        self.assertEqual(
+            dict(DTCReference.objects.values_list("code", "title_ru")),
+            {"P0171": "Бедная смесь (уточнено)", "P0420": "Катализатор"},
+        )
+
+        # Снимок первой попытки сохранён: откат возвращает исходную строку.
+        call_command("publish_dtc_batch", batch.pk, rollback=True, stdout=StringIO())
+
+        restored = DTCReference.objects.get()
+        self.assertEqual((restored.pk, restored.title_ru), (old.pk, "Старое описание"))
+
+    def test_manufacturer_case_matches_existing_row(self):
+        bmw = DTCReference.objects.create(code="P1234", manufacturer="BMW", title_ru="Код BMW")
+
+        batch = self.import_csv("P1234,Bmw,Код BMW (уточнено),\n")
+
+        self.assertEqual((batch.rows_created, batch.rows_updated), (0, 1))
+        self.assertEqual(
+            list(DTCReference.objects.values_list("id", "manufacturer", "title_ru")),
+            [(bmw.pk, "BMW", "Код BMW (уточнено)")],
+        )
+
+        batch = self.import_csv("P1234,bmw,Код BMW (уточнено),\n")
+        self.assertEqual(batch.rows_unchanged, 1)
+
+    def test_rollback_refused_after_later_writes(self):
+        DTCReference.objects.create(code="P0171", title_ru="Старое описание")
+        batch = self.import_csv("P0171,,Бедная смесь,high\nP0420,,Катализатор,\n", stage=True)
+        call_command("publish_dtc_batch", batch.pk, stdout=StringIO())
+
+        # Обычный импорт после публикации правит обе строки.
+        self.import_csv("P0171,,Бедная смесь (уточнено),high\nP0420,,Катализатор (уточнено),\n")
+
+        with self.assertRaisesMessage(CommandError, "later imports"):
+            call_command("publish_dtc_batch", batch.pk, rollback=True, stdout=StringIO())
+
+        self.assertEqual(
+            dict(DTCReference.objects.values_list("code", "title_ru")),
+            {"P0171": "Бедная смесь (уточнено)", "P0420": "Катализатор (уточнено)"},
+        )
+
+        # Ручная правка строки пакета тоже запрещает откат.
+        other = self.import_csv("P0300,,Пропуски,\n", stage=True)
+        call_command("publish_dtc_batch", other.pk, stdout=StringIO())
+        ref = DTCReference.objects.get(code="P0300")
+        ref.title_ru = "Пропуски зажигания"
+        ref.save()
+
+        with self.assertRaisesMessage(CommandError, "edited after publishing"):
+            call_command("publish_dtc_batch", other.pk, rollback=True, stdout=StringIO())
+
+        self.assertTrue(DTCReference.objects.filter(code="P0300").exists())
+
+    def test_reference_seed_uses_fingerprints(self):
+        call_command("import_dtc_references", seed_basic=True, stdout=StringIO())
+        call_command("import_dtc_references", seed_basic=True, stdout=StringIO())
+
+        batch = DTCImportBatch.objects.latest("id")
+        self.assertEqual(batch.rows_created, 0)
+        self.assertEqual(batch.rows_unchanged, batch.rows_total)
+
+
+class RelinkDiagnosticCodesTests(TestCase):
+    def test_manufacturer_pass_runs_before_generic(self):
+        generic = DTCReference.objects.create(code="P1234")
+        bmw = DTCReference.objects.create(code="P1234", manufacturer="BMW")
+        land_rover = DTCReference.objects.create(code="P0300", manufacturer="Land Rover")
+
+        bmw_session = DiagnosticSession.objects.create(vehicle_model="BMW X5 (F15)")
+        toyota_session = DiagnosticSession.objects.create(vehicle_model="Toyota Camry")
+        rover_session = DiagnosticSession.objects.create(vehicle_model="land rover Discovery")
+
+        # bulk_create не вызывает DiagnosticCode.save(), коды остаются непривязанными.
+        DiagnosticCode.objects.bulk_create([
+            DiagnosticCode(session=bmw_session, code="P1234"),
+            DiagnosticCode(session=toyota_session, code="P1234"),
+            DiagnosticCode(session=rover_session, code="P0300"),
+            DiagnosticCode(session=bmw_session, code="P9999"),
+        ])
+
+        # Карта ссылок, по SELECT + UPDATE на чанк, пустой SELECT и один UPDATE generic.
+        with self.assertNumQueries(7):
+            linked = relink_diagnostic_codes(chunk_size=2)
+
+        self.assertEqual(linked, {"manufacturer": 2, "generic": 1})
+        self.assertEqual(
+            dict(DiagnosticCode.objects.values_list("session__vehicle_model", "reference_id").filter(code__in=["P1234", "P0300"])),
+            {
+                "BMW X5 (F15)": bmw.id,
+                "Toyota Camry": generic.id,
+                "land rover Discovery": land_rover.id,
+            },
+        )
+        self.assertIsNone(DiagnosticCode.objects.get(code="P9999").reference_id)
+
+
+class DTCNormalizationTests(TestCase):
+    def test_bulk_writes_cannot_skip_normalization(self):
+        from django.db import IntegrityError, transaction
+
+        for values in (
+            {"code": "p0171", "system": "P", "scope": "generic"},
+            {"code": " P0171", "system": "P", "scope": "generic"},
+            {"code": "P0171", "system": "O", "scope": "generic"},
+            {"code": "P0171", "system": "P"},
+        ):
+            with self.subTest(values=values):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    DTCReference.objects.bulk_create([DTCReference(**values)])
+
+        ref = DTCReference.objects.create(code="P0171")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DTCReference.objects.filter(pk=ref.pk).update(manufacturer="BMW ")
+
+    @skipUnless(connection.vendor == "sqlite", "legacy rows are written with sqlite CHECKs disabled")
+    def test_normalizer_fixes_legacy_rows(self):
+        kept = DTCReference.objects.create(code="P0171", title_ru="Бедная смесь")
+        session = DiagnosticSession.objects.create(vin="TESTVIN")
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA ignore_check_constraints = ON")
+        try:
+            duplicate = DTCReference.objects.create(code="P0420")
+            DTCReference.objects.filter(pk=duplicate.pk).update(code="p0171 ")
+            legacy = DTCReference.objects.create(code="U0100")
+            DTCReference.objects.filter(pk=legacy.pk).update(code=" u0100", system="O", scope="unknown")
+            code = DiagnosticCode.objects.create(session=session, code="P0171", reference=duplicate)
+            DiagnosticCode.objects.filter(pk=code.pk).update(code="p0171 ")
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA ignore_check_constraints = OFF")
+
+        call_command("normalize_dtc", stdout=StringIO())
+
+        legacy.refresh_from_db()
+        code.refresh_from_db()
+
+        self.assertEqual((legacy.code, legacy.system, legacy.scope), ("U0100", "U", "generic"))
+        self.assertEqual(legacy.fingerprint, dtc_reference_fingerprint(legacy))
+        self.assertFalse(DTCReference.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual((code.code, code.reference_id), ("P0171", kept.pk))
+
+    @skipUnless(connection.vendor == "sqlite", "legacy rows are written with sqlite CHECKs disabled")
+    def test_migration_merges_manufacturer_spellings(self):
+        import importlib
+
+        from django.apps import apps
+
+        migration = importlib.import_module("diagnostics.migrations.0013_diagnosticcode_diagnostic_code_normalized_and_more")
+        kept = DTCReference.objects.create(code="P1234", manufacturer="BMW")
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA ignore_check_constraints = ON")
+        try:
+            duplicate = DTCReference.objects.create(code="P1235", manufacturer="BMW")
+            DTCReference.objects.filter(pk=duplicate.pk).update(code="p1234", manufacturer="bmw ")
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA ignore_check_constraints = OFF")
+
+        migration.normalize_existing_rows(apps, None)
+
+        self.assertEqual(list(DTCReference.objects.values_list("id", flat=True)), [kept.pk])
+
+    def test_check_constraints_compare_bytes_on_mysql(self):
+        from django.db.models.sql import Query
+
+        query = Query(DTCReference, alias_cols=False)
+        compiler = query.get_compiler(connection=connection)
+
+        for constraint in DTCReference._meta.constraints[1:3]:
+            condition = constraint.condition.resolve_expression(query)
+            with mock.patch.object(connection, "vendor", "mysql"):
+                sql, _params = compiler.compile(condition)
+
+            with self.subTest(constraint=constraint.name):
+                self.assertIn("CAST(", sql)
+                self.assertIn("AS BINARY)", sql)
+
+
+class DTCExportTests(TestCase):
+    def setUp(self):
+        DTCReference.objects.create(code="P0171", title_ru='Бедная смесь, "банк 1"', severity="high", source_name="SAE")
+        DTCReference.objects.create(code="P1234", manufacturer="BMW", description_ru="Строка 1\nстрока 2", source_name="BMW")
+        DTCReference.objects.create(code="U0100", is_active=False, source_name="SAE")
+
+    def test_export_round_trips_through_import(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        path = tmp / "dtc.csv.gz"
+
+        call_command("export_dtc", output=str(path), chunk_size=2, stdout=StringIO())
+        before = dict(DTCReference.objects.values_list("code", "fingerprint"))
+
+        call_command("import_dtc_csv", csv=str(path), stdout=StringIO())
+        batch = DTCImportBatch.objects.latest("id")
+
+        # is_active выгружается вместе с кодом: неактивный код остаётся выключенным.
+        self.assertEqual((batch.rows_total, batch.rows_unchanged, batch.rows_updated), (3, 3, 0))
+        self.assertEqual(dict(DTCReference.objects.values_list("code", "fingerprint")), before)
+        self.assertFalse(DTCReference.objects.get(code="U0100").is_active)
+
+    def test_staff_endpoint_streams_filtered_ndjson(self):
+        from django.contrib.auth import get_user_model
+
+        url = "/dtc/export/?format=ndjson&manufacturer=bmw"
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        user = get_user_model().objects.create_user(username="staff", password="x", is_staff=True)
+        self.client.force_login(user)
+        response = self.client.get(url)
+
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode("utf-8").splitlines()]
+        self.assertEqual([(row["code"], row["manufacturer"]) for row in rows], [("P1234", "BMW")])
+
+
+class DTCReferenceIndexTests(TestCase):
+    def test_lookups_between_generation_checks_are_dict_hits(self):
+        ref = DTCReference.objects.create(code="P0171", title_ru="Бедная смесь")
+        DTCReference.objects.create(code="P0171", manufacturer="BMW")
+        index = DTCReferenceIndex()
+
+        # Процесс сам справочник не менял: версия сверяется раз в
+        # DTC_INDEX_CHECK_SECONDS, в том числе внутри транзакции.
+        index.get("P0171")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(index.get("P0171").id, ref.id)
+            self.assertEqual(index.get_many(["P0171", "P0300"]), {"P0171": index.get("P0171")})
+            self.assertEqual(index.manufacturers("P0171"), ["", "BMW"])
+
+    def test_bulk_operations_change_generation_once(self):
+        def generation_writes(queries):
+            return [
+                query["sql"] for query in queries
+                if query["sql"].startswith("UPDATE") and "dtcreferencegeneration" in query["sql"]
+            ]
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        path = tmp / "dtc.csv"
+        path.write_text(
+            "code,manufacturer,title_ru\n" + "".join(f"P{index:04d},,Код {index}\n" for index in range(10)),
+            encoding="utf-8",
+        )
+
+        # Создание пакета и одна метка на весь импорт, а не на каждый из пяти чанков.
+        with CaptureQueriesContext(connection) as queries:
+            call_command("import_dtc_csv", csv=str(path), chunk_size=2, stdout=StringIO())
+        self.assertEqual(len(generation_writes(queries)), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            DTCReference.objects.filter(code__lt="P0005").delete()
+        self.assertEqual(len(generation_writes(queries)), 1)
+
+        ref = DTCReference.objects.get(code="P0005")
+        ref.delete()
+        self.assertIsNone(dtc_index.get("P0005"))
+        self.assertEqual(dtc_index.get("P0006").title_ru, "Код 6")
+
+    def test_saves_and_batches_change_generation(self):
+        self.assertIsNone(dtc_index.get("P0300"))
+
+        ref = DTCReference.objects.create(code="p0300 ", title_ru="Пропуски зажигания")
+        self.assertEqual(dtc_index.get("P0300").title_ru, "Пропуски зажигания")
+
+        session = DiagnosticSession.objects.create()
+        code = DiagnosticCode.objects.create(session=session, code="P0300")
+        self.assertEqual(code.reference_id, ref.id)
+
+        generation = current_generation()
+        DTCImportBatch.objects.create(source_name="SAE")
+        self.assertNotEqual(current_generation(), generation)
+
+    def test_api_detail_reads_through_index(self):
+        DTCReference.objects.create(code="P0171", title_ru="Бедная смесь")
+        DTCReference.objects.create(code="U0100", is_active=False)
+
+        response = self.client.get("/dtc/api/p0171/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title_ru"], "Бедная смесь")
+        self.assertEqual(self.client.get("/dtc/api/U0100/").status_code, 404)
+
+
+class DTCCodeSearchTests(TestCase):
+    def setUp(self):
+        for code in ("P0299", "P0300", "P0301", "P0312", "P0313", "P0171", "P0174", "C0035", "U0100"):
+            DTCReference.objects.create(code=code)
+        DTCReference.objects.create(code="P0301", manufacturer="BMW")
+        DTCReference.objects.create(code="P0302", is_active=False)
+
+    def codes(self, query, **kwargs):
+        return [(ref.code, ref.manufacturer) for ref in search_codes(query, **kwargs)]
+
+    def test_prefix_wildcard_and_range(self):
+        self.assertEqual(self.codes("p030"), [("P0300", ""), ("P0301", ""), ("P0301", "BMW")])
+        self.assertEqual(self.codes("P0?7?"), [("P0171", ""), ("P0174", "")])
+        self.assertEqual(self.codes("?01*"), [("P0171", ""), ("P0174", ""), ("U0100", "")])
+        self.assertEqual(
+            self.codes("P0312-P0300"),
+            [("P0300", ""), ("P0301", ""), ("P0301", "BMW"), ("P0312", "")],
+        )
+        self.assertEqual(self.codes("0100"), [("U0100", "")])
+        self.assertEqual(self.codes("P03", limit=2), [("P0300", ""), ("P0301", "")])
+        self.assertEqual(self.codes("P0302"), [])
+        self.assertIsNone(parse_code_query("P03%"))
+
+    def test_oem_codes_from_launch_reports_are_found(self):
+        for code in ("930AB2", "2A82", "S0248"):
+            DTCReference.objects.create(code=code, manufacturer="BMW")
+
+        self.assertEqual(self.codes("930AB2"), [("930AB2", "BMW")])
+        self.assertEqual(self.codes("930"), [("930AB2", "BMW")])
+        self.assertEqual(self.codes("2A82"), [("2A82", "BMW")])
+        self.assertEqual(self.codes("?30AB2"), [("930AB2", "BMW")])
+        self.assertEqual(self.codes("?0248"), [("S0248", "BMW")])
+        self.assertEqual(self.codes("?01*"), [("P0171", ""), ("P0174", ""), ("U0100", "")])
+
+    def test_search_page_reads_one_page_of_rows(self):
+        self.codes("P0")
+
+        # Версия индекса внутри транзакции теста и одна выборка по id.
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.codes("P0")), 8)
+
+
+class DTCFullTextSearchTests(TestCase):
+    def setUp(self):
+        self.idle = DTCReference.objects.create(
+            code="P0505",
+            title_ru="Неисправность системы управления холостым ходом",
+            symptoms="Нестабильные обороты холостого хода, двигатель глохнет",
+        )
+        self.misfire = DTCReference.objects.create(
+            code="P0300",
+            title_en="Random/Multiple Cylinder Misfire Detected",
+            possible_causes="Свечи зажигания, катушки, нестабильное давление топлива",
+        )
+        DTCReference.objects.create(code="P0171", title_ru="Бедная смесь", description_en="System too lean")
+
+    def test_stemmed_terms_match_across_word_forms(self):
+        self.assertEqual(tokenize("нестабильный холостой ход"), tokenize("нестабильного холостого хода"))
+        self.assertEqual(tokenize("misfiring"), tokenize("misfires"))
+
+    def test_stemmer_is_chosen_by_setting_not_by_installed_packages(self):
+        from diagnostics.dtc_fulltext import resolve_stemmer
+
+        self.assertIs(resolve_stemmer(), builtin_stem)
+
+        with self.settings(DTC_FULLTEXT_STEMMER="porter"):
+            with self.assertRaises(ValueError):
+                resolve_stemmer()
+
+    def test_results_are_ranked_by_bm25(self):
+        ranked = search_references("нестабильный холостой ход")
+        self.assertEqual([ref.code for ref, _score in ranked], ["P0505", "P0300"])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+
+        self.assertEqual([ref.code for ref, _score in search_references("misfires")], ["P0300"])
+        self.assertEqual(search_references("и на"), [])
+
+    def test_index_follows_saves_incrementally(self):
+        index = DTCFullTextIndex(stem=builtin_stem)
+        self.assertEqual(index.search("детонация"), [])
+
+        self.misfire.symptoms = "Детонация при разгоне"
+        self.misfire.save()
+        self.idle.is_active = False
+        self.idle.save()
+
+        # Сверка версии и чтение изменённой записи: ни справочник, ни
+        # полнотекстовый индекс целиком не перечитываются.
+        with self.assertNumQueries(2):
+            self.assertEqual([pk for pk, _score in index.search("детонация")], [self.misfire.id])
+
+        self.assertEqual(index.search("холостой"), [])
+
+    def test_search_endpoint_returns_ranked_json(self):
+        response = self.client.get("/dtc/api/search/", {"q": "misfire", "limit": "5"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["code"] for row in response.json()["results"]], ["P0300"])
+        self.assertEqual(self.client.get("/dtc/api/search/").json()["results"], [])
+
+
+class DTCBatchLookupTests(TestCase):
+    def setUp(self):
+        DTCReference.objects.create(code="P0171", title_ru="Бедная смесь")
+        DTCReference.objects.create(code="P0171", manufacturer="BMW", title_ru="Бедная смесь, банк 1 (BMW)")
+        DTCReference.objects.create(code="P1234", manufacturer="Audi")
+        DTCReference.objects.create(code="P0300", title_ru="Пропуски зажигания")
+
+    def post(self, payload):
+        return self.client.post("/dtc/api/batch/", json.dumps(payload), content_type="application/json")
+
+    def test_brand_row_preferred_with_generic_fallback(self):
+        self.post({"codes": ["P0171"]})
+
+        # Версия индекса и одна выборка полных записей.
+        with self.assertNumQueries(2):
+            response = self.post({"codes": ["p0171", "P0300", "P1234", "P9999", "P0171"], "brand": "bmw"})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(row["code"], row["found"], row.get("manufacturer")) for row in results],
+            [("P0171", True, "BMW"), ("P0300", True, ""), ("P1234", False, None), ("P9999", False, None), ("P0171", True, "BMW")],
+        )
+        self.assertNotIn(b"\n", response.content)
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.client.get("/dtc/api/batch/").status_code, 405)
+        self.assertEqual(self.client.post("/dtc/api/batch/", "{", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post({"codes": "P0171"}).status_code, 400)
+        self.assertEqual(self.post({"codes": ["P0171"] * 201}).status_code, 400)
+
+
+class DTCConditionalGetTests(TestCase):
+    def setUp(self):
+        self.ref = DTCReference.objects.create(code="P0171", title_ru="Бедная смесь", description_ru="Смесь " * 80)
+        self.bmw = DTCReference.objects.create(code="P0171", manufacturer="BMW")
+
+    def test_api_detail_answers_304_until_the_row_changes(self):
+        response = self.client.get("/dtc/api/P0171/")
+        etag = response["ETag"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age=300", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertNotIn(b"\n", response.content)
+
+        repeat = self.client.get("/dtc/api/P0171/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertIn("max-age=300", repeat["Cache-Control"])
+
+        self.ref.title_ru = "Слишком бедная смесь"
+        self.ref.save()
+        self.assertEqual(self.client.get("/dtc/api/P0171/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        missing = self.client.get("/dtc/api/P9999/")
+        self.assertEqual(missing.status_code, 404)
+        self.assertNotIn("public", missing.get("Cache-Control", ""))
+
+    def test_api_detail_is_gzipped_when_accepted(self):
+        response = self.client.get("/dtc/api/P0171/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_detail_page_is_private_and_etag_covers_rows_and_deploy(self):
+        from django.http import HttpResponse
+        from diagnostics.views import dtc_page_version
+
+        self.addCleanup(dtc_page_version.cache_clear)
+
+        with mock.patch("django.shortcuts.render", return_value=HttpResponse("page")):
+            response = self.client.get("/dtc/P0171/")
+            etag = response["ETag"]
+
+            self.assertIn("private", response["Cache-Control"])
+            self.assertIn("no-cache", response["Cache-Control"])
+            self.assertNotIn("public", response["Cache-Control"])
+            self.assertEqual(self.client.get("/dtc/P0171/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            self.bmw.title_ru = "Бедная смесь (BMW)"
+            self.bmw.save()
+            response = self.client.get("/dtc/P0171/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+            etag = response["ETag"]
+            dtc_page_version.cache_clear()
+            with self.settings(DTC_CACHE_VERSION="next-release"):
+                self.assertEqual(self.client.get("/dtc/P0171/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -6,6 +6,9 @@ app_name = "diagnostics"
 
 urlpatterns = [
     path("dtc/", views.dtc_search, name="dtc_search"),
+    path("dtc/export/", views.dtc_export, name="dtc_export"),
+    path("dtc/api/search/", views.dtc_api_search, name="dtc_api_search"),
+    path("dtc/api/batch/", views.dtc_api_batch, name="dtc_api_batch"),
     path("dtc/api/<str:code>/", views.dtc_api_detail, name="dtc_api_detail"),
     path("dtc/<str:code>/", views.dtc_detail, name="dtc_detail"),
 ]
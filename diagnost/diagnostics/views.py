@@ -1,23 +1,154 @@
+import hashlib
+import os
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_POST
 
 # Create your views here.
 
 # --- DTC / OBD reference views ---
 
+# Сколько секунд браузер или прокси может отдавать JSON кода без перепроверки.
+DTC_CACHE_MAX_AGE = getattr(settings, "DTC_CACHE_MAX_AGE", 300)
+
+# Шаблоны страницы кода: их изменение при деплое меняет ETag страницы.
+DTC_PAGE_TEMPLATES = ("diagnost/dtc_detail.html", "diagnost/base.html", "includes/cookie_notice.html")
+
+DTC_JSON_PARAMS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def _dtc_page_entries(code, with_related):
+    """Записи индекса, из которых собирается страница кода: generic и, для HTML, записи марок."""
+    from diagnostics.dtc_index import dtc_index
+
+    code = (code or "").strip().upper()
+    generic = dtc_index.get(code)
+
+    if generic is None or not generic.is_active:
+        return []
+
+    entries = [generic]
+
+    if with_related:
+        for manufacturer in dtc_index.manufacturers(code):
+            entry = dtc_index.get(code, manufacturer) if manufacturer else None
+            if entry is not None and entry.is_active:
+                entries.append(entry)
+
+    return entries
+
+
+@lru_cache(maxsize=None)
+def dtc_page_version() -> str:
+    """
+    DTC_CACHE_VERSION из настроек (например, ревизия деплоя), иначе время
+    изменения шаблонов страницы кода и этого модуля — одинаковое у всех
+    воркеров одного деплоя.
+    """
+    version = getattr(settings, "DTC_CACHE_VERSION", "")
+    if version:
+        return str(version)
+
+    from django.template import engines
+
+    # Пути шаблонов без их компиляции: первый найденный загрузчиками файл.
+    loaders = engines["django"].engine.template_loaders
+    parts = [str(os.path.getmtime(__file__))]
+
+    for name in DTC_PAGE_TEMPLATES:
+        path = next(
+            (
+                origin.name
+                for loader in loaders
+                for origin in loader.get_template_sources(name)
+                if os.path.isfile(origin.name)
+            ),
+            None,
+        )
+        parts.append(f"{name}:{os.path.getmtime(path) if path else ''}")
+
+    return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def dtc_conditional(page=False):
+    """
+    ETag и Last-Modified из индекса справочника, без запроса к записям:
+    ETag — хеш id, fingerprint и updated_at (fingerprint ловит откат пакета,
+    который возвращает старый updated_at), Last-Modified — самый поздний
+    updated_at. Повторный запрос с If-None-Match получает 304 до вызова view.
+
+    page=True — HTML-страница: в ETag входят записи марок, версия шаблонов
+    и пользователь, Last-Modified не отдаётся (шаблон мог измениться позже
+    записей), а при непоказанных сообщениях страница всегда рендерится.
+    """
+
+    def etag(request, code):
+        entries = _dtc_page_entries(code, with_related=page)
+        if not entries:
+            return None
+
+        key = "|".join(f"{entry.id}:{entry.fingerprint}:{entry.updated_at.isoformat()}" for entry in entries)
+
+        if page:
+            from django.contrib.messages import get_messages
+
+            if len(get_messages(request)):
+                return None
+
+            user = getattr(request, "user", None)
+            user_id = user.pk if user is not None and user.is_authenticated else ""
+            key = f"{dtc_page_version()}|{user_id}|{key}"
+
+        return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    def last_modified(request, code):
+        if page:
+            return None
+
+        entries = _dtc_page_entries(code, with_related=False)
+        return max((entry.updated_at for entry in entries), default=None)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def dtc_public_cache(max_age):
+    """
+    Cache-Control: public, max-age только для 200 и 304 (перепроверенного
+    200). Ошибки — 404 неизвестного кода и прочие — в общий кеш не попадают.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                patch_cache_control(response, public=True, max_age=max_age)
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
 def dtc_search(request):
     from django.shortcuts import render
-    from diagnostics.models import DTCReference
+    from diagnostics.dtc_code_search import search_codes
 
+    # P03 — префикс, P0?7? — шаблон, P0300-P0312 — диапазон.
     query = (request.GET.get("q") or "").strip().upper()
     results = []
 
     if query:
-        results = (
-            DTCReference.objects
-            .filter(is_active=True)
-            .filter(code__icontains=query)
-            .order_by("code", "manufacturer")[:50]
-        )
+        results = search_codes(query)
 
     return render(request, "diagnost/dtc_search.html", {
         "query": query,
@@ -25,25 +156,27 @@ def dtc_search(request):
     })
 
 
+# В странице есть CSRF-токен и сообщения пользователя: в общий кеш прокси
+# она попадать не должна, браузер перепроверяет её по ETag.
+@cache_control(private=True, no_cache=True)
+@dtc_conditional(page=True)
 def dtc_detail(request, code):
-    from django.shortcuts import get_object_or_404, render
-    from diagnostics.models import DTCReference
+    from django.http import Http404
+    from django.shortcuts import render
+    from diagnostics.dtc_index import dtc_index
 
     code = (code or "").strip().upper()
 
-    ref = get_object_or_404(
-        DTCReference,
-        code=code,
-        manufacturer="",
-        is_active=True,
-    )
+    ref = dtc_index.detail(code)
+    if ref is None:
+        raise Http404("DTC code not found")
 
-    related = (
-        DTCReference.objects
-        .filter(code=code, is_active=True)
-        .exclude(id=ref.id)
-        .order_by("manufacturer")
-    )
+    # manufacturers() отсортирован, как раньше order_by("manufacturer").
+    related = [
+        item
+        for item in (dtc_index.detail(code, manufacturer) for manufacturer in dtc_index.manufacturers(code) if manufacturer)
+        if item is not None
+    ]
 
     return render(request, "diagnost/dtc_detail.html", {
         "ref": ref,
@@ -51,21 +184,37 @@ def dtc_detail(request, code):
     })
 
 
-def dtc_api_detail(request, code):
+@gzip_page
+def dtc_api_search(request):
     from django.http import JsonResponse
-    from django.shortcuts import get_object_or_404
-    from diagnostics.models import DTCReference
+    from diagnostics.dtc_fulltext import DEFAULT_SEARCH_LIMIT, search_references
 
-    code = (code or "").strip().upper()
+    query = (request.GET.get("q") or "").strip()
 
-    ref = get_object_or_404(
-        DTCReference,
-        code=code,
-        manufacturer="",
-        is_active=True,
-    )
+    try:
+        limit = min(max(int(request.GET.get("limit") or DEFAULT_SEARCH_LIMIT), 1), 100)
+    except ValueError:
+        limit = DEFAULT_SEARCH_LIMIT
+
+    results = search_references(query, limit) if query else []
 
     return JsonResponse({
+        "query": query,
+        "results": [
+            {
+                "code": ref.code,
+                "manufacturer": ref.manufacturer,
+                "title_ru": ref.title_ru,
+                "title_en": ref.title_en,
+                "score": round(score, 4),
+            }
+            for ref, score in results
+        ],
+    }, json_dumps_params=DTC_JSON_PARAMS)
+
+
+def _dtc_reference_json(ref) -> dict:
+    return {
         "code": ref.code,
         "system": ref.system,
         "scope": ref.scope,
@@ -81,4 +230,99 @@ def dtc_api_detail(request, code):
         "severity": ref.severity,
         "source_name": ref.source_name,
         "source_url": ref.source_url,
-    }, json_dumps_params={"ensure_ascii": False, "indent": 2})
+    }
+
+
+@gzip_page
+@dtc_public_cache(DTC_CACHE_MAX_AGE)
+@dtc_conditional()
+def dtc_api_detail(request, code):
+    from django.http import Http404, JsonResponse
+    from diagnostics.dtc_index import dtc_index
+
+    code = (code or "").strip().upper()
+
+    ref = dtc_index.detail(code)
+    if ref is None:
+        raise Http404("DTC code not found")
+
+    return JsonResponse(_dtc_reference_json(ref), json_dumps_params=DTC_JSON_PARAMS)
+
+
+# Сколько кодов принимает один запрос пакетного поиска.
+DTC_BATCH_MAX_CODES = 200
+
+
+@csrf_exempt
+@gzip_page
+@require_POST
+def dtc_api_batch(request):
+    """
+    POST {"codes": ["P0171", ...], "brand": "BMW"} -> для каждого кода в
+    порядке запроса запись марки, иначе generic, иначе {"code", "found": false}.
+    Ключи разрешаются индексом справочника, полные записи — одним запросом.
+    """
+    import json
+
+    from django.http import JsonResponse
+    from diagnostics.dtc_index import dtc_index
+    from diagnostics.models import DTCReference, normalize_dtc_code
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+
+    if not isinstance(payload, dict):
+        payload = {}
+
+    codes = payload.get("codes")
+    brand = payload.get("brand") or ""
+
+    if not isinstance(codes, list) or not isinstance(brand, str) or not all(isinstance(code, str) for code in codes):
+        return JsonResponse({"error": "expected {\"codes\": [str, ...], \"brand\": str}"}, status=400)
+
+    if len(codes) > DTC_BATCH_MAX_CODES:
+        return JsonResponse({"error": f"at most {DTC_BATCH_MAX_CODES} codes per request"}, status=400)
+
+    codes = [normalize_dtc_code(code) for code in codes]
+    entries = dtc_index.resolve(set(codes), brand)
+    refs = DTCReference.objects.in_bulk([entry.id for entry in entries.values()])
+
+    results = []
+    for code in codes:
+        entry = entries.get(code)
+        ref = refs.get(entry.id) if entry else None
+        results.append({**_dtc_reference_json(ref), "found": True} if ref else {"code": code, "found": False})
+
+    return JsonResponse({"brand": brand, "results": results}, json_dumps_params=DTC_JSON_PARAMS)
+
+
+@staff_member_required
+def dtc_export(request):
+    """
+    Выгрузка справочника для персонала: ?format=csv|ndjson, &system=P,
+    &manufacturer=BMW (пустое значение — только generic), &active=1, &gzip=1.
+    """
+    from django.http import HttpResponseBadRequest, StreamingHttpResponse
+    from diagnostics.dtc_export import EXPORT_FORMATS, export_queryset, iter_export_bytes
+
+    fmt = request.GET.get("format") or "csv"
+
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown format")
+
+    compress = request.GET.get("gzip") in ("1", "true", "yes")
+    queryset = export_queryset(
+        system=request.GET.get("system") or "",
+        manufacturer=request.GET.get("manufacturer"),
+        active_only=request.GET.get("active") in ("1", "true", "yes"),
+    )
+
+    filename = f"dtc_reference.{fmt}" + (".gz" if compress else "")
+    response = StreamingHttpResponse(
+        iter_export_bytes(queryset, fmt, compress=compress),
+        content_type="application/gzip" if compress else EXPORT_FORMATS[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
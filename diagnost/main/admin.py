@@ -13,7 +13,7 @@ from .models import (
 )
 
 from diagnostics.models import (
-    DiagnosticSession, DiagnosticCode, SensorReading,
+    DiagnosticJob, DiagnosticSession, DiagnosticCode, SensorReading,
     SuspensionInspection, SuspensionPart, SuspensionPartType
 )
 
@@ -221,6 +221,22 @@ class DiagnosticCodeAdmin(admin.ModelAdmin):
     search_fields = ('code',)
 
 
+@admin.register(DiagnosticJob)
+class DiagnosticJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'session', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('session__vin', 'error')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    actions = ('requeue',)
+
+    @admin.action(description='Поставить в очередь повторно')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=DiagnosticJob.Status.RUNNING).update(
+            status=DiagnosticJob.Status.PENDING, attempts=0, error=''
+        )
+        self.message_user(request, f'Задач поставлено в очередь: {updated}')
+
+
 @admin.register(SensorReading)
 class SensorReadingAdmin(admin.ModelAdmin):
     list_display = ('value', 'timestamp', 'session')
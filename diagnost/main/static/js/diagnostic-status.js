@@ -0,0 +1,31 @@
+(function () {
+  var POLL_INTERVAL = 2000;
+
+  function pollParseStatus(block) {
+    var url = block.getAttribute('data-parse-status-url');
+    if (!url) return;
+
+    function check() {
+      fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          if (data.ready) {
+            window.location.reload();
+          } else {
+            window.setTimeout(check, POLL_INTERVAL);
+          }
+        })
+        .catch(function () {
+          window.setTimeout(check, POLL_INTERVAL * 5);
+        });
+    }
+
+    window.setTimeout(check, POLL_INTERVAL);
+  }
+
+  function initParseStatus() {
+    document.querySelectorAll('[data-parse-status-url]').forEach(pollParseStatus);
+  }
+
+  document.addEventListener('DOMContentLoaded', initParseStatus);
+})();
@@ -11,7 +11,7 @@ from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
@@ -29,8 +29,12 @@ from diagnostics.analyzer import analyze_dtc
 # ✅ формы только формы (без моделей!)
 from diagnostics.forms import DiagnosticUploadForm, SuspensionForm, SuspensionPartFormSet
 
+from diagnostics.jobs import enqueue_launch_parse, session_parse_status
+from diagnostics.report_formats import is_report_file
+
 # ✅ модели только из diagnostics.models
 from diagnostics.models import (
+    DiagnosticJob,
     DiagnosticSession,
     DiagnosticCode,
     SensorReading,
@@ -426,16 +430,15 @@ def upload_diagnostic(request):
             session.handover_time = timezone.now()
             session.save()
 
-            # временно: фейковый анализ, пока нет парсера
             # DTC codes must come only from a real parser/importer.
             # Demo P0171/P0420 codes are disabled.
-            # Recommendation is generated from real Launch PDF data when possible.
-            try:
-                from diagnostics.launch_pdf_parser import parse_and_apply_launch_pdf
-                parse_and_apply_launch_pdf(session)
-            except Exception as exc:
-                session.notes = ((session.notes or "") + f"\nLaunch PDF parse error: {exc}").strip()
-                session.save(update_fields=["notes"])
+            # Разбор отчёта выполняет run_diagnostic_worker: формат определяется
+            # по сигнатуре и первой странице (diagnostics.report_formats), страница
+            # сессии опрашивает diagnostic_parse_status, пока коды не будут готовы.
+            # Файл, сигнатура которого не подходит ни к одному формату (фото,
+            # документ), в очередь не ставится.
+            if session.raw_file and is_report_file(session.raw_file.path):
+                enqueue_launch_parse(session)
 
             return redirect('diagnostic_detail', session_id=session.id)
     else:
@@ -450,15 +453,23 @@ def diagnostic_detail(request, session_id):
     codes = session.codes.all()
     readings = session.readings.all()
     inspection = getattr(session, 'suspension_inspection', None)
+    parse_job = session.jobs.filter(kind=DiagnosticJob.Kind.LAUNCH_PARSE).order_by('-id').first()
 
     return render(request, 'diagnost/detail.html', {
         'session': session,
         'codes': codes,
         'readings': readings,
         'inspection': inspection,
+        'parse_job': parse_job,
     })
 
 
+@login_required
+def diagnostic_parse_status(request, session_id):
+    session = get_object_or_404(DiagnosticSession, id=session_id)
+    return JsonResponse(session_parse_status(session))
+
+
 @login_required
 def suspension_inspection(request, session_id):
     session = get_object_or_404(DiagnosticSession, id=session_id)